@@ -1,251 +1,116 @@
-from flask import Flask, request, jsonify, send_from_directory
-import json
-import os
-from datetime import datetime
+from flask import Flask, Response, request, send_file
 
-app = Flask(__name__)
-
-# Simple in-memory storage
-users = {}
-workouts = {}
+from healthjourney.assets import StaticSite
+from healthjourney.http import NOT_FOUND, SERVER_ERROR
+from healthjourney.schemas import (
+    COMPLETION_SCHEMA, DAY_SCHEMA, MAX_BATCH_BODY, OVERSIZED, PROFILE_SCHEMA, SESSION_SCHEMA,
+)
+from healthjourney.service import HealthService
 
-# Load exercise and nutrition data
-def load_json_data():
-    try:
-        with open('data/exercises.json', 'r', encoding='utf-8') as f:
-            exercises = json.load(f)
-        with open('data/nutrition.json', 'r', encoding='utf-8') as f:
-            nutrition = json.load(f)
-        return exercises, nutrition
-    except Exception as e:
-        print(f"Error loading data: {e}")
-        return {'exercises': []}, {'tiers': {}}
+app = Flask(__name__)
 
-exercises_data, nutrition_data = load_json_data()
+# All API logic lives in the shared service; the routes below only adapt
+# Flask requests and responses to it. Edits to data/*.json are picked up
+# within a couple of seconds, without a restart.
+service = HealthService(watch_interval=2.0)
+
+# Pages and assets come from the build in dist/ when there is one (see
+# healthjourney.assets), otherwise straight from the source files
+site = StaticSite()
+
+def to_flask(api_response):
+    return Response(api_response.body, status=api_response.status, headers=api_response.headers)
+
+def request_body(max_body):
+    # A declared length over the route's limit is refused unread; otherwise
+    # one byte past the limit is enough for the service to refuse the body
+    if request.content_length is not None and request.content_length > max_body:
+        return OVERSIZED
+    return request.stream.read(max_body + 1)
+
+def send_static(path):
+    # send_file hands the open file to the server's wsgi.file_wrapper,
+    # which sends it with sendfile() where the server supports it
+    found = site.resolve(path, request.headers.get('Accept-Encoding'))
+    response = send_file(found.path, conditional=True)
+    response.headers.update(found.headers)
+    response.headers['Content-Type'] = found.content_type
+    # It would name the .gz or .br file rather than the one asked for
+    del response.headers['Content-Disposition']
+    return response
 
 @app.route('/')
 def home():
-    return send_from_directory('.', 'index.html')
-
-@app.route('/profile.html')
-def profile():
-    return send_from_directory('.', 'profile.html')
-
-@app.route('/plan.html')
-def plan():
-    return send_from_directory('.', 'plan.html')
+    return send_static('/')
 
 @app.route('/<path:filename>')
 def static_files(filename):
-    return send_from_directory('.', filename)
+    # Unknown API paths land here too; they get the JSON 404, not a page
+    if filename.startswith('api/'):
+        return to_flask(NOT_FOUND)
+    return send_static(filename)
 
 @app.route('/api/profile', methods=['POST'])
 def create_profile():
-    try:
-        data = request.get_json()
-        
-        # Basic validation
-        required = ['firstName', 'lastName', 'age', 'height', 'weight', 'gender']
-        for field in required:
-            if not data.get(field):
-                return jsonify({'success': False, 'error': f'Missing {field}'}), 400
-        
-        user_id = data.get('user_id', f"user_{int(datetime.now().timestamp())}")
-        
-        # Calculate BMI and BMR
-        height_m = float(data['height']) / 100
-        weight = float(data['weight'])
-        age = float(data['age'])
-        
-        bmi = round(weight / (height_m ** 2), 1)
-        
-        if data['gender'] == 'male':
-            bmr = 88.362 + (13.397 * weight) + (4.799 * float(data['height'])) - (5.677 * age)
-        else:
-            bmr = 447.593 + (9.247 * weight) + (3.098 * float(data['height'])) - (4.330 * age)
-        
-        bmr = round(bmr, 0)
-        
-        # Store user data
-        data['user_id'] = user_id
-        data['bmi'] = bmi
-        data['bmr'] = bmr
-        data['created_at'] = datetime.now().isoformat()
-        
-        users[user_id] = data
-        
-        # Initialize workout progress
-        workouts[user_id] = {
-            'current_day': 1,
-            'completed_days': [],
-            'start_date': datetime.now().isoformat(),
-            'total_calories_burned': 0,
-            'streak': 0
-        }
-        
-        return jsonify({
-            'success': True,
-            'user_id': user_id,
-            'bmi': bmi,
-            'bmr': bmr
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return to_flask(service.create_profile(request_body(PROFILE_SCHEMA.max_body)))
+
+@app.route('/api/profiles/batch', methods=['POST'])
+def create_profiles_batch():
+    return to_flask(service.create_profiles_batch(request_body(MAX_BATCH_BODY), request.content_type))
 
 @app.route('/api/profile/<user_id>')
 def get_profile(user_id):
-    try:
-        if user_id in users:
-            return jsonify({'success': True, 'data': users[user_id]})
-        else:
-            return jsonify({'success': False, 'error': 'User not found'}), 404
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return to_flask(service.get_profile(user_id))
 
 @app.route('/api/workout/<user_id>')
 def get_workout(user_id):
-    try:
-        # Create demo user if not exists
-        if user_id not in users:
-            users[user_id] = {
-                'user_id': user_id,
-                'firstName': 'مستخدم',
-                'lastName': 'تجريبي',
-                'age': 25,
-                'height': 170,
-                'weight': 70,
-                'gender': 'male',
-                'fitnessLevel': 'beginner',
-                'goal': 'health',
-                'bmi': 24.2,
-                'bmr': 1700
-            }
-            workouts[user_id] = {
-                'current_day': 1,
-                'completed_days': [],
-                'start_date': datetime.now().isoformat(),
-                'total_calories_burned': 0,
-                'streak': 0
-            }
-        
-        user = users[user_id]
-        progress = workouts.get(user_id, {'current_day': 1, 'completed_days': [], 'total_calories_burned': 0, 'streak': 0})
-        
-        # Filter exercises based on user preferences
-        filtered_exercises = []
-        for exercise in exercises_data.get('exercises', []):
-            if (exercise.get('level') == user.get('fitnessLevel', 'beginner') and
-                exercise.get('gender') in [user.get('gender', 'male'), 'both']):
-                filtered_exercises.append(exercise)
-        
-        # Limit to 14 exercises for day 1
-        workout_exercises = filtered_exercises[:14]
-        
-        return jsonify({
-            'success': True,
-            'exercises': workout_exercises,
-            'current_day': progress['current_day'],
-            'total_exercises': len(workout_exercises),
-            'progress': progress
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return to_flask(service.get_workout(user_id, request.headers, request.remote_addr))
 
 @app.route('/api/nutrition/<user_id>')
 def get_nutrition(user_id):
-    try:
-        # Create demo user if not exists
-        if user_id not in users:
-            users[user_id] = {
-                'user_id': user_id,
-                'economicLevel': 'medium',
-                'goal': 'health',
-                'bmr': 1700
-            }
-        
-        user = users[user_id]
-        economic_level = user.get('economicLevel', 'medium')
-        goal = user.get('goal', 'health')
-        bmr = user.get('bmr', 2000)
-        
-        # Calculate daily calories
-        multipliers = {
-            'weightLoss': 0.8,
-            'muscleGain': 1.3,
-            'endurance': 1.4,
-            'toning': 1.1,
-            'health': 1.2
-        }
-        
-        daily_calories = int(bmr * multipliers.get(goal, 1.2))
-        
-        # Get nutrition plan
-        nutrition_plan = nutrition_data.get('tiers', {}).get(economic_level, {})
-        
-        return jsonify({
-            'success': True,
-            'plan': nutrition_plan,
-            'daily_calories': daily_calories,
-            'economic_level': economic_level
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return to_flask(service.get_nutrition(user_id, request.headers, request.remote_addr))
 
 @app.route('/api/workout/complete', methods=['POST'])
 def complete_exercise():
-    try:
-        data = request.get_json()
-        user_id = data.get('user_id')
-        exercise_id = data.get('exercise_id')
-        duration = data.get('duration', 0)
-        
-        if user_id not in users:
-            return jsonify({'success': False, 'error': 'User not found'}), 404
-        
-        # Calculate calories (simple estimation)
-        calories_burned = round(duration * 0.1, 1)  # Simple calculation
-        
-        # Update progress
-        if user_id in workouts:
-            workouts[user_id]['total_calories_burned'] += calories_burned
-        
-        return jsonify({
-            'success': True,
-            'calories_burned': calories_burned,
-            'total_calories': workouts.get(user_id, {}).get('total_calories_burned', 0)
-        })
-        
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return to_flask(service.complete_exercise(request_body(COMPLETION_SCHEMA.max_body)))
+
+@app.route('/api/workout/complete/batch', methods=['POST'])
+def complete_session():
+    return to_flask(service.complete_session(request_body(SESSION_SCHEMA.max_body)))
+
+@app.route('/api/workout/day/complete', methods=['POST'])
+def complete_day():
+    return to_flask(service.complete_day(request_body(DAY_SCHEMA.max_body)))
+
+@app.route('/api/stats/<user_id>')
+def get_stats(user_id):
+    return to_flask(service.get_stats(user_id, request.args))
 
 @app.route('/api/exercises')
 def get_exercises():
-    try:
-        with open('data/exercises.json', 'r', encoding='utf-8') as f:
-            exercises_data = json.load(f)
-        
-        return jsonify({
-            'success': True,
-            'exercises': exercises_data.get('exercises', [])
-        })
-    except Exception as e:
-        return jsonify({'success': False, 'error': str(e)}), 500
+    return to_flask(service.get_exercises(request.headers, request.args))
+
+@app.route('/api/exercises/search')
+def search_exercises():
+    return to_flask(service.search_exercises(request.headers, request.args))
+
+@app.route('/api/metrics')
+def get_metrics():
+    return to_flask(service.get_metrics(request.args))
 
 # Error handlers
 @app.errorhandler(404)
+@app.errorhandler(405)
 def not_found(error):
     if request.path.startswith('/api/'):
-        return jsonify({'success': False, 'error': 'Endpoint not found'}), 404
-    return send_from_directory('.', 'index.html')
+        return to_flask(NOT_FOUND)
+    return send_static('/')
 
 @app.errorhandler(500)
 def server_error(error):
     if request.path.startswith('/api/'):
-        return jsonify({'success': False, 'error': 'Server error'}), 500
+        return to_flask(SERVER_ERROR)
     return 'Server error', 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    app.run(host='0.0.0.0', port=5000, debug=True)
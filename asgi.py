@@ -0,0 +1,239 @@
+"""Async serving mode: the same ``/api/*`` endpoints as an ASGI application.
+
+Run it with the production settings below (needs ``pip install
+'uvicorn[standard]'``, which adds uvloop and httptools)::
+
+    python asgi.py
+
+or under any ASGI server, e.g. ``uvicorn asgi:app``. Slow clients only
+hold an idle socket on the event loop instead of a worker thread. With
+the in-memory store the handlers run inline, since they never wait on
+I/O. With a store that can block (SQLite), each handler runs in a
+bounded thread pool, so a commit never stalls the loop. Slow builds
+(catalogs, the search index, the compressed catalog) are done at
+startup in that pool, and again by the watcher thread after a reload. Other paths
+serve the site's files, as ``app.py`` does: built bundles are kept in
+memory, and other files are sent with the server's zero-copy extension
+when it has one.
+
+Environment: ``HOST`` (0.0.0.0), ``PORT`` (5000), ``WEB_CONCURRENCY``
+worker processes (1; only use more with a shared store such as SQLite),
+``HEALTHJOURNEY_STORE_THREADS`` (32) and ``HEALTHJOURNEY_BACKLOG`` (4096).
+``HEALTHJOURNEY_DEMO_RATE`` (0.5 per second, 0 for no limit) and
+``HEALTHJOURNEY_DEMO_BURST`` (20) limit demo users created per client.
+"""
+import asyncio
+import functools
+import os
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+
+from healthjourney.assets import StaticSite
+from healthjourney.endpoints import build_router
+from healthjourney.http import NOT_FOUND, error_response
+from healthjourney.routing import Request
+from healthjourney.schemas import OVERSIZED
+from healthjourney.service import HealthService
+
+API_PREFIX = '/api'
+
+# ASGI extension for servers that can send a file without copying it
+ZEROCOPY = 'http.response.zerocopysend'
+
+# Methods whose request body is read before dispatch
+BODY_METHODS = {'POST', 'PUT', 'PATCH'}
+
+# Same behaviour as app.py, including hot-reloaded data files
+service = HealthService(watch_interval=2.0)
+# Runs on the watcher thread, after the swap has cleared the caches
+service.catalogs.subscribe(lambda name, catalogs: service.warm())
+router = build_router(lambda: service)
+
+# Pages and assets, from the build in dist/ when there is one
+site = StaticSite()
+immutable_files = {}
+
+# Handlers for blocking stores run here rather than on the event loop
+executor = ThreadPoolExecutor(
+    max_workers=int(os.environ.get('HEALTHJOURNEY_STORE_THREADS', 32)), thread_name_prefix='store'
+)
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+    elif scope['type'] == 'http':
+        path = scope['path']
+        if path == API_PREFIX or path.startswith(API_PREFIX + '/'):
+            await send_api_response(send, await api(scope, receive), scope['method'] == 'HEAD')
+        else:
+            await serve_file(scope, send)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Load both catalogs and build the search index now, so the
+            # first requests never do it on the event loop
+            await asyncio.get_running_loop().run_in_executor(executor, service.warm)
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            service.catalogs.stop()
+            service.store.close()
+            executor.shutdown(wait=False)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def read_body(receive, max_body):
+    # Stops one byte past the endpoint's limit, which the endpoint then
+    # refuses, so a huge body is never held in memory
+    chunks = []
+    size = 0
+    while size <= max_body:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            break
+        chunk = message.get('body', b'')
+        chunks.append(chunk)
+        size += len(chunk)
+        if not message.get('more_body'):
+            break
+    return b''.join(chunks)[:max_body + 1]
+
+
+def to_event(scope, body):
+    """The request in the Netlify event shape that ``Request`` reads."""
+    query = {}
+    for name, value in urllib.parse.parse_qsl(scope.get('query_string', b'').decode('latin-1')):
+        # Like Flask's request.args.get, the first value wins
+        query.setdefault(name, value)
+    client = scope.get('client')
+    return {
+        'httpMethod': scope['method'],
+        'headers': {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']},
+        'queryStringParameters': query,
+        'body': body,
+        'requestContext': {'identity': {'sourceIp': client[0] if client else None}},
+    }
+
+
+async def api(scope, receive):
+    method = scope['method']
+    # HEAD is answered like GET, without the body
+    match = router.match('GET' if method == 'HEAD' else method, scope['path'][len(API_PREFIX):])
+    if match is None:
+        return NOT_FOUND
+    endpoint, params = match
+    body = b''
+    if method in BODY_METHODS:
+        limit = getattr(endpoint, 'max_body', 0)
+        length = request_header(scope, b'content-length')
+        # A declared length over the limit is refused unread
+        if length is not None and length.isdigit() and int(length) > limit:
+            body = OVERSIZED
+        else:
+            body = await read_body(receive, limit)
+    call = functools.partial(endpoint, Request(to_event(scope, body), params))
+    try:
+        if service.store.blocking:
+            return await asyncio.get_running_loop().run_in_executor(executor, call)
+        return call()
+    except Exception as e:
+        return error_response(str(e), 500)
+
+
+async def send_api_response(send, api_response, head_only=False):
+    headers = [(name.encode('latin-1'), value.encode('latin-1')) for name, value in api_response.headers.items()]
+    body = api_response.body
+    if isinstance(body, (str, bytes)):
+        body = body.encode('utf-8') if isinstance(body, str) else body
+        headers.append((b'content-length', str(len(body)).encode('ascii')))
+        await send({'type': 'http.response.start', 'status': api_response.status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b'' if head_only else body})
+        return
+    # A streamed body goes out chunk by chunk
+    await send({'type': 'http.response.start', 'status': api_response.status, 'headers': headers})
+    if not head_only:
+        for chunk in body:
+            await send({'type': 'http.response.body', 'body': chunk.encode('utf-8'), 'more_body': True})
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+def request_header(scope, name):
+    for key, value in scope['headers']:
+        if key == name:
+            return value.decode('latin-1')
+    return None
+
+
+def read_file(path):
+    with open(path, 'rb') as f:
+        return f.read(), os.fstat(f.fileno()).st_mtime
+
+
+async def serve_file(scope, send):
+    method = scope['method']
+    found = site.resolve(scope['path'] if method in ('GET', 'HEAD') else '/',
+                         request_header(scope, b'accept-encoding'))
+    loop = asyncio.get_running_loop()
+    if found.immutable:
+        # A bundle's name changes with its content, so its bytes can be
+        # kept once read
+        cached = immutable_files.get(found.path)
+        if cached is None:
+            cached = immutable_files[found.path] = await loop.run_in_executor(executor, read_file, found.path)
+        data, mtime = cached
+        size = len(data)
+    elif ZEROCOPY in scope.get('extensions', {}) and method == 'GET':
+        data = None
+        stat = await loop.run_in_executor(executor, os.stat, found.path)
+        size, mtime = stat.st_size, stat.st_mtime
+    else:
+        data, mtime = await loop.run_in_executor(executor, read_file, found.path)
+        size = len(data)
+
+    last_modified = formatdate(mtime, usegmt=True)
+    headers = [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in found.headers.items()]
+    headers.append((b'last-modified', last_modified.encode('ascii')))
+    if request_header(scope, b'if-modified-since') == last_modified:
+        await send({'type': 'http.response.start', 'status': 304, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': b''})
+        return
+    headers += [
+        (b'content-type', found.content_type.encode('latin-1')),
+        (b'content-length', str(size).encode('ascii')),
+    ]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': headers})
+    if data is None:
+        # The server copies the file to the socket itself (sendfile)
+        with open(found.path, 'rb') as f:
+            await send({'type': ZEROCOPY, 'file': f})
+        return
+    await send({'type': 'http.response.body', 'body': b'' if method == 'HEAD' else data})
+
+
+def main():
+    import uvicorn
+
+    uvicorn.run(
+        'asgi:app',
+        host=os.environ.get('HOST', '0.0.0.0'),
+        port=int(os.environ.get('PORT', 5000)),
+        workers=int(os.environ.get('WEB_CONCURRENCY', 1)),
+        # uvloop and httptools when installed
+        loop='auto',
+        http='auto',
+        lifespan='on',
+        backlog=int(os.environ.get('HEALTHJOURNEY_BACKLOG', 4096)),
+        timeout_keep_alive=5,
+        access_log=False,
+        proxy_headers=True,
+        server_header=False,
+    )
+
+
+if __name__ == '__main__':
+    main()
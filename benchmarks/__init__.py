@@ -0,0 +1,4 @@
+# Benchmark scripts for the HealthJourney backend.
+#
+# Run each one from the project root as a module, e.g.
+#   python -m benchmarks.bench_exercise_index
@@ -0,0 +1,135 @@
+"""Page-load requests and bytes for each page, before and after the asset build.
+
+    python -m benchmarks.bench_assets [--rounds 50]
+
+A small browser model loads each page through the Flask app, then every
+script and stylesheet the page names, sending ``Accept-Encoding: gzip,
+br``. It keeps what it fetched: a repeat view skips anything still fresh
+under its Cache-Control and revalidates the rest with If-None-Match.
+``source`` serves the files in ``static/`` as before; ``built`` serves
+the output of ``python -m healthjourney.assets``, built into a temporary
+directory. Bytes are response bodies as sent, so compressed when the
+server compressed them.
+
+Built JavaScript bundles are also checked with ``node --check`` when
+node is installed, and every compressed variant must decompress to its
+file.
+"""
+import argparse
+import gzip
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+import time
+
+import app as flask_app
+from healthjourney.assets import ENCODINGS, PAGES, StaticSite, build
+
+ACCEPT_ENCODING = 'gzip, br'
+_REFERENCE = re.compile(r'<script src="([^"]+)"></script>|<link rel="stylesheet" href="([^"]+)">')
+
+
+def decoded(response):
+    body = response.get_data()
+    if response.headers.get('Content-Encoding') == 'gzip':
+        return gzip.decompress(body)
+    return body
+
+
+class Browser:
+    """Fetches a page and its subresources, with an HTTP cache."""
+
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}
+
+    def fetch(self, url):
+        """``(body bytes sent, response)``, or ``(None, None)`` when served from cache."""
+        headers = {'Accept-Encoding': ACCEPT_ENCODING}
+        cached = self.cache.get(url)
+        if cached is not None:
+            cache_control, etag, body = cached
+            if 'immutable' in cache_control or 'max-age=' in cache_control and 'max-age=0' not in cache_control:
+                return None, None
+            headers['If-None-Match'] = etag
+        response = self.client.get(url, headers=headers)
+        if response.status_code == 304:
+            return 0, response
+        self.cache[url] = (response.headers.get('Cache-Control', ''), response.headers.get('ETag'), decoded(response))
+        return len(response.get_data()), response
+
+    def load(self, page):
+        """Requests made and bytes received loading ``page``."""
+        url = '/' + page
+        sent, _ = self.fetch(url)
+        requests, received = 1, sent
+        html = self.cache[url][2].decode('utf-8')
+        for match in _REFERENCE.finditer(html):
+            reference = match.group(1) or match.group(2)
+            sent, response = self.fetch(reference if reference.startswith('/') else '/' + reference)
+            if response is not None:
+                requests += 1
+                received += sent
+        return requests, received
+
+
+def measure(site, rounds):
+    flask_app.site = site
+    client = flask_app.app.test_client()
+    results = {}
+    for page in PAGES:
+        browser = Browser(client)
+        first = browser.load(page)
+        repeat = browser.load(page)
+        start = time.perf_counter()
+        for _ in range(rounds):
+            Browser(client).load(page)
+        results[page] = first, repeat, (time.perf_counter() - start) / rounds
+    return results
+
+
+def check_build(out_dir, manifest):
+    for name, encodings in manifest['files'].items():
+        path = os.path.join(out_dir, name)
+        with open(path, 'rb') as f:
+            data = f.read()
+        for encoding, suffix in ENCODINGS:
+            if encoding == 'gzip' and encoding in encodings:
+                with open(path + suffix, 'rb') as f:
+                    if gzip.decompress(f.read()) != data:
+                        raise SystemExit(f'{name}{suffix} does not decompress to {name}')
+        if name.endswith('.js') and shutil.which('node'):
+            checked = subprocess.run(['node', '--check', path], capture_output=True, text=True)
+            if checked.returncode:
+                raise SystemExit(f'{name} does not parse:\n{checked.stderr}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=50)
+    args = parser.parse_args()
+
+    out_dir = tempfile.mkdtemp(prefix='healthjourney-assets-')
+    try:
+        start = time.perf_counter()
+        manifest = build(os.path.join(out_dir, 'dist'))
+        print(f'built {len(manifest["bundles"])} bundles in {(time.perf_counter() - start) * 1e3:.0f} ms')
+        check_build(os.path.join(out_dir, 'dist'), manifest)
+
+        sites = {'source': StaticSite(dist_dir=os.path.join(out_dir, 'missing')),
+                 'built': StaticSite(dist_dir=os.path.join(out_dir, 'dist'))}
+        results = {label: measure(site, args.rounds) for label, site in sites.items()}
+        print(f'{"page":<13} {"site":<7} | {"first view":>19} | {"repeat view":>17} | {"server time":>11}')
+        for page in PAGES:
+            for label in sites:
+                (requests, received), (again, again_received), elapsed = results[label][page]
+                print(f'{page:<13} {label:<7} | {requests:>2} req {received:>9,} B | '
+                      f'{again:>2} req {again_received:>7,} B | {elapsed * 1e3:8.2f} ms')
+    finally:
+        shutil.rmtree(out_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
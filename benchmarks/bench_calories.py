@@ -0,0 +1,90 @@
+"""Time calorie summaries for many users, and sessions versus single completions.
+
+    python -m benchmarks.bench_calories [--users 10000] [--days 7] [--per-day 6]
+
+Summarizes a week of synthetic completions for every user with numpy and
+in plain Python, checking that both give identical results. Then records
+one session per user through POST /api/workout/complete/batch and through
+one POST /api/workout/complete per exercise, on the Flask test client.
+"""
+import argparse
+import random
+import time
+
+import app as flask_app
+from healthjourney import calories
+from healthjourney.catalog import ExerciseIndex
+from healthjourney.store import MemoryStore, new_progress
+from benchmarks.synthetic import generate_exercises
+
+
+def generate_completions(users, days, per_day, exercise_count, seed=0):
+    rng = random.Random(seed)
+    return [
+        (f'user_{user}', rng.randint(1, exercise_count), rng.randint(20, 240), rng.randint(0, 30), day)
+        for user in range(users) for day in range(1, days + 1) for _ in range(per_day)
+    ]
+
+
+def time_summary(completions, weights, lookup, use_numpy):
+    saved = calories.numpy
+    if not use_numpy:
+        calories.numpy = lambda: None
+    try:
+        start = time.perf_counter()
+        result = calories.summarize(completions, weights, lookup)
+        return time.perf_counter() - start, result
+    finally:
+        calories.numpy = saved
+
+
+def time_sessions(users, per_session, batch):
+    store = MemoryStore()
+    for user in range(users):
+        store.save_user(f'user_{user}', {'user_id': f'user_{user}', 'weight': 70})
+        store.save_progress(f'user_{user}', new_progress())
+    flask_app.service.store = store
+    client = flask_app.app.test_client()
+    session = [{'exercise_id': i % 6 + 1, 'duration': 60, 'reps_completed': 12} for i in range(per_session)]
+
+    start = time.perf_counter()
+    for user in range(users):
+        user_id = f'user_{user}'
+        if batch:
+            client.post('/api/workout/complete/batch', json={'user_id': user_id, 'completions': session})
+        else:
+            for completion in session:
+                client.post('/api/workout/complete', json=dict(completion, user_id=user_id))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=10_000)
+    parser.add_argument('--days', type=int, default=7)
+    parser.add_argument('--per-day', type=int, default=6)
+    parser.add_argument('--sessions', type=int, default=500, help='users recorded over HTTP')
+    args = parser.parse_args()
+
+    exercises = generate_exercises(500)
+    index = ExerciseIndex(exercises)
+    completions = generate_completions(args.users, args.days, args.per_day, len(exercises))
+    rng = random.Random(1)
+    weights = {f'user_{user}': round(rng.uniform(45, 130), 1) for user in range(args.users)}
+
+    python_time, python_result = time_summary(completions, weights, index.get, use_numpy=False)
+    line = f'{len(completions):>10,} completions | python {len(completions) / python_time:12,.0f}/s'
+    if calories.numpy() is not None:
+        numpy_time, numpy_result = time_summary(completions, weights, index.get, use_numpy=True)
+        assert numpy_result == python_result, 'numpy and python summaries differ'
+        line += f' | numpy {len(completions) / numpy_time:12,.0f}/s | x{python_time / numpy_time:.1f}'
+    print(line)
+
+    single = time_sessions(args.sessions, args.per_day, batch=False)
+    batch = time_sessions(args.sessions, args.per_day, batch=True)
+    print(f'{args.sessions:>10,} sessions of {args.per_day} | per exercise {args.sessions / single:9,.0f} sessions/s | '
+          f'per session {args.sessions / batch:9,.0f} sessions/s | x{single / batch:.1f}')
+
+
+if __name__ == '__main__':
+    main()
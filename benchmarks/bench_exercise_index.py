@@ -0,0 +1,70 @@
+"""Compare the precomputed ExerciseIndex with the old per-request scan.
+
+    python -m benchmarks.bench_exercise_index [--sizes 10000 100000 1000000]
+"""
+import argparse
+import time
+
+from healthjourney.catalog import ExerciseIndex
+from benchmarks.synthetic import GENDERS, LEVELS, generate_exercises
+
+
+def select_workout(index, user, limit=14):
+    # The query get_workout makes of the index
+    return index.first(
+        limit,
+        level=user.get('fitnessLevel', 'beginner'),
+        gender=user.get('gender', 'male'),
+    )
+
+
+def legacy_select(exercises, user, limit=14):
+    # The loop get_workout used before the index existed
+    filtered_exercises = []
+    for exercise in exercises:
+        if (exercise.get('level') == user.get('fitnessLevel', 'beginner') and
+                exercise.get('gender') in [user.get('gender', 'male'), 'both']):
+            filtered_exercises.append(exercise)
+    return filtered_exercises[:limit]
+
+
+def time_per_call(func, users, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for user in users:
+            func(user)
+    return (time.perf_counter() - start) / (rounds * len(users))
+
+
+def run(size, rounds):
+    exercises = generate_exercises(size)
+    users = [
+        {'fitnessLevel': level, 'gender': gender}
+        for level in LEVELS for gender in GENDERS if gender != 'both'
+    ]
+
+    start = time.perf_counter()
+    index = ExerciseIndex(exercises)
+    build = time.perf_counter() - start
+
+    for user in users:
+        assert select_workout(index, user) == legacy_select(exercises, user), 'index and scan disagree'
+
+    legacy = time_per_call(lambda user: legacy_select(exercises, user), users, max(1, rounds // 100))
+    indexed = time_per_call(lambda user: select_workout(index, user), users, rounds)
+    print(f'{size:>9,} exercises | build {build * 1e3:9.1f} ms | '
+          f'scan {legacy * 1e6:11.1f} us/req | index {indexed * 1e6:7.2f} us/req | '
+          f'x{legacy / indexed:,.0f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000])
+    parser.add_argument('--rounds', type=int, default=2000)
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size, args.rounds)
+
+
+if __name__ == '__main__':
+    main()
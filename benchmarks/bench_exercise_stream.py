@@ -0,0 +1,73 @@
+"""Time-to-first-byte and peak memory of GET /api/exercises by mode.
+
+    python -m benchmarks.bench_exercise_stream [--sizes 10000 100000]
+
+Compares the whole-catalog response with a 50-item page and with the
+NDJSON stream. Timings start after the catalog is loaded and exclude the
+response cache (every call builds its body from scratch). Memory is the
+tracemalloc peak while producing the whole response.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.synthetic import generate_exercises
+from healthjourney.data import DATA_DIR
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore
+
+MODES = {
+    'full': {},
+    'page': {'limit': '50'},
+    'page+fields': {'limit': '50', 'fields': 'id,name,category'},
+    'ndjson': {'format': 'ndjson'},
+}
+
+
+def consume(service, query):
+    # Start from empty caches so every run serializes the body itself
+    service.clear_caches()
+    start = time.perf_counter()
+    body = service.get_exercises({}, query).body
+    if isinstance(body, (str, bytes)):
+        first_byte = time.perf_counter() - start
+        size = len(body)
+    else:
+        chunks = iter(body)
+        size = len(next(chunks))
+        first_byte = time.perf_counter() - start
+        for chunk in chunks:
+            size += len(chunk)
+    return first_byte, time.perf_counter() - start, size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            data_dir = os.path.join(tmp, str(size))
+            os.makedirs(data_dir)
+            shutil.copy(os.path.join(DATA_DIR, 'nutrition.json'), data_dir)
+            with open(os.path.join(data_dir, 'exercises.json'), 'w', encoding='utf-8') as f:
+                json.dump({'exercises': generate_exercises(size)}, f, ensure_ascii=False)
+            service = HealthService(data_dir=data_dir, store=MemoryStore())
+            service.catalogs.current.exercises  # load outside the measurements
+
+            for mode, query in MODES.items():
+                tracemalloc.start()
+                first_byte, total, body_size = consume(service, query)
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print(f'{size:>8,} {mode:>12} | ttfb {first_byte * 1e3:9.2f} ms | total {total * 1e3:9.1f} ms | '
+                      f'peak {peak / 2**20:8.2f} MiB | {body_size / 2**20:8.2f} MiB sent')
+
+
+if __name__ == '__main__':
+    main()
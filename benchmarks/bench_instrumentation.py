@@ -0,0 +1,99 @@
+"""Per-request cost of the endpoint instrumentation.
+
+    python -m benchmarks.bench_instrumentation [--requests 100000] [--repeat 5]
+
+First wraps a function that returns a canned response, so only the
+instrumentation itself is timed: two clock reads, a histogram update and
+a counter update. Then replays a realistic request mix against the
+service with instrumentation on and off, taking turns, and reports the
+best of ``--repeat`` runs for each. Finally the same mix with one
+request in 100 profiled shows what sampling costs on average.
+"""
+import argparse
+import random
+import time
+
+from healthjourney.http import json_response
+from healthjourney.instrumentation import Instrumentation
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore
+from healthjourney.throttle import RateLimiter
+
+CANNED = json_response({'success': True})
+
+USERS = 1000
+
+
+def canned():
+    return CANNED
+
+
+def time_calls(call, count):
+    start = time.perf_counter()
+    for _ in range(count):
+        call()
+    return (time.perf_counter() - start) / count
+
+
+def request_mix(service, count, seed=0):
+    """Calls for a mix of cached reads, completions and 404s."""
+    rng = random.Random(seed)
+    calls = []
+    for _ in range(count):
+        user = f'user_{rng.randrange(USERS)}'
+        kind = rng.random()
+        if kind < 0.4:
+            calls.append((service.get_workout, (user, {})))
+        elif kind < 0.7:
+            calls.append((service.get_nutrition, (user, {})))
+        elif kind < 0.85:
+            calls.append((service.get_exercises, ({'Accept-Encoding': 'gzip'}, {})))
+        elif kind < 0.95:
+            calls.append((service.complete_exercise, ({'user_id': user, 'exercise_id': 3, 'duration': 60},)))
+        else:
+            calls.append((service.get_profile, ('nobody',)))
+    return calls
+
+
+def replay(calls):
+    start = time.perf_counter()
+    for method, args in calls:
+        method(*args)
+    return (time.perf_counter() - start) / len(calls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    instrumentation = Instrumentation()
+    bare = min(time_calls(canned, args.requests) for _ in range(args.repeat))
+    wrapped = min(time_calls(lambda: instrumentation.call('canned', canned), args.requests)
+                  for _ in range(args.repeat))
+    print(f'canned response | bare {bare * 1e6:.2f} us | instrumented {wrapped * 1e6:.2f} us | '
+          f'overhead {(wrapped - bare) * 1e6:.2f} us/request')
+
+    # The mix's users are demo users from one caller, so no creation limit
+    service = HealthService(store=MemoryStore(), demo_limiter=RateLimiter(rate=0))
+    calls = request_mix(service, args.requests)
+    replay(calls)  # warm the catalogs and caches
+    enabled = Instrumentation()
+    on = off = float('inf')
+    for _ in range(args.repeat):
+        service.instrumentation = None
+        off = min(off, replay(calls))
+        service.instrumentation = enabled
+        on = min(on, replay(calls))
+    print(f'service mix     | off {off * 1e6:.2f} us | on {on * 1e6:.2f} us | '
+          f'overhead {(on - off) * 1e6:.2f} us/request ({(on - off) / off:.1%})')
+
+    service.instrumentation = Instrumentation(profile_every=100, slow_ms=0)
+    sampled = min(replay(calls) for _ in range(args.repeat))
+    print(f'1-in-100 profiling | {sampled * 1e6:.2f} us/request | '
+          f'overhead {(sampled - off) * 1e6:.2f} us/request')
+
+
+if __name__ == '__main__':
+    main()
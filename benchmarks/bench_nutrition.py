@@ -0,0 +1,72 @@
+"""Per-request cost of GET /api/nutrition as the nutrition catalog grows.
+
+    python -m benchmarks.bench_nutrition [--tiers 3 30 300] [--items 3 30]
+
+For each catalog size, 2,000 users spread over every tier, goal and
+calorie level each request their plan once to warm up, and then again
+under the timer. Meal plans are precomputed when the catalog loads, so
+the per-request time should stay flat while the load time grows.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import generate_nutrition
+from healthjourney.data import DATA_DIR
+from healthjourney.service import GOAL_MULTIPLIERS, HealthService
+from healthjourney.store import MemoryStore
+
+USERS = 2000
+
+
+def run(data_dir, tiers):
+    store = MemoryStore()
+    rng = random.Random(0)
+    goals = list(GOAL_MULTIPLIERS)
+    for i in range(USERS):
+        store.save_user(f'u{i}', {
+            'economicLevel': f'tier_{rng.randrange(tiers)}',
+            'goal': rng.choice(goals),
+            'bmr': rng.randint(1200, 2600),
+        })
+    service = HealthService(data_dir=data_dir, store=store)
+
+    start = time.perf_counter()
+    service.catalogs.current.nutrition
+    load = time.perf_counter() - start
+
+    for i in range(USERS):
+        service.get_nutrition(f'u{i}', {})
+    start = time.perf_counter()
+    size = 0
+    for i in range(USERS):
+        size += len(service.get_nutrition(f'u{i}', {}).body)
+    per_request = (time.perf_counter() - start) / USERS
+    return load, per_request, size / USERS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tiers', type=int, nargs='+', default=[3, 30, 300])
+    parser.add_argument('--items', type=int, nargs='+', default=[3, 30])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for tiers in args.tiers:
+            for items in args.items:
+                data_dir = os.path.join(tmp, f'{tiers}x{items}')
+                os.makedirs(data_dir)
+                shutil.copy(os.path.join(DATA_DIR, 'exercises.json'), data_dir)
+                with open(os.path.join(data_dir, 'nutrition.json'), 'w', encoding='utf-8') as f:
+                    json.dump(generate_nutrition(tiers, items), f)
+                load, per_request, size = run(data_dir, tiers)
+                print(f'{tiers:>4} tiers x {items:>3} items/meal | load {load * 1e3:8.1f} ms | '
+                      f'{per_request * 1e6:6.1f} us/request | {size / 1024:7.1f} KiB/response')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""Compare POST /api/profiles/batch with one POST /api/profile per user.
+
+    python -m benchmarks.bench_profiles_batch [--sizes 10000 100000]
+
+Both paths run in-process through the Flask test client against a fresh
+in-memory store. The BMI/BMR step is also timed on its own, with and
+without numpy.
+"""
+import argparse
+import json
+import time
+
+import app as flask_app
+from benchmarks.synthetic import generate_profiles
+from healthjourney import profiles
+from healthjourney.store import MemoryStore
+
+
+def time_single(records):
+    flask_app.service.store = MemoryStore()
+    client = flask_app.app.test_client()
+    start = time.perf_counter()
+    for record in records:
+        client.post('/api/profile', json=record)
+    return time.perf_counter() - start
+
+
+def time_batch(records, ndjson):
+    flask_app.service.store = MemoryStore()
+    client = flask_app.app.test_client()
+    if ndjson:
+        body = '\n'.join(json.dumps(record) for record in records)
+        content_type = 'application/x-ndjson'
+    else:
+        body = json.dumps(records)
+        content_type = 'application/json'
+    start = time.perf_counter()
+    response = client.post('/api/profiles/batch', data=body, content_type=content_type)
+    elapsed = time.perf_counter() - start
+    assert response.get_json()['created'] == len(records)
+    return elapsed
+
+
+def time_metrics(records, use_numpy):
+    columns = (
+        [float(r['height']) for r in records],
+        [float(r['weight']) for r in records],
+        [float(r['age']) for r in records],
+        [r['gender'] for r in records],
+    )
+    saved = profiles.numpy
+    if not use_numpy:
+        profiles.numpy = lambda: None
+    try:
+        start = time.perf_counter()
+        profiles.compute_metrics_batch(*columns)
+        return time.perf_counter() - start
+    finally:
+        profiles.numpy = saved
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000])
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        records = generate_profiles(size)
+        single = time_single([dict(record) for record in records])
+        batch = time_batch([dict(record) for record in records], ndjson=False)
+        ndjson = time_batch([dict(record) for record in records], ndjson=True)
+        print(f'{size:>8,} profiles | single {size / single:9,.0f}/s | batch JSON {size / batch:9,.0f}/s | '
+              f'batch NDJSON {size / ndjson:9,.0f}/s | x{single / batch:.0f}')
+        python_metrics = time_metrics(records, use_numpy=False)
+        line = f'{"":>18} BMI/BMR only: python {python_metrics * 1e3:7.1f} ms'
+        if profiles.numpy() is not None:
+            line += f' | numpy {time_metrics(records, use_numpy=True) * 1e3:7.1f} ms'
+        print(line)
+
+
+if __name__ == '__main__':
+    main()
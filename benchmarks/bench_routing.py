@@ -0,0 +1,195 @@
+"""Routing and dispatch cost of the Netlify handler, per request.
+
+    python -m benchmarks.bench_routing [--requests 100000] [--repeat 5]
+
+Replays a weighted mix of realistic events through the compiled route
+table and through the previous if/elif handler, reproduced below. The
+service is replaced by one that returns a canned response, so only
+matching, parameter extraction, header and body decoding and dispatch
+are timed. The handlers take turns on each slice of events, and the best
+of ``--repeat`` runs is reported.
+
+Then times ``Router.match`` alone with extra routes registered, which
+should stay flat: a lookup only visits one trie node per path segment.
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.check_parity import load_netlify_module
+from healthjourney.http import NOT_FOUND, error_response, json_response
+from healthjourney.endpoints import build_router
+
+CANNED = json_response({'success': True})
+
+# What Netlify forwards with a browser's fetch, names lowercased as it sends them
+HEADERS = {
+    'accept': '*/*',
+    'accept-encoding': 'gzip, br',
+    'accept-language': 'en-GB,en;q=0.9',
+    'client-ip': '203.0.113.7',
+    'connection': 'keep-alive',
+    'content-type': 'application/json',
+    'host': 'healthjourney.netlify.app',
+    'referer': 'https://healthjourney.netlify.app/plan',
+    'user-agent': 'Mozilla/5.0 (X11; Linux x86_64; rv:128.0) Gecko/20100101 Firefox/128.0',
+    'via': 'https/2 Netlify[0f1e2d3c] (ApacheTrafficServer/9.2.5)',
+    'x-country': 'GB',
+    'x-forwarded-for': '203.0.113.7',
+    'x-forwarded-proto': 'https',
+    'x-nf-client-connection-ip': '203.0.113.7',
+    'x-nf-request-id': '01J9Z3QY8W4T6R2M0K8H5B3N7C',
+}
+
+# (weight, method, path, body)
+MIX = [
+    (30, 'GET', 'workout/user_{n}', None),
+    (20, 'GET', 'nutrition/user_{n}', None),
+    (15, 'POST', 'workout/complete', '{{"user_id": "user_{n}", "exercise_id": 3, "duration": 95}}'),
+    (10, 'GET', 'exercises', None),
+    (10, 'GET', 'profile/user_{n}', None),
+    (5, 'POST', 'workout/complete/batch', '{{"user_id": "user_{n}", "completions": [{{"duration": 60}}]}}'),
+    (5, 'POST', 'profile', json.dumps({'firstName': 'x', 'lastName': 'y', 'age': 30, 'height': 170,
+                                       'weight': 70, 'gender': 'male'}).replace('{', '{{').replace('}', '}}')),
+    (3, 'GET', 'metrics', None),
+    (2, 'GET', 'no/such/endpoint', None),
+]
+
+
+def canned(*args):
+    return CANNED
+
+
+class CannedService:
+    """Answers every endpoint with the same response."""
+
+    create_profile = create_profiles_batch = get_profile = staticmethod(canned)
+    get_workout = get_nutrition = complete_exercise = complete_session = staticmethod(canned)
+    get_exercises = get_metrics = staticmethod(canned)
+
+
+def client_address(event, request_headers):
+    address = ((event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+    if address is None:
+        address = request_headers.get('x-nf-client-connection-ip')
+    return address
+
+
+def legacy_handler(module):
+    """The handler as it was before the route table, for comparison.
+
+    It calls the service as it stands, e.g. passing the caller's address
+    for rate limiting, so both handlers hand over the same arguments.
+    """
+    service = module.service
+    to_netlify = module.to_netlify
+
+    def handler(event, context):
+        try:
+            method = event.get('httpMethod', 'GET')
+            path = event.get('path', '/')
+            body = event.get('body', '')
+            request_headers = {key.lower(): value for key, value in (event.get('headers') or {}).items()}
+            api_path = path.replace('/.netlify/functions/api', '').lstrip('/')
+            if method == 'POST' and api_path == 'profile':
+                return to_netlify(service.create_profile(body))
+            elif method == 'POST' and api_path == 'profiles/batch':
+                return to_netlify(service.create_profiles_batch(body, request_headers.get('content-type', '')))
+            elif method == 'GET' and api_path.startswith('profile/'):
+                return to_netlify(service.get_profile(api_path.split('/')[-1]))
+            elif method == 'GET' and api_path.startswith('workout/'):
+                return to_netlify(service.get_workout(api_path.split('/')[-1], request_headers, client_address(event, request_headers)))
+            elif method == 'GET' and api_path.startswith('nutrition/'):
+                return to_netlify(service.get_nutrition(api_path.split('/')[-1], request_headers, client_address(event, request_headers)))
+            elif method == 'POST' and api_path == 'workout/complete':
+                return to_netlify(service.complete_exercise(body))
+            elif method == 'POST' and api_path == 'workout/complete/batch':
+                return to_netlify(service.complete_session(body))
+            elif method == 'GET' and api_path == 'exercises':
+                return to_netlify(service.get_exercises(request_headers, event.get('queryStringParameters') or {}))
+            elif method == 'GET' and api_path == 'metrics':
+                return to_netlify(service.get_metrics(event.get('queryStringParameters') or {}))
+            else:
+                return to_netlify(NOT_FOUND)
+        except Exception as e:
+            return to_netlify(error_response(str(e), 500))
+    return handler
+
+
+def generate_events(count, seed=0):
+    rng = random.Random(seed)
+    weights = [weight for weight, *_ in MIX]
+    events = []
+    for entry in rng.choices(MIX, weights, k=count):
+        _, method, path, body = entry
+        n = rng.randrange(10_000)
+        events.append({
+            'httpMethod': method,
+            'path': '/.netlify/functions/api/' + path.format(n=n),
+            'headers': dict(HEADERS),
+            'queryStringParameters': None,
+            'body': body.format(n=n) if body else None,
+        })
+    return events
+
+
+def time_handlers(handlers, events, repeat, chunks=50):
+    """The best time per request of each handler over ``repeat`` runs.
+
+    The handlers take turns on each slice of events, so a machine that
+    speeds up or slows down while the benchmark runs affects them alike.
+    """
+    size = -(-len(events) // chunks)
+    best = [float('inf')] * len(handlers)
+    for _ in range(repeat):
+        totals = [0.0] * len(handlers)
+        for offset in range(0, len(events), size):
+            chunk = events[offset:offset + size]
+            for i, handler in enumerate(handlers):
+                start = time.perf_counter()
+                for event in chunk:
+                    handler(event, None)
+                totals[i] += time.perf_counter() - start
+        best = [min(b, total / len(events)) for b, total in zip(best, totals)]
+    return best
+
+
+def padded_router(service, extra):
+    """The API routes plus ``extra`` pairs of unrelated ones."""
+    router = build_router(lambda: service)
+    for n in range(extra):
+        router.add('GET', f'extra{n}/<user_id>', canned)
+        router.add('POST', f'extra{n}/items/<int:item>', canned)
+    return router
+
+
+def time_match(router, paths):
+    start = time.perf_counter()
+    for method, path in paths:
+        router.match(method, path)
+    return (time.perf_counter() - start) / len(paths)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=100_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    module = load_netlify_module()
+    module.service = CannedService()
+    events = generate_events(args.requests)
+    routed, legacy = time_handlers((module.handler, legacy_handler(module)), events, args.repeat)
+    print(f'{args.requests:,} requests | route table {routed * 1e6:.2f} us/request | '
+          f'if/elif chain {legacy * 1e6:.2f} us/request | x{legacy / routed:.2f}')
+
+    paths = [(event['httpMethod'], event['path'][len(module.FUNCTION_PATH):]) for event in events]
+    for extra in (0, 100, 1000):
+        router = padded_router(module.service, extra)
+        best = min(time_match(router, paths) for _ in range(args.repeat))
+        print(f'{9 + 2 * extra:>6} routes | match {best * 1e6:.2f} us/request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+"""Cost of GET /api/workout by program day, and a sample program.
+
+    python -m benchmarks.bench_schedule [--exercises 2000] [--days 1 8 57 365]
+
+Users at every level are put on the given program days of a synthetic
+catalog, and each fetches its workout many times. A day's workout
+follows from its day number and is cached, so the time per request
+should grow only with the response itself, which echoes the user's
+list of completed days. Then prints the first two weeks of one user's program:
+rest days, each session's lead category, and the loads growing from
+week to week.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.synthetic import LEVELS, generate_exercises
+from healthjourney.schedule import plan_day
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore, new_progress
+
+REQUESTS = 20_000
+
+
+def progress_on(day):
+    # Every earlier day completed, so overload is not held back
+    progress = new_progress()
+    progress.update(current_day=day, completed_days=list(range(1, day)), streak=day - 1)
+    return progress
+
+
+def time_day(service, day):
+    users = []
+    for level in LEVELS:
+        for gender in ('male', 'female'):
+            user_id = f'{level}_{gender}_{day}'
+            service.store.save_user(user_id, {'user_id': user_id, 'fitnessLevel': level, 'gender': gender})
+            service.store.save_progress(user_id, progress_on(day))
+            users.append(user_id)
+    size = max(len(service.get_workout(user_id, {}).body) for user_id in users)
+    start = time.perf_counter()
+    for i in range(REQUESTS):
+        service.get_workout(users[i % len(users)], {})
+    return (time.perf_counter() - start) / REQUESTS, size
+
+
+def show_program(service, level, days):
+    service.store.save_user('sample', {'user_id': 'sample', 'fitnessLevel': level, 'gender': 'male'})
+    print(f'\n{level} program, first {days} days:')
+    for day in range(1, days + 1):
+        service.store.save_progress('sample', progress_on(day))
+        workout = json.loads(service.get_workout('sample', {}).body)
+        if workout['rest_day']:
+            print(f'  day {day:>2} | rest')
+            continue
+        first = workout['exercises'][0]
+        categories = ' '.join(exercise['category'][:4] for exercise in workout['exercises'])
+        print(f'  day {day:>2} | week {workout["week"]} | focus {workout["focus"]:<9} | '
+              f'{first["sets"]}x{first["reps"]:<3} | {categories}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exercises', type=int, default=2000)
+    parser.add_argument('--days', type=int, nargs='+', default=[1, 8, 57, 365])
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='healthjourney-schedule-')
+    try:
+        with open(os.path.join(data_dir, 'exercises.json'), 'w', encoding='utf-8') as f:
+            json.dump({'exercises': generate_exercises(args.exercises)}, f, ensure_ascii=False)
+        service = HealthService(data_dir=data_dir, store=MemoryStore())
+        service.instrumentation = None
+        for day in args.days:
+            plan = plan_day(day, 'intermediate', day - 1)
+            elapsed, size = time_day(service, day)
+            print(f'day {day:>4} (week {plan.week:>2}) | {elapsed * 1e6:6.1f} us/request | {size:>6,} B response')
+        show_program(service, 'intermediate', 14)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""Search latency on a large catalog: GET /api/exercises/search.
+
+    python -m benchmarks.bench_search [--exercises 100000] [--rounds 200]
+
+Builds the search index over a synthetic catalog with varied Arabic and
+English names, then times a mix of queries: one-letter prefixes, whole
+words in either language, spellings that only match after Arabic
+folding, several words, facet filters and no matches. Each is timed in
+the index alone and through the endpoint with the response cache
+cleared, so every request searches, counts facets and serializes a page.
+"""
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from benchmarks.measure import percentile
+from benchmarks.synthetic import generate_named_exercises
+from healthjourney.search import SearchIndex
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore
+
+QUERIES = [
+    ('one letter', {'q': 'ت'}),
+    ('one letter', {'q': 'p'}),
+    ('prefix', {'q': 'الضغ'}),
+    ('word', {'q': 'squat'}),
+    ('word', {'q': 'القرفصاء'}),
+    ('folded', {'q': 'إلضّغط'}),
+    ('folded', {'q': 'ضغط'}),
+    ('two words', {'q': 'dumbbell row'}),
+    ('two words', {'q': 'الطعن الجانبي'}),
+    ('number', {'q': '4711'}),
+    ('filters', {'q': 'push', 'level': 'beginner', 'equipment': 'دمبل'}),
+    ('filters', {'category': 'legs,cardio', 'muscle': 'أرداف'}),
+    ('everything', {}),
+    ('no match', {'q': 'zzz'}),
+]
+
+
+def time_calls(call, rounds):
+    call()
+    samples = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        call()
+        samples.append(time.perf_counter() - start)
+    return sorted(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--exercises', type=int, default=100_000)
+    parser.add_argument('--rounds', type=int, default=200)
+    args = parser.parse_args()
+
+    exercises = generate_named_exercises(args.exercises)
+    start = time.perf_counter()
+    index = SearchIndex(exercises)
+    print(f'{args.exercises:,} exercises | index built in {time.perf_counter() - start:.2f} s')
+
+    data_dir = tempfile.mkdtemp(prefix='healthjourney-search-')
+    try:
+        with open(os.path.join(data_dir, 'exercises.json'), 'w', encoding='utf-8') as f:
+            json.dump({'exercises': exercises}, f, ensure_ascii=False)
+        service = HealthService(data_dir=data_dir, store=MemoryStore())
+        service.instrumentation = None
+        service.catalogs.current.exercises.search.get()
+
+        def endpoint(query):
+            service.response_cache.clear()
+            return service.search_exercises({}, query)
+
+        worst = 0
+        print(f'{"query":<34} {"matches":>8} | {"index p50":>9} {"p99":>7} | {"endpoint p50":>12} {"p99":>7}')
+        for label, query in QUERIES:
+            filters = {param: query[param].split(',') for param in query if param != 'q'}
+            result = index.search(query.get('q', ''), filters)
+            searched = time_calls(lambda: index.search(query.get('q', ''), filters), args.rounds)
+            served = time_calls(lambda: endpoint(query), args.rounds)
+            worst = max(worst, percentile(served, 0.99))
+            shown = ' '.join(f'{name}={value}' for name, value in query.items()) or '(all)'
+            print(f'{label:<10} {shown[:23]:<23} {result.total:>8,} | '
+                  f'{percentile(searched, 0.5) * 1e6:7.0f}us {percentile(searched, 0.99) * 1e6:5.0f}us | '
+                  f'{percentile(served, 0.5) * 1e6:10.0f}us {percentile(served, 0.99) * 1e6:5.0f}us')
+        print(f'slowest endpoint p99: {worst * 1e3:.2f} ms')
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,168 @@
+"""Throughput from 1 to 8 worker processes sharing sharded state, and a live rebalance.
+
+    python -m benchmarks.bench_sharding [--nodes 4] [--workers 1 2 4 8] [--duration 5]
+
+Starts ``--nodes`` shard nodes with ``LocalCluster`` and seeds users onto
+them. Then, for each worker count, starts that many processes, each a
+``HealthService`` over a ``ShardedStore``, as separate server processes
+would be. They all run the same mix for ``--duration`` seconds: fetch a
+random user's workout, complete an exercise, read their stats. Users are
+picked from the whole population, so most requests touch a user that
+another worker wrote last.
+
+Requests per second are summed over the workers. Efficiency compares
+that to the single worker times the worker count; it can only be near
+100% while there are spare cores, for the nodes as well as the workers.
+CPU per request (workers and nodes together) shows whether more workers
+add overhead of their own: if it stays flat, throughput grows with cores.
+
+Last, a node is added while two workers keep going. Every completion a
+worker counted must then be in the store exactly once, the number of
+users must be unchanged and the new node should have taken about 1/N of
+them. The script exits non-zero if anything was lost.
+"""
+import argparse
+import os
+import random
+import time
+from multiprocessing import get_context
+
+from healthjourney.service import HealthService
+from healthjourney.sharding import LocalCluster, ShardedStore
+from healthjourney.store import new_progress
+from healthjourney.throttle import RateLimiter
+
+USERS = 5000
+MIX = ('workout', 'complete', 'stats')
+
+
+def cpu_seconds(pid):
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+
+
+def worker(nodes, authkey, seed, start, duration, results):
+    store = ShardedStore(nodes, authkey)
+    service = HealthService(store=store, demo_limiter=RateLimiter(rate=0))
+    service.instrumentation = None
+    rng = random.Random(seed)
+    counts = dict.fromkeys(MIX, 0)
+    errors = 0
+    start.wait()
+    cpu = time.process_time()
+    deadline = time.monotonic() + duration
+    while time.monotonic() < deadline:
+        user_id = f'user_{rng.randrange(USERS)}'
+        kind = MIX[rng.randrange(len(MIX))]
+        if kind == 'workout':
+            status = service.get_workout(user_id, {}).status
+        elif kind == 'complete':
+            status = service.complete_exercise({'user_id': user_id, 'exercise_id': 1, 'duration': 60}).status
+        else:
+            status = service.get_stats(user_id, {'range': '30d'}).status
+        if status == 200:
+            counts[kind] += 1
+        else:
+            errors += 1
+    results.put((counts, errors, time.process_time() - cpu))
+    store.close()
+
+
+def run(cluster, context, workers, duration, during=None):
+    start = context.Event()
+    results = context.Queue()
+    processes = [context.Process(target=worker, args=(cluster.nodes, cluster.authkey, seed, start, duration, results))
+                 for seed in range(workers)]
+    for process in processes:
+        process.start()
+    # Let every worker import and connect before the clock starts
+    time.sleep(1 + 0.2 * workers)
+    nodes_cpu = sum(cpu_seconds(process.pid) for process in cluster.processes.values())
+    began = time.perf_counter()
+    start.set()
+    extra = during() if during is not None else None
+    collected = [results.get() for _ in processes]
+    elapsed = time.perf_counter() - began
+    for process in processes:
+        process.join()
+    nodes_cpu = sum(cpu_seconds(process.pid) for process in cluster.processes.values()) - nodes_cpu
+    counts = dict.fromkeys(MIX, 0)
+    for worker_counts, _, _ in collected:
+        for kind, count in worker_counts.items():
+            counts[kind] += count
+    return {
+        'requests': sum(counts.values()),
+        'completions': counts['complete'],
+        'errors': sum(errors for _, errors, _ in collected),
+        'elapsed': elapsed,
+        'cpu': sum(cpu for _, _, cpu in collected) + nodes_cpu,
+        'extra': extra,
+    }
+
+
+def stored_completions(store):
+    events = 0
+    for user_id in store.user_ids():
+        events += len(store.export_user(user_id)['activity'])
+    return events
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--nodes', type=int, default=4)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, 2, 4, 8])
+    parser.add_argument('--duration', type=float, default=5)
+    args = parser.parse_args()
+
+    context = get_context('spawn')
+    cores = len(os.sched_getaffinity(0))
+    print(f'{cores} CPU core(s) available; {args.nodes} shard nodes')
+    if cores < max(args.workers) + args.nodes:
+        print('fewer cores than worker and node processes: aggregate throughput cannot scale linearly here, '
+              'CPU per request shows the overhead instead')
+
+    with LocalCluster(args.nodes) as cluster:
+        store = cluster.store()
+        store.save_profiles([(f'user_{i}', {'user_id': f'user_{i}', 'gender': 'female', 'weight': 60},
+                              new_progress()) for i in range(USERS)])
+        completions = 0
+
+        print(f'\n{"workers":>7} | {"req/s":>8} | {"efficiency":>10} | {"CPU us/req":>10} | {"errors":>6}')
+        single = None
+        for workers in args.workers:
+            result = run(cluster, context, workers, args.duration)
+            completions += result['completions']
+            rate = result['requests'] / result['elapsed']
+            single = single or rate / workers
+            print(f'{workers:>7} | {rate:8.0f} | {rate / (single * workers):10.0%} | '
+                  f'{result["cpu"] / result["requests"] * 1e6:10.0f} | {result["errors"]:>6}')
+            if result['errors']:
+                raise SystemExit(f'{result["errors"]} requests failed')
+
+        def add_node():
+            time.sleep(args.duration / 3)
+            began = time.perf_counter()
+            address, swept = cluster.add()
+            return address, swept, time.perf_counter() - began
+
+        result = run(cluster, context, 2, args.duration, during=add_node)
+        completions += result['completions']
+        address, swept, took = result['extra']
+        store.close()
+        store = cluster.store()
+        owned = len(store.shards[address].call('user_ids'))
+        users = len(store.user_ids())
+        stored = stored_completions(store)
+        print(f'\nadded {address} under load in {took * 1e3:.0f} ms: it owns {owned} of {users} users '
+              f'({owned / users:.1%}, ideal {1 / len(cluster.nodes):.1%}; {swept} moved by the sweep, '
+              f'the rest pulled on demand)')
+        print(f'{result["requests"]:,} requests during the rebalance, {result["errors"]} failed; '
+              f'{stored:,} of {completions:,} completions stored')
+        store.close()
+        if result['errors'] or users != USERS or stored != completions:
+            raise SystemExit('state was lost or duplicated while rebalancing')
+
+
+if __name__ == '__main__':
+    main()
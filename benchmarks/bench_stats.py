@@ -0,0 +1,138 @@
+"""GET /api/stats/<user_id>?range=90d for users with 10k+ completions.
+
+    python -m benchmarks.bench_stats [--users 20] [--completions 12000] [--range 90d]
+
+Each user gets a couple of years of workouts: sessions of a few
+exercises on most days, a finished program day after each session and
+about 1% of sessions logged late, out of time order. Both stores are
+loaded through ``log_activity``. Then the stats query is timed against
+rescanning the user's raw events for the same range. Totals and streaks
+from the rollups are checked against the rescan, so the benchmark also
+fails loudly if the rollups drift.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from healthjourney.activity import EPOCH, EXERCISE, SESSION, epoch_seconds, parse_range
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore, SQLiteStore
+
+NOW = datetime(2025, 6, 30, 20, 0)
+QUERIES = 2000
+LATE_SHARE = 0.01
+
+
+def sessions_for(user_index, completions):
+    """``(moment, events)`` sessions adding up to ``completions`` exercises."""
+    rng = random.Random(user_index)
+    sessions = []
+    moment = NOW - timedelta(days=730)
+    left = completions
+    while left > 0:
+        size = min(left, rng.randint(4, 12))
+        moment += timedelta(hours=rng.choice((12, 20, 24, 24, 30, 48, 72)))
+        moment = min(moment, NOW)
+        events = [(EXERCISE, round(rng.uniform(3, 40), 1), None) for _ in range(size)]
+        sessions.append((moment, events + [(SESSION, 0, len(sessions) + 1)]))
+        left -= size
+    # Some sessions arrive late, after newer ones
+    for i in range(len(sessions) - 1):
+        if rng.random() < LATE_SHARE:
+            sessions[i], sessions[i + 1] = sessions[i + 1], sessions[i]
+    return sessions
+
+
+def rescan(events, first_day, last_day):
+    """Totals and streaks for the range from raw ``(at, kind, calories)`` events."""
+    start = epoch_seconds(datetime.fromordinal(first_day))
+    end = epoch_seconds(datetime.fromordinal(last_day + 1))
+    calories = exercises = sessions = 0
+    days = set()
+    for at, kind, kcal in events:
+        day = EPOCH.toordinal() + at // 86400
+        days.add(day)
+        if start <= at < end:
+            calories += kcal
+            exercises += kind == EXERCISE
+            sessions += kind == SESSION
+    active = sum(1 for day in days if first_day <= day <= last_day)
+    longest = run = 0
+    previous = None
+    for day in sorted(days):
+        run = run + 1 if previous == day - 1 else 1
+        longest = max(longest, run)
+        previous = day
+    current = run if previous is not None and previous >= last_day - 1 else 0
+    return {'calories': round(calories, 1), 'exercises': exercises, 'sessions': sessions, 'active_days': active}, \
+        {'current': current, 'longest': longest}
+
+
+def time_queries(service, users, days):
+    query = {'range': f'{days}d'}
+    for user_id in users:
+        service.get_stats(user_id, query)
+    start = time.perf_counter()
+    for i in range(QUERIES):
+        service.get_stats(users[i % len(users)], query)
+    return (time.perf_counter() - start) / QUERIES
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--completions', type=int, default=12_000)
+    parser.add_argument('--range', default='90d')
+    args = parser.parse_args()
+    days = parse_range(args.range)
+    last_day = NOW.toordinal()
+    first_day = last_day - days + 1
+
+    users = [f'user_{i}' for i in range(args.users)]
+    plans = {user_id: sessions_for(i, args.completions) for i, user_id in enumerate(users)}
+    raw = {user_id: [(epoch_seconds(moment), kind, kcal) for moment, events in sessions for kind, kcal, _ in events]
+           for user_id, sessions in plans.items()}
+
+    data_dir = tempfile.mkdtemp(prefix='healthjourney-stats-')
+    try:
+        stores = (('memory', MemoryStore()), ('sqlite', SQLiteStore(os.path.join(data_dir, 'stats.db'))))
+        for label, store in stores:
+            events = 0
+            start = time.perf_counter()
+            for user_id, sessions in plans.items():
+                store.save_user(user_id, {'user_id': user_id})
+                for moment, session in sessions:
+                    store.log_activity(user_id, moment, session)
+                    events += len(session)
+            load = (time.perf_counter() - start) / events
+
+            service = HealthService(store=store, now=lambda: NOW)
+            service.instrumentation = None
+            for user_id in users:
+                body = json.loads(service.get_stats(user_id, {'range': args.range}).body)
+                expected_totals, expected_streak = rescan(raw[user_id], first_day, last_day)
+                if body['totals'] != expected_totals or body['streak'] != expected_streak:
+                    raise SystemExit(f'{label}: rollups for {user_id} disagree with the raw events:\n'
+                                     f'  {body["totals"]} {body["streak"]}\n  {expected_totals} {expected_streak}')
+            query = time_queries(service, users, days)
+
+            scan_start = time.perf_counter()
+            rounds = max(1, QUERIES // 100)
+            for i in range(rounds):
+                rescan(raw[users[i % len(users)]], first_day, last_day)
+            scan = (time.perf_counter() - scan_start) / rounds
+            print(f'{label:>6} | {args.users} users x {events // args.users:,} events | '
+                  f'log {load * 1e6:5.1f} us/event | stats {args.range} {query * 1e6:7.1f} us | '
+                  f'rescan {scan * 1e6:9.1f} us ({scan / query:5.0f}x)')
+            store.close()
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""Load benchmark for the storage backends behind POST /api/workout/complete.
+
+    python -m benchmarks.bench_store [--requests 20000] [--threads 1 8 32]
+
+Each backend is swapped into the Flask app and driven through the test
+client from a pool of threads, so the numbers include routing, JSON and
+the store write (for SQLite: the group commit).
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import app as flask_app
+from healthjourney.calories import body_weight, calories, exercise_rates
+from healthjourney.store import MemoryStore, SQLiteStore, new_progress
+
+USERS = 100
+EXERCISE_ID = 1
+DURATION = 60
+
+
+def seed(store):
+    for i in range(USERS):
+        user_id = f'bench_{i}'
+        store.save_user(user_id, user(user_id))
+        store.save_progress(user_id, new_progress())
+
+
+def user(user_id):
+    return {'user_id': user_id, 'gender': 'male', 'weight': 70}
+
+
+def calories_per_request():
+    exercise = flask_app.service.catalogs.current.exercises.index.get(EXERCISE_ID)
+    return calories(*exercise_rates(exercise), body_weight(user('bench')), DURATION, 0)
+
+
+def drive(store, requests, threads):
+    flask_app.service.store = store
+    per_thread = requests // threads
+
+    def worker(worker_id):
+        client = flask_app.app.test_client()
+        for i in range(per_thread):
+            response = client.post('/api/workout/complete', json={
+                'user_id': f'bench_{(worker_id + i) % USERS}',
+                'exercise_id': EXERCISE_ID,
+                'duration': DURATION
+            })
+            assert response.status_code == 200, response.data
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(worker, range(threads)))
+    elapsed = time.perf_counter() - start
+
+    # Every request adds the same calories (all users weigh the same); nothing may be lost
+    total = sum(store.get_progress(f'bench_{i}')['total_calories_burned'] for i in range(USERS))
+    assert round(total, 1) == round(per_thread * threads * calories_per_request(), 1), total
+    return per_thread * threads / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=20_000)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 8, 32])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for threads in args.threads:
+            memory = MemoryStore()
+            seed(memory)
+            sqlite = SQLiteStore(os.path.join(tmp, f'bench_{threads}.db'))
+            seed(sqlite)
+            try:
+                memory_rate = drive(memory, args.requests, threads)
+                sqlite_rate = drive(sqlite, args.requests, threads)
+            finally:
+                sqlite.close()
+            print(f'{threads:>3} threads | memory {memory_rate:9,.0f} req/s | sqlite {sqlite_rate:9,.0f} req/s')
+
+
+if __name__ == '__main__':
+    main()
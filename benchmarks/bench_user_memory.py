@@ -0,0 +1,101 @@
+"""Memory per user: profile and progress dicts against the slotted records.
+
+    python -m benchmarks.bench_user_memory [--users 1000000]
+
+Builds the same population twice, as ``MemoryStore`` held it before
+(the request dicts plus progress dicts with ISO timestamps) and as
+``UserRecord``/``ProgressRecord`` objects. Profiles have every field the
+profile form sends, loaded through the profile schema as the service
+stores them. Each is parsed from its own JSON text, as a request body
+would be, so no strings are shared between users. The memory counted is what tracemalloc sees still
+allocated after each build. Also times reading one field and turning
+a record back into the response dict.
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.synthetic import generate_profiles
+from healthjourney.profiles import compute_metrics
+from healthjourney.records import ProgressRecord, UserRecord
+from healthjourney.schemas import PROFILE_SCHEMA
+from healthjourney.store import new_progress
+
+START = datetime(2025, 1, 1, 8, 30)
+
+
+def request_bodies(count):
+    """JSON bodies of POST /api/profile, as the service completes them."""
+    bodies = []
+    for i, profile in enumerate(generate_profiles(count, tiers=3)):
+        profile['economicLevel'] = ('basic', 'medium', 'premium')[i % 3]
+        profile = PROFILE_SCHEMA.load(profile)
+        bmi, bmr = compute_metrics(profile['height'], profile['weight'], profile['age'], profile['gender'])
+        profile.update(bmi=bmi, bmr=bmr, created_at=(START + timedelta(seconds=i)).isoformat())
+        bodies.append(json.dumps(profile))
+    return bodies
+
+
+def build(bodies, compact):
+    users = {}
+    progress = {}
+    for i, body in enumerate(bodies):
+        user = json.loads(body)
+        record = new_progress(START + timedelta(seconds=i))
+        if compact:
+            user = UserRecord.from_dict(user)
+            record = ProgressRecord.from_dict(record)
+        users[user['user_id']] = user
+        progress[user['user_id']] = record
+    return users, progress
+
+
+def measure(bodies, compact):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    users, progress = build(bodies, compact)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return users, progress, size, elapsed
+
+
+def time_reads(users, rounds=3):
+    values = list(users.values())[:100_000]
+    read = to_dict = float('inf')
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for user in values:
+            user.get('fitnessLevel', 'beginner')
+        read = min(read, (time.perf_counter() - start) / len(values))
+        start = time.perf_counter()
+        for user in values:
+            user.to_dict() if isinstance(user, UserRecord) else user
+        to_dict = min(to_dict, (time.perf_counter() - start) / len(values))
+    return read, to_dict
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    bodies = request_bodies(args.users)
+    results = {}
+    for label, compact in (('dicts', False), ('records', True)):
+        users, progress, size, elapsed = measure(bodies, compact)
+        read, to_dict = time_reads(users)
+        results[label] = size
+        print(f'{label:>7} | {args.users:,} users | {size / 2**20:8.1f} MiB | {size / args.users:6.0f} B/user | '
+              f'built in {elapsed:5.1f} s | get {read * 1e9:4.0f} ns | to_dict {to_dict * 1e9:5.0f} ns')
+        del users, progress
+    print(f'records use {results["records"] / results["dicts"]:.0%} of the memory of dicts')
+
+
+if __name__ == '__main__':
+    main()
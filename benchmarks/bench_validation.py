@@ -0,0 +1,182 @@
+"""Cost of validating request bodies: compiled schemas against the old ad-hoc checks.
+
+    python -m benchmarks.bench_validation [--rounds 200000]
+
+``before`` is the checking each handler did inline until now: a loop of
+``data.get(field)`` truthiness tests plus ``float()`` for profiles, and
+``parse_completion`` for each completion. ``after`` is the compiled
+schema's ``load``, which also checks enums, ranges and string lengths
+and builds the dict that gets stored. ``walked`` applies the same rules
+as ``load`` by looping over the schema's fields and dispatching on each
+field's kind, which is what compiling saves. All three run on the same
+parsed bodies: a profile as the form sends it, a completion, and a
+session of 20 completions.
+
+The old profile check only tested six fields for truthiness, while the
+schema checks all fourteen fields the form sends, so every body is also
+compared per field checked. The script exits non-zero if ``load`` is
+slower than walking the same schema, or costs more per field than the
+old checks for any body, profiles included.
+
+Then 10,000 profiles, each sent with a 2 KB field the app does not use,
+are stored both ways, and the memory the store keeps is compared.
+"""
+import argparse
+import gc
+import json
+import math
+import time
+import tracemalloc
+
+from healthjourney.schemas import COMPLETION_SCHEMA, PROFILE_SCHEMA, SESSION_SCHEMA
+from healthjourney.store import MemoryStore
+
+REQUIRED_FIELDS = ['firstName', 'lastName', 'age', 'height', 'weight', 'gender']
+
+PROFILE = {'user_id': 'user_1760000000000_k3j9x2m1q', 'firstName': 'سارة', 'lastName': 'أحمد', 'age': 28.0,
+           'height': 165.0, 'weight': 60.0, 'gender': 'female', 'goal': 'toning', 'fitnessLevel': 'intermediate',
+           'preferredTime': '07:00', 'equipment': 'basic', 'economicLevel': 'medium', 'workoutDays': '5',
+           'notifications': 'on'}
+COMPLETION = {'user_id': 'sara', 'exercise_id': 12, 'duration': 95, 'day': 3}
+SESSION = {'user_id': 'sara', 'completions': [{'exercise_id': i, 'duration': 30 + i, 'day': 3} for i in range(20)]}
+
+STORED_PROFILES = 10_000
+PADDING = 2048
+
+
+def adhoc_profile(data):
+    if not isinstance(data, dict):
+        return 'Profile must be an object'
+    for field in REQUIRED_FIELDS:
+        if not data.get(field):
+            return f'Missing {field}'
+    return float(data['height']), float(data['weight']), float(data['age'])
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def parse_completion(data):
+    if not isinstance(data, dict):
+        raise ValueError('Completion must be an object')
+    seconds = data.get('duration', 0)
+    reps = data.get('reps_completed', 0)
+    if not _is_number(seconds) or seconds < 0:
+        raise ValueError('Invalid duration')
+    if not _is_number(reps) or reps < 0:
+        raise ValueError('Invalid reps_completed')
+    day = data.get('day')
+    return data.get('exercise_id'), seconds, reps, day if isinstance(day, int) else None
+
+
+def adhoc_session(data):
+    entries = data.get('completions')
+    if not isinstance(entries, list) or not entries:
+        return 'Missing completions'
+    return [(data.get('user_id'),) + parse_completion(entry) for entry in entries]
+
+
+def walk(schema, data):
+    """The rules ``schema.load`` compiles, applied one field at a time."""
+    if not isinstance(data, dict):
+        raise ValueError(f'{schema.title} must be an object')
+    out = {}
+    for key, field in schema.fields.items():
+        value = data.get(key)
+        if value is None:
+            if field.required:
+                raise ValueError(f'Missing {key}')
+            if field.default is not None:
+                out[key] = field.default
+            continue
+        if field.kind in ('number', 'integer'):
+            if isinstance(value, str):
+                value = int(value) if field.kind == 'integer' or value.isdecimal() else float(value)
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ValueError(f'Invalid {key}')
+            if not field.minimum <= value <= field.maximum:
+                raise ValueError(f'{key} must be between {field.minimum} and {field.maximum}')
+        elif field.kind == 'string':
+            if not isinstance(value, str) or len(value) > field.max_length or field.required and not value:
+                raise ValueError(f'Invalid {key}')
+        elif field.kind == 'choice':
+            if value not in field.choices:
+                raise ValueError(f'Invalid {key}')
+        elif field.kind == 'identifier':
+            if not isinstance(value, (str, int)):
+                raise ValueError(f'Invalid {key}')
+        elif field.kind == 'list':
+            if not isinstance(value, list) or not value or len(value) > field.maximum:
+                raise ValueError(f'Invalid {key}')
+            value = [walk(field.items, item) for item in value]
+        out[key] = value
+    return out
+
+
+def per_call(functions, body, rounds, chunks=20):
+    """The best time per call of each function, over many short runs.
+
+    The functions take turns, so a machine that speeds up or slows down
+    while the benchmark runs affects all of them alike.
+    """
+    best = [math.inf] * len(functions)
+    for _ in range(chunks):
+        for i, function in enumerate(functions):
+            start = time.perf_counter()
+            for _ in range(rounds // chunks):
+                function(body)
+            best[i] = min(best[i], (time.perf_counter() - start) / (rounds // chunks))
+    return best
+
+
+def retained(bodies, clean):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    store = MemoryStore()
+    for body in bodies:
+        # Parsed here, so every request owns the strings of its body
+        data = json.loads(body)
+        store.save_user(data['user_id'], PROFILE_SCHEMA.load(data) if clean else data)
+    del data
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size, store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rounds', type=int, default=200_000)
+    args = parser.parse_args()
+
+    # label, old check, schema, body, fields each checks
+    cases = (
+        ('profile', adhoc_profile, PROFILE_SCHEMA, PROFILE, (len(REQUIRED_FIELDS), len(PROFILE_SCHEMA.fields))),
+        ('completion', parse_completion, COMPLETION_SCHEMA, COMPLETION, (5, 5)),
+        ('session of 20', adhoc_session, SESSION_SCHEMA, SESSION, (2 + 20 * 5, 2 + 20 * 5)),
+    )
+    print(f'{"body":<14} | {"before ns":>9} | {"walked ns":>9} | {"after ns":>9} | {"after/before":>12} | '
+          f'{"ns/field before":>15} | {"ns/field after":>14}')
+    slower = []
+    for label, before, schema, body, (old_fields, new_fields) in cases:
+        rounds = args.rounds * 2 // (old_fields + new_fields)
+        old, walked, new = per_call((before, lambda data: walk(schema, data), schema.load), body, rounds)
+        print(f'{label:<14} | {old * 1e9:9.0f} | {walked * 1e9:9.0f} | {new * 1e9:9.0f} | {new / old:12.2f} | '
+              f'{old / old_fields * 1e9:15.0f} | {new / new_fields * 1e9:14.0f}')
+        if new > walked or new / new_fields > old / old_fields:
+            slower.append(label)
+
+    padded = [json.dumps(dict(PROFILE, user_id=f'user_{i}', notes='x' * PADDING + str(i)))
+              for i in range(STORED_PROFILES)]
+    kept, _ = retained(padded, clean=False)
+    cleaned, _ = retained(padded, clean=True)
+    print(f'\n{STORED_PROFILES:,} profiles sent with a {PADDING:,} byte unknown field: '
+          f'stored as sent {kept / 2**20:.1f} MB, schema fields only {cleaned / 2**20:.1f} MB')
+    if slower:
+        raise SystemExit(f'compiled validation is slower than the ad-hoc checks for: {", ".join(slower)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,241 @@
+"""Check that the Flask app, the Netlify function and the ASGI app answer identically.
+
+    python -m benchmarks.check_parity
+
+Runs one request corpus through every adapter, each backed by a fresh
+service with the same fixed clock, and compares status, API headers and
+body bytes, with generated user IDs masked. Exits non-zero on the first
+mismatch.
+"""
+import asyncio
+import base64
+import importlib.util
+import json
+import os
+import re
+import sys
+import urllib.parse
+from datetime import datetime
+
+import app as flask_app
+import asgi
+from healthjourney.instrumentation import Instrumentation
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore
+from healthjourney.throttle import RateLimiter
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Headers set by the service (the servers add their own, e.g. Content-Length)
+COMPARED_HEADERS = ('Content-Type', 'Access-Control-Allow-Origin', 'ETag', 'Vary', 'Content-Encoding', 'Retry-After')
+
+# Every request comes from this address
+CLIENT = '203.0.113.7'
+
+PROFILE = {'firstName': 'سارة', 'lastName': 'أحمد', 'age': 28, 'height': 165, 'weight': 60,
+           'gender': 'female', 'fitnessLevel': 'intermediate', 'goal': 'toning', 'economicLevel': 'premium'}
+
+# Profiles sent without an ID get a random one, different in each adapter
+GENERATED_ID = re.compile(rb'user_\d+_[0-9a-f]{32}')
+
+# (method, path, body, headers); a headers value of ETAG is replaced by the
+# ETag of the previous response from the same adapter
+ETAG = object()
+CORPUS = [
+    ('POST', '/profile', json.dumps(dict(PROFILE, user_id='sara')), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps(PROFILE), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps({'firstName': 'x'}), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps(dict(PROFILE, height='tall')), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', '{not json', {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps([1, 2]), {'Content-Type': 'application/json'}),
+    # Zero and numeric strings are valid; unknown fields are dropped
+    ('POST', '/profile', json.dumps(dict(PROFILE, user_id='zero', age=0, height='170', workoutDays='5', admin=True)),
+     {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps(dict(PROFILE, age=-1)), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps(dict(PROFILE, weight=True)), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps(dict(PROFILE, gender='other')), {'Content-Type': 'application/json'}),
+    ('POST', '/profile', json.dumps(dict(PROFILE, notes='x' * 20000)), {'Content-Type': 'application/json'}),
+    ('POST', '/profiles/batch', json.dumps([dict(PROFILE, user_id=f'b{i}') for i in range(3)] + [{}]),
+     {'Content-Type': 'application/json'}),
+    ('POST', '/profiles/batch', '\n'.join(json.dumps(dict(PROFILE, gender='male')) for _ in range(3)) + '\nnope',
+     {'Content-Type': 'application/x-ndjson'}),
+    ('POST', '/profiles/batch', '{"a": 1}', {'Content-Type': 'application/json'}),
+    ('GET', '/profile/sara', None, {}),
+    ('GET', '/profile/b1', None, {}),
+    ('GET', '/profile/zero', None, {}),
+    ('GET', '/profile/nobody', None, {}),
+    ('GET', '/workout/sara', None, {}),
+    ('GET', '/workout/demo', None, {}),
+    ('GET', '/workout/demo', None, {'If-None-Match': ETAG}),
+    ('GET', '/nutrition/sara', None, {}),
+    ('GET', '/nutrition/demo2', None, {'Accept-Encoding': 'gzip, br'}),
+    ('GET', '/profile/demo', None, {}),
+    ('GET', '/stats/demo?range=7d', None, {}),
+    ('GET', '/workout/scan1', None, {}),
+    ('GET', '/nutrition/scan2', None, {}),
+    ('GET', '/workout/scan3', None, {}),
+    ('GET', '/nutrition/scan3', None, {}),
+    ('GET', '/workout/scan1', None, {}),
+    ('POST', '/workout/complete', json.dumps({'user_id': 'sara', 'exercise_id': 1, 'duration': 95}), {}),
+    ('POST', '/workout/complete', json.dumps({'user_id': 'sara', 'exercise_id': 2, 'duration': 30, 'day': 1}), {}),
+    ('POST', '/workout/complete', json.dumps({'user_id': 'demo2', 'duration': 30}), {}),
+    ('POST', '/workout/complete', '{"user_id": "sara"', {}),
+    ('POST', '/workout/complete', json.dumps({'user_id': 'ghost', 'duration': 30}), {}),
+    ('POST', '/workout/complete', json.dumps({'user_id': 'sara', 'exercise_id': 5, 'duration': 'long'}), {}),
+    ('POST', '/workout/complete/batch', json.dumps({'user_id': 'sara', 'completions': [
+        {'exercise_id': 1, 'duration': 90, 'day': 2}, {'exercise_id': 3, 'reps_completed': 20, 'day': 2},
+        {'exercise_id': 'nope', 'duration': 40}]}), {}),
+    ('POST', '/workout/complete/batch', json.dumps({'user_id': 'sara', 'completions': []}), {}),
+    ('POST', '/workout/complete/batch', json.dumps({'user_id': 'sara', 'completions': [{'duration': -1}]}), {}),
+    ('POST', '/workout/complete/batch', json.dumps({'user_id': 'sara', 'completions': [5]}), {}),
+    ('POST', '/workout/complete', json.dumps({'user_id': 'sara', 'exercise_id': 1, 'duration': True}), {}),
+    ('POST', '/workout/complete/batch', json.dumps({'user_id': 'ghost', 'completions': [{'duration': 1}]}), {}),
+    ('POST', '/workout/day/complete', json.dumps({'user_id': 'sara', 'day': 1}), {}),
+    ('POST', '/workout/day/complete', json.dumps({'user_id': 'sara', 'day': 2}), {}),
+    ('POST', '/workout/day/complete', json.dumps({'user_id': 'sara', 'day': 5}), {}),
+    ('POST', '/workout/day/complete', json.dumps({'user_id': 'sara', 'day': 0}), {}),
+    ('POST', '/workout/day/complete', json.dumps({'user_id': 'ghost', 'day': 1}), {}),
+    ('POST', '/workout/day/complete', json.dumps([1]), {}),
+    ('POST', '/workout/day/complete', json.dumps({'user_id': 'sara', 'day': 'x'}), {}),
+    ('GET', '/workout/sara', None, {}),
+    ('GET', '/stats/sara', None, {}),
+    ('GET', '/stats/sara?range=90d', None, {}),
+    ('GET', '/stats/b1?range=7d', None, {}),
+    ('GET', '/stats/sara?range=week', None, {}),
+    ('GET', '/stats/sara?range=0d', None, {}),
+    ('GET', '/stats/ghost', None, {}),
+    ('GET', '/exercises', None, {}),
+    ('GET', '/exercises', None, {'If-None-Match': ETAG}),
+    ('GET', '/exercises', None, {'Accept-Encoding': 'gzip'}),
+    ('GET', '/exercises', None, {'Accept-Encoding': 'gzip', 'If-None-Match': ETAG}),
+    ('GET', '/exercises', None, {'Accept-Encoding': 'gzip;q=abc'}),
+    ('GET', '/exercises?limit=2&fields=id,name', None, {}),
+    ('GET', '/exercises?limit=2&cursor=WzEsMl0', None, {}),
+    ('GET', '/exercises?format=ndjson&fields=id,category', None, {}),
+    ('GET', '/exercises?stream=1&limit=3', None, {}),
+    ('GET', '/exercises?cursor=bad', None, {}),
+    ('GET', '/exercises/search?q=%D8%A7%D9%84%D8%B6%D8%BA%D8%B7', None, {}),
+    ('GET', '/exercises/search?q=%D8%B6%D8%BA', None, {}),
+    ('GET', '/exercises/search?q=mount%20CLIMB', None, {}),
+    ('GET', '/exercises/search?q=%D8%AA%D9%85&category=legs,cardio&limit=1', None, {}),
+    ('GET', '/exercises/search?q=%D8%AA%D9%85&category=legs,cardio&limit=1&cursor=WzEsMl0', None, {}),
+    ('GET', '/exercises/search?equipment=%D8%A8%D8%AF%D9%88%D9%86%20%D9%85%D8%B9%D8%AF%D8%A7%D8%AA&fields=id', None, {}),
+    ('GET', '/exercises/search?q=nothing', None, {}),
+    ('GET', '/exercises/search?limit=0', None, {}),
+    ('GET', '/metrics', None, {}),
+    ('GET', '/metrics?format=json', None, {}),
+    ('GET', '/unknown', None, {}),
+    ('GET', '/workout/complete', None, {}),
+    ('GET', '/profile/sara/extra', None, {}),
+    ('GET', '/profile/', None, {}),
+    ('DELETE', '/profile/sara', None, {}),
+    ('POST', '/exercises', '{}', {}),
+]
+
+
+def fixed_clock():
+    return datetime(2025, 1, 1, 8, 30)
+
+
+def fixed_service():
+    # Every request takes no time, so the metrics endpoints match too.
+    # The client may create four demo users and then no more
+    return HealthService(store=MemoryStore(), now=fixed_clock,
+                         instrumentation=Instrumentation(clock=lambda: 0.0),
+                         demo_limiter=RateLimiter(rate=0.001, burst=4))
+
+
+def load_netlify_module():
+    spec = importlib.util.spec_from_file_location(
+        'netlify_api', os.path.join(PROJECT_ROOT, 'netlify', 'functions', 'api.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def flask_adapter():
+    flask_app.service = fixed_service()
+    client = flask_app.app.test_client()
+
+    def send(method, path, body, headers):
+        response = client.open('/api' + path, method=method, data=body, headers=headers,
+                               environ_base={'REMOTE_ADDR': CLIENT})
+        return (response.status_code,
+                {name: response.headers.get(name) for name in COMPARED_HEADERS},
+                response.get_data())
+    return send
+
+
+def netlify_adapter():
+    module = load_netlify_module()
+    module.service = fixed_service()
+
+    def send(method, path, body, headers):
+        path, _, query = path.partition('?')
+        result = module.handler({
+            'httpMethod': method,
+            'path': '/.netlify/functions/api' + path,
+            'queryStringParameters': dict(urllib.parse.parse_qsl(query)) or None,
+            'headers': dict(headers, **{'X-Nf-Client-Connection-Ip': CLIENT}),
+            'body': body,
+        }, None)
+        body = result['body']
+        body = base64.b64decode(body) if result.get('isBase64Encoded') else body.encode('utf-8')
+        return (result['statusCode'],
+                {name: result['headers'].get(name) for name in COMPARED_HEADERS},
+                body)
+    return send
+
+
+def asgi_adapter():
+    asgi.service = fixed_service()
+
+    def send(method, path, body, headers):
+        path, _, query = path.partition('?')
+        scope = {
+            'type': 'http',
+            'method': method,
+            'path': '/api' + path,
+            'query_string': query.encode('latin-1'),
+            'client': (CLIENT, 50000),
+            'headers': [(name.lower().encode('latin-1'), value.encode('latin-1')) for name, value in headers.items()],
+        }
+        request = {'type': 'http.request', 'body': (body or '').encode('utf-8'), 'more_body': False}
+        messages = []
+
+        async def receive():
+            return request
+
+        async def collect(message):
+            messages.append(message)
+
+        asyncio.run(asgi.app(scope, receive, collect))
+        response_headers = {name.decode('latin-1').lower(): value.decode('latin-1')
+                            for name, value in messages[0]['headers']}
+        return (messages[0]['status'],
+                {name: response_headers.get(name.lower()) for name in COMPARED_HEADERS},
+                b''.join(message.get('body', b'') for message in messages[1:]))
+    return send
+
+
+def run(corpus):
+    adapters = {'flask': flask_adapter(), 'netlify': netlify_adapter(), 'asgi': asgi_adapter()}
+    last_etag = dict.fromkeys(adapters)
+    for number, (method, path, body, headers) in enumerate(corpus, 1):
+        results = {}
+        for name, send in adapters.items():
+            resolved = {key: (last_etag[name] if value is ETAG else value) for key, value in headers.items()}
+            status, sent_headers, sent = send(method, path, body, resolved)
+            results[name] = status, sent_headers, GENERATED_ID.sub(b'user_<generated>', sent)
+            last_etag[name] = results[name][1]['ETag']
+        if any(result != results['flask'] for result in results.values()):
+            print(f'#{number} {method} {path}: responses differ')
+            for name, result in results.items():
+                print(f'  {name:>7}: {result[0]} {result[1]} {result[2][:200]!r}')
+            return False
+    print(f'{len(corpus)} requests, identical responses from all {len(adapters)} adapters')
+    return True
+
+
+if __name__ == '__main__':
+    sys.exit(0 if run(CORPUS) else 1)
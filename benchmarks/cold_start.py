@@ -0,0 +1,90 @@
+"""Cold-start harness for the Netlify function.
+
+    python -m benchmarks.cold_start [--sizes 6 10000 100000] [--repeat 5]
+
+For each catalog size and loading mode (JSON text vs precompiled snapshot)
+a fresh interpreter imports netlify/functions/api.py and serves its first
+requests. The harness reports import time, first-request latency for a
+route that needs no catalog (POST /profile) and one that does
+(GET /workout), and peak RSS. Size 6 uses the real data/ directory.
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.synthetic import generate_exercises
+from healthjourney.data import DATA_DIR, build_snapshots
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = r'''
+import json, resource, sys, time
+start = time.perf_counter()
+import importlib.util
+spec = importlib.util.spec_from_file_location('api', sys.argv[1])
+api = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(api)
+imported = time.perf_counter()
+api.handler({'httpMethod': 'POST', 'path': '/.netlify/functions/api/profile', 'body': json.dumps({
+    'user_id': 'u1', 'firstName': 'a', 'lastName': 'b', 'age': 30, 'height': 175, 'weight': 70,
+    'gender': 'male', 'fitnessLevel': 'beginner'})}, None)
+profiled = time.perf_counter()
+api.handler({'httpMethod': 'GET', 'path': '/.netlify/functions/api/workout/u1'}, None)
+worked = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - start) * 1e3,
+    'profile_ms': (profiled - imported) * 1e3,
+    'workout_ms': (worked - profiled) * 1e3,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}))
+'''
+
+
+def prepare(size, tmp):
+    data_dir = os.path.join(tmp, f'data_{size}')
+    os.makedirs(data_dir)
+    shutil.copy(os.path.join(DATA_DIR, 'nutrition.json'), data_dir)
+    if size <= 6:
+        shutil.copy(os.path.join(DATA_DIR, 'exercises.json'), data_dir)
+    else:
+        with open(os.path.join(data_dir, 'exercises.json'), 'w', encoding='utf-8') as f:
+            json.dump({'exercises': generate_exercises(size)}, f, ensure_ascii=False)
+    return data_dir
+
+
+def measure(data_dir, repeat):
+    env = dict(os.environ, HEALTHJOURNEY_DATA_DIR=data_dir)
+    api_path = os.path.join(PROJECT_ROOT, 'netlify', 'functions', 'api.py')
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, '-c', CHILD, api_path], env=env,
+                                capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[6, 10_000, 100_000])
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    print(f'{"exercises":>10} {"mode":>9} {"import":>10} {"/profile":>10} {"/workout":>10} {"rss":>9}')
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            data_dir = prepare(size, tmp)
+            for mode in ('json', 'snapshot'):
+                if mode == 'snapshot':
+                    build_snapshots(data_dir)
+                result = measure(data_dir, args.repeat)
+                print(f'{size:>10,} {mode:>9} {result["import_ms"]:8.1f}ms {result["profile_ms"]:8.2f}ms '
+                      f'{result["workout_ms"]:8.1f}ms {result["rss_mb"]:7.1f}MB')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+"""Memory and CPU under an ID-enumeration flood of GET /api/workout.
+
+    python -m benchmarks.flood_test [--requests 400000] [--threads 8] [--attackers 256]
+
+Threads call the service as a threaded server would. Most requests come
+from ``--attackers`` addresses that each ask for a never-seen user ID
+every time. The rest come from real users fetching their own workouts,
+several at once for the same user. After every window of requests it
+prints the process's resident memory, CPU time per request, demo users
+held, users in the store and how many requests were refused (429).
+
+It runs twice. ``guarded`` uses the default limits, so memory and CPU
+per request should level off after the first window. ``unbounded``
+turns the rate limit off and never evicts demo users, which is how
+every scanned ID used to be kept. Real users must never be refused.
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import tempfile
+import threading
+import time
+
+from benchmarks.synthetic import generate_exercises
+from healthjourney.service import DEMO_POOL_SIZE, DEMO_TTL, HealthService
+from healthjourney.store import MemoryStore, new_progress
+from healthjourney.throttle import RateLimiter
+
+WINDOWS = 8
+REAL_USERS = 200
+# Share of requests that come from real users
+REAL_SHARE = 0.1
+
+
+def rss_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def make_service(data_dir, guarded):
+    if guarded:
+        service = HealthService(data_dir=data_dir, store=MemoryStore(),
+                                demo_pool_size=DEMO_POOL_SIZE, demo_ttl=DEMO_TTL, demo_limiter=RateLimiter())
+    else:
+        service = HealthService(data_dir=data_dir, store=MemoryStore(),
+                                demo_pool_size=2**62, demo_ttl=None, demo_limiter=RateLimiter(rate=0))
+    service.instrumentation = None
+    for i in range(REAL_USERS):
+        user_id = f'real_{i}'
+        service.store.save_user(user_id, {'user_id': user_id, 'fitnessLevel': 'intermediate', 'gender': 'female'})
+        service.store.save_progress(user_id, new_progress())
+    service.get_workout('real_0', {})
+    return service
+
+
+def run(service, args, label):
+    window = args.requests // WINDOWS
+    real_every = round(1 / REAL_SHARE)
+    refused = {'real': 0, 'scan': 0}
+    lock = threading.Lock()
+
+    def request(n):
+        if n % real_every == 0:
+            # Real users in small groups, so requests for one user overlap
+            user_id = f'real_{n // (real_every * 4) % REAL_USERS}'
+            return 'real', service.get_workout(user_id, {}, f'198.51.100.{n % 200}').status
+        attacker = n % args.attackers
+        return 'scan', service.get_workout(f'scan_{n}', {}, f'10.0.{attacker // 256}.{attacker % 256}').status
+
+    def worker(numbers):
+        for n in numbers:
+            kind, status = request(n)
+            if status == 429:
+                with lock:
+                    refused[kind] += 1
+
+    print(f'\n{label}')
+    print(f'{"requests":>9} | {"RSS MB":>7} | {"CPU us/req":>10} | {"demo users":>10} | {"stored":>6} | '
+          f'{"429 scan":>8} | {"429 real":>8}')
+    for done in range(window, window * WINDOWS + 1, window):
+        # Threads take request numbers from one shared iterator, which
+        # the GIL keeps consistent
+        numbers = iter(range(done - window, done))
+        threads = [threading.Thread(target=worker, args=(numbers,)) for _ in range(args.threads)]
+        cpu = time.process_time()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.process_time() - cpu
+        print(f'{done:>9,} | {rss_mb():7.1f} | {elapsed / window * 1e6:10.1f} | {len(service.demo_users):>10,} | '
+              f'{len(service.store.users):>6,} | {refused["scan"]:>8,} | {refused["real"]:>8,}')
+    print(f'coalesced workout requests: {service._workouts.shared:,}')
+    return refused
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=400_000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--attackers', type=int, default=256)
+    parser.add_argument('--exercises', type=int, default=2000)
+    args = parser.parse_args()
+
+    data_dir = tempfile.mkdtemp(prefix='healthjourney-flood-')
+    try:
+        with open(os.path.join(data_dir, 'exercises.json'), 'w', encoding='utf-8') as f:
+            json.dump({'exercises': generate_exercises(args.exercises)}, f, ensure_ascii=False)
+        for label, guarded in (('guarded', True), ('unbounded', False)):
+            refused = run(make_service(data_dir, guarded), args, label)
+            if refused['real']:
+                raise SystemExit(f'{label}: {refused["real"]} requests from real users were refused')
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,188 @@
+"""Compare the sync (Flask) and async (ASGI) servers under many connections.
+
+    python -m benchmarks.load_test [--connections 1000 5000 10000] [--duration 10]
+
+Starts each server in a subprocess on a local port: ``app.py``'s Flask
+app on werkzeug's threaded server, and ``asgi.py`` under uvicorn (needs
+``pip install 'uvicorn[standard]'``; the mode is skipped without it).
+Then opens the given number of keep-alive connections, each acting as one
+user. Every connection repeatedly requests its workout plan, with an
+optional think time between requests to mimic slow mobile clients.
+Requests per second and latency percentiles are measured once every
+connection is open. Failed connects and requests are counted as errors.
+
+The client runs in ``--client-procs`` processes; with too few, the client
+rather than the server can become the bottleneck.
+"""
+import argparse
+import asyncio
+import importlib.util
+import multiprocessing
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+
+from benchmarks.measure import percentile
+
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+SERVERS = {
+    'sync': lambda port: [
+        sys.executable, '-c',
+        # Keep-alive, like uvicorn, so both hold one socket per client
+        'from werkzeug.serving import WSGIRequestHandler; WSGIRequestHandler.protocol_version = "HTTP/1.1"; '
+        f'import app; app.app.run(host="127.0.0.1", port={port}, threaded=True, debug=False)',
+    ],
+    'async': lambda port: [
+        sys.executable, '-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', str(port),
+        '--backlog', '16384', '--timeout-keep-alive', '120', '--no-access-log', '--log-level', 'warning',
+    ],
+}
+
+# Concurrent connection attempts per client process, so the listen
+# backlog is not flooded while the connections are being opened
+CONNECT_CONCURRENCY = 256
+
+
+def raise_file_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return hard
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+async def read_response(reader):
+    """Read one response; returns its status and whether the server keeps the connection."""
+    head = await reader.readuntil(b'\r\n\r\n')
+    status_line, *lines = head.split(b'\r\n')
+    keep_alive = status_line.startswith(b'HTTP/1.1')
+    length = 0
+    for line in lines:
+        name, _, value = line.partition(b':')
+        name = name.strip().lower()
+        if name == b'content-length':
+            length = int(value)
+        elif name == b'connection':
+            keep_alive = value.strip().lower() == b'keep-alive'
+    await reader.readexactly(length)
+    return int(status_line.split(b' ', 2)[1]), keep_alive
+
+
+async def client(port, first, count, path, think, start_at, stop_at, timeout):
+    connect_slots = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    latencies = []
+    errors = 0
+
+    async def connect():
+        async with connect_slots:
+            return await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+
+    async def connection(number):
+        nonlocal errors
+        request = f'GET {path.format(n=number)} HTTP/1.1\r\nHost: localhost\r\n\r\n'.encode('ascii')
+        writer = None
+        try:
+            reader, writer = await connect()
+            while time.time() < stop_at:
+                sent = time.perf_counter()
+                writer.write(request)
+                status, keep_alive = await asyncio.wait_for(read_response(reader), timeout)
+                if time.time() >= start_at:
+                    if status == 200:
+                        latencies.append(time.perf_counter() - sent)
+                    else:
+                        errors += 1
+                if not keep_alive:
+                    writer.close()
+                    reader, writer = await connect()
+                if think:
+                    await asyncio.sleep(think)
+        except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError, ValueError):
+            if time.time() < stop_at:
+                errors += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+    await asyncio.gather(*(connection(first + i) for i in range(count)))
+    return latencies, errors
+
+
+def client_process(args):
+    raise_file_limit()
+    return asyncio.run(client(*args))
+
+
+def run_load(port, connections, args):
+    # Every connection gets until start_at to open; only the window after
+    # it is measured
+    start_at = time.time() + args.ramp
+    stop_at = start_at + args.duration
+    procs = min(args.client_procs, connections)
+    shares = [connections // procs + (1 if i < connections % procs else 0) for i in range(procs)]
+    firsts = [sum(shares[:i]) for i in range(procs)]
+    jobs = [(port, first, share, args.path, args.think, start_at, stop_at, args.timeout)
+            for first, share in zip(firsts, shares)]
+    with multiprocessing.Pool(procs) as pool:
+        results = pool.map(client_process, jobs)
+    latencies = sorted(latency for result, _ in results for latency in result)
+    errors = sum(errors for _, errors in results)
+    return len(latencies) / args.duration, percentile(latencies, 0.5), percentile(latencies, 0.99), errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--connections', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--modes', nargs='+', choices=sorted(SERVERS), default=['sync', 'async'])
+    parser.add_argument('--duration', type=float, default=10, help='measured seconds per run')
+    parser.add_argument('--ramp', type=float, default=10, help='seconds allowed for opening connections')
+    parser.add_argument('--think', type=float, default=0.0, help='seconds each client waits between requests')
+    parser.add_argument('--timeout', type=float, default=30)
+    parser.add_argument('--client-procs', type=int, default=max(1, (os.cpu_count() or 2) // 2))
+    parser.add_argument('--path', default='/api/workout/load_{n}')
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    limit = raise_file_limit()
+    if max(args.connections) + 100 > limit:
+        # Server and client each hold one descriptor per connection
+        print(f'note: open file limit is {limit}; runs above {limit - 100} connections will see errors')
+
+    for mode in args.modes:
+        if mode == 'async' and importlib.util.find_spec('uvicorn') is None:
+            print('async: skipped, uvicorn is not installed')
+            continue
+        # Every connection is a demo user from one address, so the limit
+        # on creating demo users is lifted
+        server = subprocess.Popen(SERVERS[mode](args.port), cwd=PROJECT_ROOT,
+                                  env=dict(os.environ, HEALTHJOURNEY_DEMO_RATE='0'),
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        try:
+            if not wait_for_port(args.port):
+                print(f'{mode}: server did not start')
+                continue
+            for connections in args.connections:
+                rps, p50, p99, errors = run_load(args.port, connections, args)
+                print(f'{mode:>5} | {connections:>6,} connections | {rps:9,.0f} req/s | '
+                      f'p50 {p50 * 1e3:8.1f} ms | p99 {p99 * 1e3:8.1f} ms | {errors:,} errors')
+        finally:
+            server.terminate()
+            server.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,8 @@
+"""Measurement helpers shared by the benchmark scripts."""
+
+
+def percentile(ordered, fraction):
+    """The value ``fraction`` of the way through ``ordered`` (sorted samples); NaN if empty."""
+    if not ordered:
+        return float('nan')
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
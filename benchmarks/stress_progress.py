@@ -0,0 +1,106 @@
+"""Stress check for concurrent workout completions.
+
+    python -m benchmarks.stress_progress [--threads 32] [--hot 200000] [--cold 2000]
+
+A thread pool hammers one hot user and many cold users at the same time,
+while reader threads keep fetching the hot user's progress. Afterwards
+every total, completed-days list and streak must be exact; the script
+exits non-zero on any lost or torn update.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from healthjourney.progress import trailing_streak
+from healthjourney.store import MemoryStore, SQLiteStore, new_progress
+
+# A power of two, so float sums are exact regardless of order
+CALORIES = 0.5
+HOT_USER = 'hot'
+COLD_COMPLETIONS = 10
+
+
+def run(store, threads, hot, cold):
+    store.save_user(HOT_USER, {'user_id': HOT_USER})
+    store.save_progress(HOT_USER, new_progress())
+    for i in range(cold):
+        store.save_user(f'cold_{i}', {'user_id': f'cold_{i}'})
+        store.save_progress(f'cold_{i}', new_progress())
+
+    # Each completion for the hot user marks a program day; every day from
+    # 1..hot_days is hit many times, so the final streak is hot_days
+    hot_days = 30
+    jobs = [(HOT_USER, 1 + i % hot_days) for i in range(hot)]
+    jobs += [(f'cold_{i}', day) for i in range(cold) for day in range(1, COLD_COMPLETIONS + 1)]
+    chunks = [jobs[i::threads] for i in range(threads)]
+
+    stop = threading.Event()
+    torn = []
+
+    def reader():
+        # Every snapshot must be internally consistent
+        while not stop.is_set():
+            progress = store.get_progress(HOT_USER)
+            days = progress['completed_days']
+            if days != sorted(set(days)) or progress['streak'] != trailing_streak(days):
+                torn.append(progress)
+
+    def writer(chunk):
+        for user_id, day in chunk:
+            store.record_completion(user_id, CALORIES, day)
+
+    readers = [threading.Thread(target=reader) for _ in range(2)]
+    for thread in readers:
+        thread.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as pool:
+        list(pool.map(writer, chunks))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    for thread in readers:
+        thread.join()
+
+    errors = []
+    progress = store.get_progress(HOT_USER)
+    if progress['total_calories_burned'] != hot * CALORIES:
+        errors.append(f"hot total {progress['total_calories_burned']} != {hot * CALORIES}")
+    if progress['completed_days'] != list(range(1, hot_days + 1)) or progress['streak'] != hot_days:
+        errors.append(f"hot days {progress['completed_days']} streak {progress['streak']}")
+    for i in range(cold):
+        progress = store.get_progress(f'cold_{i}')
+        if progress['total_calories_burned'] != COLD_COMPLETIONS * CALORIES:
+            errors.append(f"cold_{i} total {progress['total_calories_burned']}")
+        if progress['streak'] != COLD_COMPLETIONS:
+            errors.append(f"cold_{i} streak {progress['streak']}")
+    if torn:
+        errors.append(f'{len(torn)} torn reads, e.g. {torn[0]}')
+    return len(jobs) / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=32)
+    parser.add_argument('--hot', type=int, default=200_000)
+    parser.add_argument('--cold', type=int, default=2_000)
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, store in (('memory', MemoryStore()), ('sqlite', SQLiteStore(os.path.join(tmp, 'stress.db')))):
+            try:
+                rate, errors = run(store, args.threads, args.hot, args.cold)
+            finally:
+                store.close()
+            print(f'{name:>6}: {rate:10,.0f} completions/s, {"OK" if not errors else "FAILED"}')
+            for error in errors[:10]:
+                print(f'        {error}')
+            failed = failed or bool(errors)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,323 @@
+"""Benchmark every API endpoint through the Flask and Netlify adapters.
+
+    python -m benchmarks.suite run [--exercises 2000] [--tiers 30] [--users 5000]
+                                   [--requests 2000] [--output results.json]
+    python -m benchmarks.suite compare baseline.json results.json [--threshold 0.15]
+
+``run`` writes a synthetic exercise and nutrition catalog and a user
+population of the given sizes, all seeded, so two runs see the same data
+and the same requests. Each endpoint scenario is then driven in-process
+through Flask's test client and through the Netlify ``handler(event,
+context)``. Every (adapter, scenario) pair runs in a fresh child process,
+so peak RSS belongs to that scenario alone.
+
+A scenario is warmed up, then timed request by request for throughput
+and latency percentiles, keeping the fastest of ``--repeat`` rounds. A
+shorter pass under tracemalloc measures the peak traced memory and the
+bytes still held afterwards per request.
+
+``compare`` reports the change in every metric and lists the
+regressions beyond ``--threshold``: lower throughput, or higher p50, p99
+or retained memory. Retained memory also has to grow by at least
+``MIN_RETAINED_GROWTH`` bytes per request, since bounded caches in
+urllib and werkzeug make small values jitter. It exits non-zero if there
+are any regressions.
+"""
+import argparse
+import datetime
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import urllib.parse
+
+import app as flask_app
+from benchmarks.check_parity import PROJECT_ROOT, load_netlify_module
+from benchmarks.measure import percentile
+from benchmarks.synthetic import generate_exercises, generate_nutrition, generate_profiles
+from healthjourney.profiles import create_profiles
+from healthjourney.service import HealthService
+from healthjourney.store import MemoryStore
+
+ADAPTERS = ('flask', 'netlify')
+
+# Requests run before timing starts, so caches are in their steady state
+WARMUP = 200
+
+# Profiles per POST /api/profiles/batch request
+BATCH_SIZE = 50
+
+# Completions per POST /api/workout/complete/batch request
+SESSION_SIZE = 8
+
+# Smallest growth in retained bytes per request reported as a regression
+MIN_RETAINED_GROWTH = 1024
+
+# Metrics compared by ``compare``: (key, label, higher is better)
+COMPARED = (
+    ('rps', 'req/s', True),
+    ('p50_us', 'p50 us', False),
+    ('p99_us', 'p99 us', False),
+    ('retained_bytes_per_request', 'retained B/req', False),
+)
+
+
+def profile_body(rng, user_id, tiers):
+    profile = generate_profiles(1, seed=rng.random(), tiers=tiers)[0]
+    profile['user_id'] = user_id
+    return json.dumps(profile)
+
+
+# Each scenario is (method, path, body, headers) for request ``i``, given
+# a seeded rng, the user ids and the settings
+SCENARIOS = {
+    'create_profile': lambda i, rng, users, args: (
+        'POST', '/profile', profile_body(rng, f'new_{i}', args.tiers), {'Content-Type': 'application/json'}),
+    'create_profiles_batch': lambda i, rng, users, args: (
+        'POST', '/profiles/batch',
+        '\n'.join(profile_body(rng, f'batch_{i}_{n}', args.tiers) for n in range(BATCH_SIZE)),
+        {'Content-Type': 'application/x-ndjson'}),
+    'get_profile': lambda i, rng, users, args: ('GET', f'/profile/{rng.choice(users)}', None, {}),
+    'get_workout': lambda i, rng, users, args: ('GET', f'/workout/{rng.choice(users)}', None, {}),
+    'get_workout_gzip': lambda i, rng, users, args: (
+        'GET', f'/workout/{rng.choice(users)}', None, {'Accept-Encoding': 'gzip'}),
+    'get_nutrition': lambda i, rng, users, args: ('GET', f'/nutrition/{rng.choice(users)}', None, {}),
+    'complete_exercise': lambda i, rng, users, args: (
+        'POST', '/workout/complete', json.dumps({
+            'user_id': rng.choice(users), 'exercise_id': rng.randint(1, args.exercises),
+            'duration': rng.randint(20, 180)}),
+        {'Content-Type': 'application/json'}),
+    'complete_session': lambda i, rng, users, args: (
+        'POST', '/workout/complete/batch', json.dumps({
+            'user_id': rng.choice(users),
+            'completions': [{'exercise_id': rng.randint(1, args.exercises), 'duration': rng.randint(20, 180)}
+                            for _ in range(SESSION_SIZE)]}),
+        {'Content-Type': 'application/json'}),
+    'get_exercises': lambda i, rng, users, args: ('GET', '/exercises', None, {'Accept-Encoding': 'gzip'}),
+    'get_exercises_page': lambda i, rng, users, args: (
+        'GET', '/exercises?limit=50&fields=id,name,category', None, {}),
+    'get_metrics': lambda i, rng, users, args: ('GET', '/metrics', None, {}),
+}
+
+
+def flask_sender(service):
+    flask_app.service = service
+    client = flask_app.app.test_client()
+
+    def send(method, path, body, headers):
+        response = client.open('/api' + path, method=method, data=body, headers=headers)
+        response.get_data()
+        return response.status_code
+    return send
+
+
+def netlify_sender(service):
+    module = load_netlify_module()
+    module.service = service
+
+    def send(method, path, body, headers):
+        path, _, query = path.partition('?')
+        result = module.handler({
+            'httpMethod': method,
+            'path': module.FUNCTION_PATH + path,
+            'queryStringParameters': dict(urllib.parse.parse_qsl(query)) or None,
+            'headers': headers,
+            'body': body,
+        }, None)
+        return result['statusCode']
+    return send
+
+
+SENDERS = {'flask': flask_sender, 'netlify': netlify_sender}
+
+
+def write_catalogs(data_dir, args):
+    with open(os.path.join(data_dir, 'exercises.json'), 'w', encoding='utf-8') as f:
+        json.dump({'exercises': generate_exercises(args.exercises)}, f, ensure_ascii=False)
+    with open(os.path.join(data_dir, 'nutrition.json'), 'w', encoding='utf-8') as f:
+        json.dump(generate_nutrition(args.tiers, args.items), f, ensure_ascii=False)
+
+
+def timed_round(send, requests):
+    latencies = []
+    errors = 0
+    clock = time.perf_counter
+    start = clock()
+    for request in requests:
+        sent = clock()
+        status = send(*request)
+        latencies.append(clock() - sent)
+        if status >= 500:
+            errors += 1
+    return latencies, errors, clock() - start
+
+
+def run_scenario(adapter, scenario, data_dir, args):
+    """Measure one scenario through one adapter; runs in its own process."""
+    service = HealthService(data_dir=data_dir, store=MemoryStore())
+    population = generate_profiles(args.users, seed=1, tiers=args.tiers)
+    create_profiles(population, service.store, service.now())
+    users = [profile['user_id'] for profile in population]
+    send = SENDERS[adapter](service)
+
+    rng = random.Random(f'{scenario}')
+    build = SCENARIOS[scenario]
+    traced_count = max(1, args.requests // 10)
+    requests = [build(i, rng, users, args) for i in range(WARMUP + args.requests + traced_count)]
+    warmup, timed, traced = (requests[:WARMUP], requests[WARMUP:WARMUP + args.requests],
+                             requests[WARMUP + args.requests:])
+
+    for request in warmup:
+        send(*request)
+
+    # The best of several rounds, so one noisy round does not decide
+    best = None
+    errors = 0
+    for _ in range(args.repeat):
+        latencies, round_errors, elapsed = timed_round(send, timed)
+        errors += round_errors
+        if best is None or elapsed < best[1]:
+            best = latencies, elapsed
+    latencies, elapsed = best
+
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    for request in traced:
+        send(*request)
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'requests': len(timed),
+        'errors': errors,
+        'rps': round(len(timed) / elapsed, 1),
+        'p50_us': round(percentile(latencies, 0.5) * 1e6, 1),
+        'p90_us': round(percentile(latencies, 0.9) * 1e6, 1),
+        'p99_us': round(percentile(latencies, 0.99) * 1e6, 1),
+        'max_us': round(latencies[-1] * 1e6, 1),
+        'traced_peak_kb': round((peak - before) / 1024, 1),
+        'retained_bytes_per_request': round((after - before) / len(traced), 1),
+        # Kilobytes on Linux, bytes on macOS
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args):
+    data_dir = tempfile.mkdtemp(prefix='healthjourney-bench-')
+    try:
+        write_catalogs(data_dir, args)
+        results = {}
+        for adapter in args.adapters:
+            results[adapter] = {}
+            for scenario in args.scenarios:
+                # A fresh process per scenario, so its peak RSS is its own
+                with multiprocessing.Pool(1) as pool:
+                    result = pool.apply(run_scenario, (adapter, scenario, data_dir, args))
+                results[adapter][scenario] = result
+                print(f'{adapter:>7} | {scenario:<22} | {result["rps"]:9,.0f} req/s | '
+                      f'p50 {result["p50_us"]:8.1f} us | p99 {result["p99_us"]:8.1f} us | '
+                      f'retained {result["retained_bytes_per_request"]:8.1f} B/req | '
+                      f'rss {result["peak_rss_kb"] / 1024:6.1f} MiB', flush=True)
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+
+    report = {
+        'meta': {
+            'revision': git_revision(),
+            'python': sys.version.split()[0],
+            'platform': platform.platform(),
+            'at': datetime.datetime.now().isoformat(timespec='seconds'),
+            'settings': {name: getattr(args, name) for name in
+                         ('exercises', 'tiers', 'items', 'users', 'requests', 'repeat')},
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f'wrote {args.output}')
+    return report
+
+
+def compare(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    if baseline['meta'].get('settings') != current['meta'].get('settings'):
+        print('note: the runs used different settings, so the numbers are not comparable')
+
+    regressions = []
+    for adapter, scenarios in current['results'].items():
+        for scenario, result in scenarios.items():
+            old = baseline['results'].get(adapter, {}).get(scenario)
+            if old is None:
+                continue
+            cells = []
+            for key, label, higher_is_better in COMPARED:
+                before, after = old[key], result[key]
+                change = (after - before) / before if before else 0.0
+                worse = -change if higher_is_better else change
+                flag = ' !' if worse > args.threshold else ''
+                if key == 'retained_bytes_per_request' and after - before < MIN_RETAINED_GROWTH:
+                    flag = ''
+                if flag:
+                    regressions.append(f'{adapter} {scenario}: {label} {before:,} -> {after:,} ({change:+.1%})')
+                cells.append(f'{label} {change:+7.1%}{flag}')
+            print(f'{adapter:>7} | {scenario:<22} | ' + ' | '.join(cells))
+
+    if regressions:
+        print(f'\n{len(regressions)} regressions beyond {args.threshold:.0%}:')
+        for line in regressions:
+            print('  ' + line)
+        return 1
+    print(f'\nno regressions beyond {args.threshold:.0%}')
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = commands.add_parser('run', help='benchmark the endpoints')
+    run_parser.add_argument('--exercises', type=int, default=2000)
+    run_parser.add_argument('--tiers', type=int, default=30)
+    run_parser.add_argument('--items', type=int, default=5, help='nutrition items per meal')
+    run_parser.add_argument('--users', type=int, default=5000)
+    run_parser.add_argument('--requests', type=int, default=2000, help='timed requests per scenario')
+    run_parser.add_argument('--repeat', type=int, default=3, help='timed rounds per scenario')
+    run_parser.add_argument('--adapters', nargs='+', choices=ADAPTERS, default=list(ADAPTERS))
+    run_parser.add_argument('--scenarios', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    run_parser.add_argument('--output', help='write the results to this JSON file')
+
+    compare_parser = commands.add_parser('compare', help='flag regressions between two runs')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.15)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == '__main__':
+    main()
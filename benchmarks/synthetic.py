@@ -0,0 +1,140 @@
+"""Synthetic data generators shared by the benchmark scripts."""
+import random
+
+LEVELS = ['beginner', 'intermediate', 'advanced']
+GENDERS = ['male', 'female', 'both']
+GOALS = ['muscle_gain', 'toning', 'weight_loss', 'endurance', 'core', 'health']
+CATEGORIES = ['chest', 'legs', 'cardio', 'core', 'back', 'arms', 'shoulders']
+EQUIPMENT = ['بدون معدات', 'دمبل', 'بار', 'حبل', 'كرة']
+PROFILE_GOALS = ['weightLoss', 'muscleGain', 'endurance', 'toning', 'health']
+# The choices the profile form offers; its selects send strings
+PROFILE_EQUIPMENT = ['none', 'basic', 'gym']
+PREFERRED_TIMES = ['06:00', '07:00', '08:00', '12:00', '17:00', '18:00', '19:00', '20:00']
+WORKOUT_DAYS = ['3', '4', '5', '6', '7']
+NOTIFICATIONS = ['on', 'off']
+
+
+def generate_exercises(count, seed=0):
+    """Build ``count`` exercises shaped like the entries in data/exercises.json."""
+    rng = random.Random(seed)
+    exercises = []
+    for i in range(count):
+        exercises.append({
+            'id': i + 1,
+            'name': f'تمرين {i + 1}',
+            'english_name': f'Exercise {i + 1}',
+            'level': rng.choice(LEVELS),
+            'gender': rng.choice(GENDERS),
+            'sets': rng.randint(2, 5),
+            'reps': rng.randint(8, 20),
+            'rest_seconds': rng.choice([30, 45, 60, 90]),
+            'duration': rng.choice([45, 60, 90, 120]),
+            'goal': rng.sample(GOALS, 2),
+            'met_value': round(rng.uniform(2.5, 9.0), 1),
+            'category': rng.choice(CATEGORIES),
+            'muscle_groups': ['صدر', 'كتف أمامي'],
+            'equipment': rng.choice(EQUIPMENT),
+            'calories_per_rep': round(rng.uniform(0.2, 1.0), 2),
+            'emoji': '💪',
+        })
+    return exercises
+
+
+# Words for exercise names and muscle groups in the style of data/exercises.json
+MOVES = [
+    ('تمرين الضغط', 'Push-up'), ('القرفصاء', 'Squat'), ('الطعن', 'Lunge'), ('اللوح', 'Plank'),
+    ('العقلة', 'Pull-up'), ('الرفعة الميتة', 'Deadlift'), ('تسلق الجبال', 'Mountain Climber'),
+    ('بيربي', 'Burpee'), ('الجسر', 'Bridge'), ('القفز', 'Jump'), ('التجديف', 'Row'), ('الطيران', 'Fly'),
+    ('ثني الذراع', 'Curl'), ('مد الذراع', 'Extension'), ('رفع الساق', 'Leg Raise'), ('الدوران', 'Twist'),
+]
+VARIANTS = [
+    ('', ''), ('المائل', 'Incline'), ('العكسي', 'Reverse'), ('الجانبي', 'Side'), ('بيد واحدة', 'Single-Arm'),
+    ('بالدمبل', 'Dumbbell'), ('بالبار', 'Barbell'), ('على الكرة', 'Stability Ball'), ('السريع', 'Speed'),
+    ('المتقدم', 'Advanced'), ('النبضي', 'Pulse'), ('الثابت', 'Isometric'),
+]
+MUSCLES = ['صدر', 'كتف أمامي', 'كتف', 'ترايسبس', 'بايسبس', 'فخذ أمامي', 'فخذ خلفي', 'أرداف', 'بطن',
+           'ظهر سفلي', 'ظهر علوي', 'سمانة', 'جسم كامل', 'ساق', 'ساعد']
+
+
+def generate_named_exercises(count, seed=0):
+    """``generate_exercises`` with varied Arabic and English names and muscle groups.
+
+    Each name combines a movement, a variant and a number, so names share
+    words the way a large real catalog would, and every one is unique.
+    """
+    rng = random.Random(seed)
+    exercises = generate_exercises(count, seed)
+    for exercise in exercises:
+        arabic, english = rng.choice(MOVES)
+        arabic_variant, english_variant = rng.choice(VARIANTS)
+        number = exercise['id']
+        exercise['name'] = ' '.join(filter(None, (arabic, arabic_variant, str(number))))
+        exercise['english_name'] = ' '.join(filter(None, (english_variant, english, str(number))))
+        exercise['muscle_groups'] = rng.sample(MUSCLES, rng.randint(1, 3))
+    return exercises
+
+
+def generate_nutrition(tiers, items_per_meal, seed=0):
+    """Build a nutrition catalog shaped like data/nutrition.json.
+
+    The guides are copied from the real catalog's shape; ``tiers`` tiers
+    each get ``items_per_meal`` items for every meal.
+    """
+    rng = random.Random(seed)
+    guides = {
+        'weight_loss': {'name': 'weight loss', 'protein_ratio': 0.3, 'carbs_ratio': 0.4, 'fats_ratio': 0.3},
+        'muscle_gain': {'name': 'muscle gain', 'protein_ratio': 0.4, 'carbs_ratio': 0.4, 'fats_ratio': 0.2},
+        'endurance': {'name': 'endurance', 'protein_ratio': 0.2, 'carbs_ratio': 0.6, 'fats_ratio': 0.2},
+    }
+    meals = {'breakfast': (250, 550), 'lunch': (400, 700), 'dinner': (400, 700), 'snacks': (100, 300)}
+    return {
+        'nutrition_guides': guides,
+        'tiers': {
+            f'tier_{t}': {
+                'name': f'Tier {t}',
+                'budget': f'${t}-{t + 5}/day',
+                'description': 'Synthetic tier',
+                'meals': {
+                    meal: [{
+                        'name': f'{meal} {i}',
+                        'calories': rng.randint(low, high),
+                        'protein': rng.randint(5, 45),
+                        'carbs': rng.randint(10, 70),
+                        'fat': rng.randint(5, 35),
+                        'ingredients': 'synthetic',
+                        'instructions': 'synthetic',
+                    } for i in range(items_per_meal)]
+                    for meal, (low, high) in meals.items()
+                },
+            } for t in range(tiers)
+        },
+    }
+
+
+def generate_profiles(count, seed=0, tiers=None):
+    """Build ``count`` profiles as the profile form sends them to POST /api/profile.
+
+    With ``tiers``, each profile also gets an ``economicLevel`` naming one
+    of the tiers from ``generate_nutrition``.
+    """
+    rng = random.Random(seed)
+    profiles = []
+    for i in range(count):
+        profile = {
+            'user_id': f'bulk_{i}',
+            'firstName': 'مستخدم',
+            'lastName': str(i),
+            'age': rng.randint(16, 75),
+            'height': rng.randint(145, 200),
+            'weight': round(rng.uniform(45, 130), 1),
+            'gender': rng.choice(['male', 'female']),
+            'fitnessLevel': rng.choice(LEVELS),
+            'goal': rng.choice(['weightLoss', 'muscleGain', 'health']),
+        }
+        if tiers:
+            profile['goal'] = rng.choice(PROFILE_GOALS)
+            profile['economicLevel'] = f'tier_{rng.randrange(tiers)}'
+        profile.update(equipment=rng.choice(PROFILE_EQUIPMENT), preferredTime=rng.choice(PREFERRED_TIMES),
+                       workoutDays=rng.choice(WORKOUT_DAYS), notifications=rng.choice(NOTIFICATIONS))
+        profiles.append(profile)
+    return profiles
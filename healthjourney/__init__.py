@@ -0,0 +1,2 @@
+# Shared backend code used by both the Flask app (app.py) and the
+# Netlify function (netlify/functions/api.py).
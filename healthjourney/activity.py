@@ -0,0 +1,252 @@
+"""Per-user activity log with day, week and month rollups.
+
+Every completed exercise and finished program day is appended to the
+user's log as a compact event. The same write adds it into running
+totals for its calendar day, week and month, and extends the user's
+streak of active days. A stats query reads only the rollup buckets
+inside its range, so it costs the same for a user with ten completions
+as for one with ten thousand.
+
+Buckets are numbered so that consecutive periods get consecutive
+numbers: days by their proleptic ordinal, weeks (Monday to Sunday) as
+``(ordinal - 1) // 7`` and months as ``year * 12 + month - 1``.
+"""
+import functools
+import threading
+from array import array
+from datetime import date, datetime
+
+# Event kinds: one completed exercise, or one finished program day
+EXERCISE = 0
+SESSION = 1
+
+# Rollup grains, also the index into a log's rollups
+DAY, WEEK, MONTH = range(3)
+
+# ?range=Nd bounds for stats queries
+DEFAULT_RANGE_DAYS = 30
+MAX_RANGE_DAYS = 730
+
+DEFAULT_STRIPES = 64
+
+EPOCH = datetime(1970, 1, 1)
+
+# (last active day, current run, longest run) before any activity
+NO_STREAK = (None, 0, 0)
+
+
+def epoch_seconds(moment):
+    return int((moment - EPOCH).total_seconds())
+
+
+def buckets(day):
+    """The day, week and month buckets of the day with ordinal ``day``."""
+    moment = date.fromordinal(day)
+    return day, (day - 1) // 7, moment.year * 12 + moment.month - 1
+
+
+def tally(events):
+    """``(calories, exercises, sessions)`` for ``(kind, calories, day)`` events."""
+    calories = exercises = sessions = 0
+    for kind, kcal, _ in events:
+        calories += kcal
+        if kind == SESSION:
+            sessions += 1
+        else:
+            exercises += 1
+    return calories, exercises, sessions
+
+
+def extend_streak(streak, day, active):
+    """Streak state after activity on ``day``.
+
+    ``streak`` is ``(last active day, current run, longest run)`` and
+    ``active(d)`` tells whether day ``d`` already had activity. Activity
+    arriving in time order only looks at ``streak``; a late event that
+    fills an older gap walks the runs on either side of it.
+    """
+    last, current, longest = streak
+    if last is None or day > last:
+        current = current + 1 if last == day - 1 else 1
+        return day, current, max(longest, current)
+    if active(day):
+        return streak
+    before = 0
+    while active(day - before - 1):
+        before += 1
+    after = 0
+    while day + after < last and active(day + after + 1):
+        after += 1
+    run = before + 1 + after
+    if day + after == last:
+        current = run
+    return last, current, max(longest, run)
+
+
+class ActivityWindow:
+    """Rollups covering a query range, plus the user's streak state.
+
+    ``rollups`` holds a ``{bucket: (calories, exercises, sessions)}``
+    dict per grain. It may hold buckets outside the range too.
+    """
+
+    __slots__ = ('rollups', 'streak')
+
+    def __init__(self, rollups, streak):
+        self.rollups = rollups
+        self.streak = streak
+
+
+EMPTY_WINDOW = ActivityWindow(({}, {}, {}), NO_STREAK)
+
+
+class ActivityLog:
+    """One user's events, as parallel arrays, and their rollups.
+
+    An event costs 21 bytes: seconds since 1970, kind, calories and
+    program day (0 for none). Rollup buckets are replaced whole on every
+    write, never changed in place, so readers need no lock.
+    """
+
+    __slots__ = ('times', 'kinds', 'calories', 'program_days', 'rollups', 'streak')
+
+    def __init__(self):
+        self.times = array('q')
+        self.kinds = array('b')
+        self.calories = array('d')
+        self.program_days = array('i')
+        self.rollups = ({}, {}, {})
+        self.streak = NO_STREAK
+
+    def __len__(self):
+        return len(self.times)
+
+    def append(self, moment, events):
+        at = epoch_seconds(moment)
+        for kind, kcal, program_day in events:
+            self.times.append(at)
+            self.kinds.append(kind)
+            self.calories.append(kcal)
+            self.program_days.append(program_day or 0)
+
+        day = moment.toordinal()
+        days = self.rollups[DAY]
+        self.streak = extend_streak(self.streak, day, days.__contains__)
+        calories, exercises, sessions = tally(events)
+        for rollup, bucket in zip(self.rollups, buckets(day)):
+            old = rollup.get(bucket)
+            rollup[bucket] = (calories, exercises, sessions) if old is None else (
+                old[0] + calories, old[1] + exercises, old[2] + sessions)
+
+    def rows(self):
+        """Every event as ``(seconds since 1970, kind, calories, program day or None)``, oldest first."""
+        return [(at, kind, kcal, program_day or None)
+                for at, kind, kcal, program_day in zip(self.times, self.kinds, self.calories, self.program_days)]
+
+    def window(self):
+        return ActivityWindow(self.rollups, self.streak)
+
+
+class ActivityTracker:
+    """Activity logs by user, with striped-lock writes and lock-free reads."""
+
+    def __init__(self, stripes=DEFAULT_STRIPES):
+        self._logs = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def __contains__(self, user_id):
+        return user_id in self._logs
+
+    def get(self, user_id):
+        return self._logs.get(user_id)
+
+    def pop(self, user_id):
+        with self._locks[hash(user_id) % len(self._locks)]:
+            return self._logs.pop(user_id, None)
+
+    def log(self, user_id, moment, events):
+        with self._locks[hash(user_id) % len(self._locks)]:
+            log = self._logs.get(user_id)
+            if log is None:
+                log = self._logs[user_id] = ActivityLog()
+            log.append(moment, events)
+
+
+def parse_range(value):
+    """Days in a ``range`` query value like ``90d``; raise ``ValueError`` if invalid."""
+    if value is None or value == '':
+        return DEFAULT_RANGE_DAYS
+    if not value.endswith('d') or not value[:-1].isdigit():
+        raise ValueError('range must be a number of days, like 90d')
+    days = int(value[:-1])
+    if not 1 <= days <= MAX_RANGE_DAYS:
+        raise ValueError(f'range must be between 1d and {MAX_RANGE_DAYS}d')
+    return days
+
+
+def bucket_ranges(first_day, last_day):
+    """``(first, last)`` buckets per grain covering days ``first_day`` to ``last_day``."""
+    return tuple(zip(buckets(first_day), buckets(last_day)))
+
+
+def _totals(label, name, values):
+    calories, exercises, sessions = values
+    return {label: name, 'calories': round(calories, 1), 'exercises': exercises, 'sessions': sessions}
+
+
+# Dashboards ask for the same recent days over and over
+@functools.lru_cache(maxsize=4096)
+def _day_name(day):
+    return date.fromordinal(day).isoformat()
+
+
+def _month_name(bucket):
+    year, month = divmod(bucket, 12)
+    return f'{year:04d}-{month + 1:02d}'
+
+
+def activity_stats(window, first_day, last_day):
+    """The stats response body for days ``first_day`` to ``last_day``.
+
+    Days are listed one by one, weeks and months whole, including any
+    part that falls outside the range. Work is proportional to the
+    number of days in the range, never to the number of events.
+    """
+    days, weeks, months = window.rollups
+    zero = (0, 0, 0)
+    daily = []
+    calories = exercises = sessions = active = 0
+    for day in range(first_day, last_day + 1):
+        values = days.get(day)
+        if values is None:
+            daily.append({'date': _day_name(day), 'calories': 0, 'exercises': 0, 'sessions': 0})
+            continue
+        active += 1
+        calories += values[0]
+        exercises += values[1]
+        sessions += values[2]
+        daily.append(_totals('date', _day_name(day), values))
+
+    _, (first_week, last_week), (first_month, last_month) = bucket_ranges(first_day, last_day)
+    weekly = [_totals('start', _day_name(week * 7 + 1), weeks.get(week, zero))
+              for week in range(first_week, last_week + 1)]
+    monthly = [_totals('month', _month_name(month), months.get(month, zero))
+               for month in range(first_month, last_month + 1)]
+
+    # A run still counts as current until a whole day passes without activity
+    last, current, longest = window.streak
+    if last is None or last < last_day - 1:
+        current = 0
+    return {
+        'range': {
+            'days': last_day - first_day + 1,
+            'start': date.fromordinal(first_day).isoformat(),
+            'end': date.fromordinal(last_day).isoformat(),
+        },
+        'totals': {'calories': round(calories, 1), 'exercises': exercises, 'sessions': sessions,
+                   'active_days': active},
+        'streak': {'current': current, 'longest': longest},
+        'daily': daily,
+        'weekly': weekly,
+        'monthly': monthly,
+    }
@@ -0,0 +1,315 @@
+"""Static asset build: bundled, minified, content-hashed scripts and styles.
+
+The HTML pages load their scripts and stylesheets one file at a time
+from ``static/``. ``build`` joins each run of adjacent ``<script src>``
+or stylesheet ``<link>`` tags into one bundle, minifies it and names it
+by a hash of its content. Bundles go to ``dist/assets/`` and the
+rewritten pages to ``dist/``, each with a gzip variant and, if the
+brotli module is installed, a brotli one. Build at deploy time with::
+
+    python -m healthjourney.assets [out_dir]
+
+A bundle's name changes whenever its content does, so browsers may keep
+it for a year without asking again (``IMMUTABLE``). Pages are
+revalidated on every load (``REVALIDATE``), so a new build is picked up
+at once. ``StaticSite`` maps a URL path to the file and headers to send
+for both servers; without a build it serves the source files.
+"""
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import re
+import shutil
+import sys
+import urllib.parse
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+from healthjourney.response_cache import parse_accept_encoding
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIST_DIR = os.path.join(ROOT, 'dist')
+ASSETS = 'assets'
+MANIFEST = 'manifest.json'
+
+PAGES = ('index.html', 'profile.html', 'plan.html')
+# Other files the built site needs, copied as they are
+COPIED = ('favicon.ico',)
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'no-cache'
+
+# Precompressed variants, most preferred first, by file suffix
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Files smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+_SCRIPT = re.compile(r'<script src="(static/[^"]+\.js)"></script>')
+_STYLESHEET = re.compile(r'<link rel="stylesheet" href="(static/[^"]+\.css)">')
+
+
+# JavaScript minification keeps every token and drops comments and the
+# whitespace no token needs. A line break is kept unless the tokens on
+# either side show that no semicolon could be inserted there.
+_JS_TOKEN = re.compile(r"""
+    (?P<space>\s+)
+  | (?P<comment>//[^\n]*|/\*.*?\*/)
+  | (?P<string>'(?:\\.|[^'\\\n])*'|"(?:\\.|[^"\\\n])*")
+  | (?P<word>[\w$]+)
+  | (?P<char>.)
+""", re.S | re.X)
+_TEMPLATE_TEXT = re.compile(r'(?:\\.|\$(?!\{)|[^`\\$])*', re.S)
+_REGEX_BODY = re.compile(r'(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[a-z]*')
+# A / after these starts a regular expression rather than a division
+_REGEX_AFTER = set('(,=:[!&|?{};+-*%<>~^') | {'', 'return', 'typeof', 'case', 'do', 'else', 'in', 'instanceof',
+                                             'new', 'delete', 'void', 'throw', 'yield', 'await'}
+# No semicolon is ever inserted after these, or before those; + and -
+# are left out since they may end a postfix x++ or x--
+_OPEN_AFTER = set('{([,;=:?&|*%<>!~^')
+_CLOSE_BEFORE = set('})],;:.?')
+
+
+def _joins(left, right):
+    """True if ``left`` and ``right`` would read as one token without a space."""
+    a, b = left[-1], right[0]
+    if (a.isalnum() or a in '_$') and (b.isalnum() or b in '_$'):
+        return True
+    return (a + b) in ('++', '--', '+-', '-+', '//', '/*', '*/') or (a.isdigit() and b == '.')
+
+
+def minify_js(source):
+    out = []
+    last = ''
+    gap = ''
+    # Brace depth inside each open template ${...}
+    templates = []
+    position = 0
+    while position < len(source):
+        char = source[position]
+        if char == '`' or (char == '}' and templates and templates[-1] == 0):
+            # Template text is copied as it is, up to its end or next ${
+            if char == '}':
+                templates.pop()
+            end = _TEMPLATE_TEXT.match(source, position + 1).end()
+            if source.startswith('${', end):
+                templates.append(0)
+                token, position = source[position:end + 2], end + 2
+            else:
+                token, position = source[position:end + 1], end + 1
+        else:
+            match = _JS_TOKEN.match(source, position)
+            kind, token = match.lastgroup, match.group()
+            position = match.end()
+            if kind == 'space' or kind == 'comment':
+                if '\n' in token:
+                    gap = '\n'
+                elif not gap:
+                    gap = ' '
+                continue
+            if token == '/' and last in _REGEX_AFTER:
+                body = _REGEX_BODY.match(source, position)
+                if body is not None:
+                    token, position = '/' + body.group(), body.end()
+            elif templates and token in '{}':
+                templates[-1] += 1 if token == '{' else -1
+        if out and gap:
+            if gap == '\n' and last[-1] not in _OPEN_AFTER and token[0] not in _CLOSE_BEFORE:
+                out.append('\n')
+            elif _joins(last, token):
+                out.append(' ')
+        out.append(token)
+        last = token
+        gap = ''
+    return ''.join(out)
+
+
+_CSS_TOKEN = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/|\s+""", re.S)
+_CSS_SPACE = re.compile(r' ?([{};,>]) ?|(:) ')
+
+
+def minify_css(source):
+    # Strings are set aside while comments and runs of whitespace become
+    # one space, which is then dropped where punctuation makes it useless
+    strings = []
+
+    def hold(match):
+        if match.group(1):
+            strings.append(match.group(1))
+            return '\x00'
+        return ' '
+
+    text = re.sub(' +', ' ', _CSS_TOKEN.sub(hold, source))
+    text = _CSS_SPACE.sub(r'\1\2', text).replace(';}', '}').strip()
+    held = iter(strings)
+    return re.sub('\x00', lambda match: next(held), text)
+
+
+def content_type(path):
+    kind = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if kind.startswith('text/') or kind in ('application/javascript', 'application/json'):
+        kind += '; charset=utf-8'
+    return kind
+
+
+def _runs(html, pattern):
+    """Matches of ``pattern`` in ``html``, grouped into runs with only whitespace between."""
+    runs = []
+    for match in pattern.finditer(html):
+        if runs and not html[runs[-1][-1].end():match.start()].strip():
+            runs[-1].append(match)
+        else:
+            runs.append([match])
+    return runs
+
+
+def _write(out_dir, name, data):
+    """Write ``data`` and its worthwhile compressed variants; returns their encodings."""
+    path = os.path.join(out_dir, name)
+    with open(path, 'wb') as f:
+        f.write(data)
+    encodings = []
+    if len(data) < MIN_COMPRESS_SIZE:
+        return encodings
+    for encoding, suffix in ENCODINGS:
+        if encoding == 'br':
+            if brotli is None:
+                continue
+            compressed = brotli.compress(data, quality=11)
+        else:
+            compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        if len(compressed) < len(data):
+            with open(path + suffix, 'wb') as f:
+                f.write(compressed)
+            encodings.append(encoding)
+    return encodings
+
+
+def _bundle(root, sources):
+    texts = []
+    for source in sources:
+        with open(os.path.join(root, source), encoding='utf-8') as f:
+            texts.append(f.read())
+    if sources[0].endswith('.js'):
+        # Each file was a script of its own; a semicolon keeps one from
+        # running into the next
+        return '\n;'.join(minify_js(text) for text in texts)
+    return '\n'.join(minify_css(text) for text in texts)
+
+
+def build(out_dir=DIST_DIR, root=ROOT):
+    """Write the bundles, rewritten pages and manifest to ``out_dir``; returns the manifest."""
+    staging = out_dir + '.tmp'
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(os.path.join(staging, ASSETS))
+    files = {}
+    bundles = {}
+    for page in PAGES:
+        with open(os.path.join(root, page), encoding='utf-8') as f:
+            html = f.read()
+        for pattern, tag in ((_SCRIPT, '<script src="/{}"></script>'),
+                             (_STYLESHEET, '<link rel="stylesheet" href="/{}">')):
+            # From the end, so earlier offsets stay valid
+            for run in reversed(_runs(html, pattern)):
+                sources = tuple(match.group(1) for match in run)
+                name = bundles.get(sources)
+                if name is None:
+                    data = _bundle(root, sources).encode('utf-8')
+                    name = '{}/{}.{}{}'.format(
+                        ASSETS, '-'.join(os.path.splitext(os.path.basename(source))[0] for source in sources),
+                        hashlib.sha256(data).hexdigest()[:12], os.path.splitext(sources[0])[1])
+                    files[name] = _write(staging, name, data)
+                    bundles[sources] = name
+                html = html[:run[0].start()] + tag.format(name) + html[run[-1].end():]
+        files[page] = _write(staging, page, html.encode('utf-8'))
+    for name in COPIED:
+        if os.path.isfile(os.path.join(root, name)):
+            shutil.copyfile(os.path.join(root, name), os.path.join(staging, name))
+            files[name] = []
+
+    manifest = {'files': files, 'bundles': {name: list(sources) for sources, name in bundles.items()}}
+    with open(os.path.join(staging, MANIFEST), 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.replace(staging, out_dir)
+    return manifest
+
+
+class StaticFile:
+    """The file that answers a URL path, its content type and extra headers."""
+
+    __slots__ = ('path', 'content_type', 'headers')
+
+    def __init__(self, path, content_type, headers):
+        self.path = path
+        self.content_type = content_type
+        self.headers = headers
+
+    @property
+    def immutable(self):
+        return self.headers.get('Cache-Control') == IMMUTABLE
+
+
+class StaticSite:
+    """Maps URL paths to files: the build in ``dist_dir`` first, then ``root``.
+
+    Files listed in the build's manifest are served from it, with their
+    cache policy and the best precompressed variant the client accepts.
+    Any other existing file under ``root`` is served as it is; anything
+    else gets the index page, so client-side routes still load.
+    """
+
+    def __init__(self, root=ROOT, dist_dir=DIST_DIR):
+        self.root = root
+        self.dist_dir = dist_dir
+        try:
+            with open(os.path.join(dist_dir, MANIFEST), encoding='utf-8') as f:
+                self.files = json.load(f)['files']
+        except (OSError, ValueError, KeyError):
+            self.files = {}
+
+    @property
+    def built(self):
+        return bool(self.files)
+
+    def resolve(self, path, accept_encoding=None):
+        relative = urllib.parse.unquote(path).lstrip('/') or 'index.html'
+        encodings = self.files.get(relative)
+        if encodings is not None:
+            full = os.path.join(self.dist_dir, relative)
+            headers = {'Cache-Control': IMMUTABLE if relative.startswith(ASSETS + '/') else REVALIDATE}
+            if encodings:
+                headers['Vary'] = 'Accept-Encoding'
+                accepted = parse_accept_encoding(accept_encoding) if accept_encoding else ()
+                for encoding, suffix in ENCODINGS:
+                    if encoding in encodings and encoding in accepted:
+                        full += suffix
+                        headers['Content-Encoding'] = encoding
+                        break
+            return StaticFile(full, content_type(relative), headers)
+        full = os.path.realpath(os.path.join(self.root, relative))
+        if full.startswith(self.root + os.sep) and os.path.isfile(full):
+            return StaticFile(full, content_type(full), {})
+        if relative == 'index.html':
+            return StaticFile(os.path.join(self.root, 'index.html'), content_type('index.html'), {})
+        return self.resolve('/index.html', accept_encoding)
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    out_dir = argv[0] if argv else DIST_DIR
+    manifest = build(out_dir)
+    for name, encodings in sorted(manifest['files'].items()):
+        sizes = ' '.join(f'{encoding} {os.path.getsize(os.path.join(out_dir, name) + suffix):,}'
+                         for encoding, suffix in ENCODINGS if encoding in encodings)
+        print(f'wrote {os.path.join(os.path.relpath(out_dir), name)} '
+              f'({os.path.getsize(os.path.join(out_dir, name)):,} bytes{", " + sizes if sizes else ""})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Calories burned by completed exercises, one at a time or many at once.
+
+A timed exercise burns ``MET × 3.5 × weight_kg / 200`` kcal per minute,
+using the exercise's ``met_value`` and the user's stored weight. Without
+a MET value or a duration the exercise's ``calories_per_rep`` is used
+instead, and an exercise missing from the catalog keeps the old
+estimate of 0.1 kcal per second.
+"""
+import math
+
+from healthjourney.optional import numpy
+
+# Used when a profile has no usable weight
+DEFAULT_WEIGHT_KG = 70
+
+# Estimate for exercises that are not in the catalog
+LEGACY_KCAL_PER_SECOND = 0.1
+
+# Largest number of completions accepted by one session request
+MAX_SESSION_SIZE = 1000
+
+
+def body_weight(user):
+    """The user's weight in kg, or ``DEFAULT_WEIGHT_KG`` if it is missing or invalid."""
+    try:
+        weight = float(user.get('weight'))
+    except (TypeError, ValueError):
+        return DEFAULT_WEIGHT_KG
+    return weight if weight > 0 and math.isfinite(weight) else DEFAULT_WEIGHT_KG
+
+
+def exercise_rates(exercise):
+    """``(met_value, calories_per_rep)`` of a catalog exercise; zeros when unknown."""
+    if exercise is None:
+        return 0.0, 0.0
+    return _rate(exercise.get('met_value')), _rate(exercise.get('calories_per_rep'))
+
+
+def _rate(value):
+    return float(value) if _is_number(value) and value > 0 else 0.0
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+
+def calories(met, per_rep, weight_kg, seconds, reps):
+    """Calories for one completion, rounded to 0.1 kcal."""
+    if met > 0 and seconds > 0:
+        kcal = met * 3.5 * weight_kg / 200 * seconds / 60
+    elif per_rep > 0 and reps > 0:
+        kcal = per_rep * reps
+    else:
+        kcal = seconds * LEGACY_KCAL_PER_SECOND
+    return round(kcal, 1)
+
+
+def calories_batch(mets, per_reps, weights, seconds, reps):
+    """``calories`` over parallel lists, vectorized when numpy is available.
+
+    Returns a list identical to calling ``calories`` on each row.
+    """
+    np = numpy()
+    if np is None or not mets:
+        return [calories(*row) for row in zip(mets, per_reps, weights, seconds, reps)]
+
+    met = np.asarray(mets, dtype=np.float64)
+    per_rep = np.asarray(per_reps, dtype=np.float64)
+    weight = np.asarray(weights, dtype=np.float64)
+    secs = np.asarray(seconds, dtype=np.float64)
+    rep = np.asarray(reps, dtype=np.float64)
+
+    kcal = np.where(
+        (met > 0) & (secs > 0),
+        met * 3.5 * weight / 200 * secs / 60,
+        np.where((per_rep > 0) & (rep > 0), per_rep * rep, secs * LEGACY_KCAL_PER_SECOND),
+    )
+    # Round in Python, like compute_metrics_batch, so both paths agree at ties
+    return [round(value, 1) for value in kcal.tolist()]
+
+
+def summarize(completions, weights, lookup):
+    """Calories for many users' completions, totalled per user and day.
+
+    ``completions`` are ``(user_id, exercise_id, seconds, reps, day)``
+    tuples, ``weights`` maps user ids to kg and ``lookup`` returns the
+    catalog exercise for an id (or ``None``). Returns ``(calories,
+    totals)``: the calories of each completion in input order, and
+    ``{user_id: {day: kcal}}`` where ``day`` may be ``None``.
+    """
+    rates = {}
+    mets, per_reps, user_weights, seconds, reps, groups = [], [], [], [], [], []
+    for user_id, exercise_id, secs, rep, day in completions:
+        try:
+            rate = rates[exercise_id]
+        except KeyError:
+            rate = rates[exercise_id] = exercise_rates(lookup(exercise_id))
+        except TypeError:
+            rate = (0.0, 0.0)
+        mets.append(rate[0])
+        per_reps.append(rate[1])
+        user_weights.append(weights.get(user_id, DEFAULT_WEIGHT_KG))
+        seconds.append(secs)
+        reps.append(rep)
+        groups.append((user_id, day))
+
+    burned = calories_batch(mets, per_reps, user_weights, seconds, reps)
+
+    # Number each (user, day) pair so the totals are one bincount
+    codes = {}
+    group_codes = [codes.setdefault(group, len(codes)) for group in groups]
+    np = numpy()
+    if np is None or not burned:
+        sums = [0.0] * len(codes)
+        for code, kcal in zip(group_codes, burned):
+            sums[code] += kcal
+    else:
+        sums = np.bincount(group_codes, weights=burned, minlength=len(codes)).tolist()
+
+    totals = {}
+    for (user_id, day), code in codes.items():
+        totals.setdefault(user_id, {})[day] = round(sums[code], 1)
+    return burned, totals
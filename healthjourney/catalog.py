@@ -0,0 +1,175 @@
+"""Exercise catalog with a precomputed lookup index.
+
+The index is built once when the catalog is loaded, so ``get_workout`` no
+longer walks the whole exercise list on every request.
+"""
+import heapq
+import threading
+from itertools import islice
+
+# Exercises tagged with this gender match every user
+ANY_GENDER = 'both'
+
+# Dimensions the index is keyed on, in key order
+INDEX_FIELDS = ('level', 'gender', 'goal', 'category', 'equipment')
+
+# Default for a filter that was not given (``None`` is a real field value)
+ANY = object()
+
+# Distinct queries whose merged results are remembered
+MAX_CACHED_QUERIES = 4096
+
+
+def _key_values(exercise, field):
+    # ``goal`` is a list in data/exercises.json; every other field is scalar
+    value = exercise.get(field)
+    if isinstance(value, list):
+        return value or [None]
+    return [value]
+
+
+class ExerciseIndex:
+    """Immutable index over a list of exercises.
+
+    Exercises are grouped into buckets keyed by
+    (level, gender, goal, category, equipment). Each bucket holds the
+    catalog positions of its exercises in ascending order. A query merges
+    the buckets that match only as far as it needs to, and the merged
+    prefix is kept so the next identical query is a plain slice.
+    """
+
+    def __init__(self, exercises):
+        self._exercises = tuple(exercises)
+        buckets = {}
+        for position, exercise in enumerate(self._exercises):
+            keys = [()]
+            for field in INDEX_FIELDS:
+                keys = [key + (value,) for key in keys for value in _key_values(exercise, field)]
+            for key in set(keys):
+                buckets.setdefault(key, []).append(position)
+        self._buckets = {key: tuple(positions) for key, positions in buckets.items()}
+        self._streams = {}
+        self._positions = None
+        self._field_names = None
+
+    @classmethod
+    def from_buckets(cls, exercises, buckets):
+        """Rebuild an index from ``buckets`` saved from an index over ``exercises``."""
+        index = cls.__new__(cls)
+        index._exercises = tuple(exercises)
+        index._buckets = buckets
+        index._streams = {}
+        index._positions = None
+        index._field_names = None
+        return index
+
+    @property
+    def buckets(self):
+        return self._buckets
+
+    def __len__(self):
+        return len(self._exercises)
+
+    @property
+    def exercises(self):
+        return self._exercises
+
+    @property
+    def field_names(self):
+        """Every field name that some exercise has."""
+        if self._field_names is None:
+            self._field_names = frozenset(name for exercise in self._exercises for name in exercise)
+        return self._field_names
+
+    def position_after(self, position, exercise_id):
+        """Catalog position just past the exercise a pagination cursor names.
+
+        The saved position is tried first; if the catalog was reloaded and
+        the exercise moved, it is found again by id. Returns ``None`` when
+        it no longer exists.
+        """
+        exercises = self._exercises
+        if position < len(exercises) and exercises[position].get('id') == exercise_id:
+            return position + 1
+        found = self._position_of(exercise_id)
+        return None if found is None else found + 1
+
+    def get(self, exercise_id):
+        """The exercise with ``exercise_id``, or ``None``."""
+        found = self._position_of(exercise_id)
+        return None if found is None else self._exercises[found]
+
+    def _position_of(self, exercise_id):
+        # Built on first use; the first exercise wins if an id repeats
+        positions = self._positions
+        if positions is None:
+            positions = self._positions = {
+                exercise.get('id'): i for i, exercise in reversed(list(enumerate(self._exercises)))
+            }
+        try:
+            return positions.get(exercise_id)
+        except TypeError:
+            return None
+
+    def _stream(self, query):
+        # Matches for a query are merged lazily and remembered, so repeated
+        # queries only pay for the exercises they return
+        stream = self._streams.get(query)
+        if stream is None:
+            buckets = [
+                positions for key, positions in self._buckets.items()
+                if all(wanted is None or value in wanted for value, wanted in zip(key, query))
+            ]
+            stream = _MergedStream(buckets)
+            if len(self._streams) < MAX_CACHED_QUERIES:
+                stream = self._streams.setdefault(query, stream)
+        return stream
+
+    def first(self, limit=None, level=ANY, gender=ANY, goal=ANY, category=ANY, equipment=ANY):
+        """Return the first ``limit`` exercises matching every given filter.
+
+        An omitted filter matches anything. ``gender`` also matches
+        exercises tagged ``'both'``; ``goal`` matches any exercise that
+        lists it. Results keep catalog order.
+        """
+        query = (
+            None if level is ANY else (level,),
+            None if gender is ANY else (gender, ANY_GENDER),
+            None if goal is ANY else (goal,),
+            None if category is ANY else (category,),
+            None if equipment is ANY else (equipment,),
+        )
+        exercises = self._exercises
+        return [exercises[position] for position in self._stream(query).take(limit)]
+
+
+class _MergedStream:
+    """Sorted, de-duplicated union of bucket positions, materialized on demand."""
+
+    def __init__(self, buckets):
+        self._positions = []
+        self._pending = _unique(heapq.merge(*buckets)) if len(buckets) != 1 else iter(buckets[0])
+        self._lock = threading.Lock()
+
+    def take(self, limit):
+        positions = self._positions
+        if self._pending is not None and (limit is None or len(positions) < limit):
+            with self._lock:
+                if self._pending is not None:
+                    needed = None if limit is None else limit - len(positions)
+                    if needed is None or needed > 0:
+                        chunk = list(islice(self._pending, needed))
+                        positions.extend(chunk)
+                        if needed is None or len(chunk) < needed:
+                            self._pending = None
+        return positions[:limit]
+
+
+def _unique(stream):
+    # An exercise with several goals sits in several buckets; the merged
+    # stream is sorted, so duplicates are always adjacent
+    last = -1
+    for position in stream:
+        if position != last:
+            last = position
+            yield position
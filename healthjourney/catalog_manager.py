@@ -0,0 +1,230 @@
+"""Hot-reloadable exercise and nutrition catalogs.
+
+``CatalogManager`` holds the current ``CatalogSet``, an immutable bundle
+of both catalogs. A request reads ``manager.current`` once and uses that
+set throughout, so it always sees one consistent version. When a watched
+JSON file changes, the new catalog is parsed, indexed and validated off
+the request path, and only then published by replacing the reference.
+In-flight requests keep their old set and never wait on a reload.
+
+Files are watched by polling their mtime from a daemon thread (a portable
+stand-in for inotify); ``check`` runs one poll synchronously.
+"""
+import hashlib
+import os
+import threading
+import time
+from datetime import datetime
+
+from healthjourney.data import Lazy, exercises_path, load_exercises, load_nutrition, nutrition_path
+
+CATALOGS = ('exercises', 'nutrition')
+
+_UNSET = object()
+
+
+class SourceFile:
+    """Tracks whether a JSON file on disk has really changed.
+
+    A cheap ``stat`` is compared first; the file is only hashed when its
+    mtime or size moved, so touching a file without editing it does not
+    count as a change.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        # The baseline is taken by ``record`` when the catalog is loaded, or
+        # else on the first check, so creating a manager never touches the disk
+        self._stat = _UNSET
+        self._digest = None
+
+    def _read_stat(self):
+        try:
+            stat = os.stat(self.path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _read_digest(self):
+        try:
+            with open(self.path, 'rb') as f:
+                return hashlib.sha256(f.read()).digest()
+        except OSError:
+            return None
+
+    def record(self):
+        """Take the file as it is now as the baseline; called just before it is read."""
+        self._stat = self._read_stat()
+        self._digest = self._read_digest()
+
+    def changed(self):
+        stat = self._read_stat()
+        if stat == self._stat:
+            return False
+        first_check = self._stat is _UNSET
+        self._stat = stat
+        digest = self._read_digest()
+        if first_check:
+            self._digest = digest
+            return False
+        if digest == self._digest:
+            return False
+        self._digest = digest
+        return True
+
+
+class CatalogSet:
+    """One consistent version of both catalogs; never modified once published."""
+
+    __slots__ = ('version', 'versions', '_catalogs')
+
+    def __init__(self, version, versions, catalogs):
+        self.version = version
+        self.versions = versions
+        self._catalogs = catalogs
+
+    @property
+    def exercises(self):
+        """The ``ExerciseCatalog`` (parsed data and index)."""
+        return self._catalogs['exercises'].get()
+
+    @property
+    def nutrition(self):
+        return self._catalogs['nutrition'].get()
+
+    def replace(self, name, catalog):
+        versions = dict(self.versions)
+        versions[name] += 1
+        return CatalogSet(self.version + 1, versions, dict(self._catalogs, **{name: catalog}))
+
+
+class CatalogManager:
+    """Owns the current catalogs and swaps in new versions as files change.
+
+    Catalogs load lazily on first use. With ``poll_interval`` > 0 a daemon
+    thread polls the files every ``poll_interval`` seconds; with 0 the
+    catalogs only change when ``check`` or ``reload`` is called.
+    ``subscribe`` registers ``callback(name, catalog_set)``, called after
+    each swap.
+    """
+
+    def __init__(self, data_dir, poll_interval=0):
+        self.data_dir = data_dir
+        self._sources = {
+            'exercises': SourceFile(exercises_path(data_dir)),
+            'nutrition': SourceFile(nutrition_path(data_dir)),
+        }
+        self._loaders = {
+            'exercises': lambda strict=False: load_exercises(data_dir, strict),
+            'nutrition': lambda strict=False: load_nutrition(data_dir, strict),
+        }
+        self._current = CatalogSet(1, dict.fromkeys(CATALOGS, 1), {name: self._lazy(name) for name in CATALOGS})
+        self._listeners = []
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+        self.swaps = 0
+        self.reload_failures = 0
+        self.last_swap_ms = None
+        self.max_swap_ms = None
+        self.last_swap_at = None
+        self.last_error = None
+
+        if poll_interval > 0:
+            self.start(poll_interval)
+
+    @property
+    def current(self):
+        return self._current
+
+    def _lazy(self, name):
+        def load():
+            # Fingerprinted before it is read, so any later edit is a change
+            self._sources[name].record()
+            return self._loaders[name]()
+        return Lazy(load)
+
+    def subscribe(self, callback):
+        self._listeners.append(callback)
+
+    def check(self):
+        """Reload every catalog whose file changed; return the names reloaded."""
+        # Check every source so each one records its new fingerprint
+        changed = [name for name, source in self._sources.items() if source.changed()]
+        return [name for name in changed if self.reload(name)]
+
+    def reload(self, name):
+        """Load, validate and publish a new version of one catalog.
+
+        Returns ``False`` and keeps the current version when the new file
+        cannot be parsed or fails validation.
+        """
+        with self._reload_lock:
+            start = time.perf_counter()
+            current = self._current
+            if current._catalogs[name].loaded:
+                try:
+                    # Parses, indexes and validates without touching the current version
+                    value = self._loaders[name](strict=True)
+                    # Searches keep running on the old version meanwhile
+                    value.build_like(current._catalogs[name].get())
+                except Exception as e:
+                    self.reload_failures += 1
+                    self.last_error = f'{name}: {e}'
+                    print(f"Error reloading {name} catalog: {e}")
+                    # The next write to the file (e.g. the end of a partial
+                    # write) changes its fingerprint and triggers a new try
+                    return False
+                catalog = Lazy.of(value)
+            else:
+                # Nobody has used the old version, so stay lazy
+                catalog = self._lazy(name)
+            self._current = current.replace(name, catalog)
+            elapsed_ms = (time.perf_counter() - start) * 1e3
+
+            self.swaps += 1
+            self.last_swap_ms = elapsed_ms
+            self.max_swap_ms = max(self.max_swap_ms or 0.0, elapsed_ms)
+            self.last_swap_at = datetime.now().isoformat()
+
+        for callback in self._listeners:
+            callback(name, self._current)
+        return True
+
+    def start(self, poll_interval):
+        if self._thread is not None:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._poll, args=(poll_interval,), name='catalog-watcher', daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+
+    def _poll(self, poll_interval):
+        while not self._stop.wait(poll_interval):
+            try:
+                self.check()
+            except Exception as e:
+                print(f"Error watching catalogs: {e}")
+
+    def metrics(self):
+        current = self._current
+        return {
+            'version': current.version,
+            'exercises_version': current.versions['exercises'],
+            'nutrition_version': current.versions['nutrition'],
+            'watching': self._thread is not None,
+            'swaps': self.swaps,
+            'reload_failures': self.reload_failures,
+            'last_swap_ms': self.last_swap_ms,
+            'max_swap_ms': self.max_swap_ms,
+            'last_swap_at': self.last_swap_at,
+            'last_error': self.last_error,
+        }
@@ -0,0 +1,182 @@
+"""Loading the exercise and nutrition catalogs.
+
+Each catalog is read from its precompiled snapshot when a usable one
+exists (see ``healthjourney.snapshot``) and from the JSON file otherwise.
+``Lazy`` defers the load until a request first needs the catalog.
+"""
+import contextlib
+import gc
+import json
+import os
+import threading
+
+from healthjourney.catalog import ExerciseIndex
+from healthjourney.nutrition import NutritionPlanner
+from healthjourney.schedule import ProgramScheduler
+from healthjourney.search import SearchIndex
+from healthjourney.snapshot import read_snapshot, write_snapshot
+
+DATA_DIR = os.environ.get(
+    'HEALTHJOURNEY_DATA_DIR',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+)
+
+
+def exercises_path(data_dir):
+    return os.path.join(data_dir, 'exercises.json')
+
+
+def nutrition_path(data_dir):
+    return os.path.join(data_dir, 'nutrition.json')
+
+
+class ExerciseCatalog:
+    """The parsed exercises.json together with its index, program scheduler and search index.
+
+    The search index takes several times longer to build than the lookup
+    index, so it is built by the first search rather than on every load.
+    """
+
+    __slots__ = ('data', 'index', 'scheduler', 'search')
+
+    def __init__(self, data, index):
+        self.data = data
+        self.index = index
+        self.scheduler = ProgramScheduler(index)
+        self.search = Lazy(lambda: SearchIndex(index.exercises))
+
+    def build_like(self, previous):
+        """Build now whatever ``previous`` built on demand, so replacing it adds no cold start."""
+        if previous.search.loaded:
+            self.search.get()
+
+
+class NutritionCatalog:
+    """The parsed nutrition.json together with its precomputed meal plans."""
+
+    __slots__ = ('data', 'planner')
+
+    def __init__(self, data, planner):
+        self.data = data
+        self.planner = planner
+
+    def build_like(self, previous):
+        """Nothing is built on demand; see ``ExerciseCatalog.build_like``."""
+
+
+@contextlib.contextmanager
+def gc_paused():
+    """Suspend the cyclic GC while a catalog is built.
+
+    Parsing allocates one container per exercise, and without this the
+    collector repeatedly walks the half-built catalog; none of it can be
+    garbage yet.
+    """
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _read_json(path, default, strict=False):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except Exception as e:
+        if strict:
+            raise
+        print(f"Error loading data: {e}")
+        return default
+
+
+def load_exercises(data_dir, strict=False):
+    """Load the exercise catalog.
+
+    An unreadable file gives an empty catalog, unless ``strict`` is set,
+    in which case the error is raised and the data is validated too.
+    """
+    path = exercises_path(data_dir)
+    with gc_paused():
+        snapshot = read_snapshot(path)
+        if snapshot is not None:
+            data = snapshot['data']
+            return ExerciseCatalog(data, ExerciseIndex.from_buckets(data.get('exercises', []), snapshot['buckets']))
+        data = _read_json(path, {'exercises': []}, strict)
+        if strict:
+            validate_exercises(data)
+        return ExerciseCatalog(data, ExerciseIndex(data.get('exercises', [])))
+
+
+def load_nutrition(data_dir, strict=False):
+    """Load the nutrition catalog; see ``load_exercises`` for ``strict``."""
+    path = nutrition_path(data_dir)
+    with gc_paused():
+        snapshot = read_snapshot(path)
+        if snapshot is not None:
+            data = snapshot['data']
+            return NutritionCatalog(data, NutritionPlanner(data, snapshot.get('plans')))
+        data = _read_json(path, {'tiers': {}}, strict)
+        if strict:
+            validate_nutrition(data)
+        return NutritionCatalog(data, NutritionPlanner(data))
+
+
+def validate_exercises(data):
+    """Raise ``ValueError`` unless ``data`` looks like exercises.json."""
+    if not isinstance(data, dict) or not isinstance(data.get('exercises'), list):
+        raise ValueError('expected an object with an "exercises" list')
+    for position, exercise in enumerate(data['exercises']):
+        if not isinstance(exercise, dict) or 'id' not in exercise or 'level' not in exercise:
+            raise ValueError(f'exercise #{position} needs at least "id" and "level"')
+
+
+def validate_nutrition(data):
+    """Raise ``ValueError`` unless ``data`` looks like nutrition.json."""
+    if not isinstance(data, dict) or not isinstance(data.get('tiers'), dict):
+        raise ValueError('expected an object with a "tiers" object')
+    for name, tier in data['tiers'].items():
+        if not isinstance(tier, dict) or not isinstance(tier.get('meals', {}), dict):
+            raise ValueError(f'tier "{name}" must be an object with a "meals" object')
+
+
+def build_snapshots(data_dir):
+    """Write snapshots for both catalogs and return their paths."""
+    exercises = _read_json(exercises_path(data_dir), {'exercises': []})
+    index = ExerciseIndex(exercises.get('exercises', []))
+    nutrition = _read_json(nutrition_path(data_dir), {'tiers': {}})
+    return [
+        write_snapshot(exercises_path(data_dir), {'data': exercises, 'buckets': index.buckets}),
+        write_snapshot(nutrition_path(data_dir), {'data': nutrition, 'plans': NutritionPlanner(nutrition).plans}),
+    ]
+
+
+class Lazy:
+    """A value built by ``factory`` on first access."""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._value = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def of(cls, value):
+        """An already-built value."""
+        lazy = cls(None)
+        lazy._value = value
+        return lazy
+
+    def get(self):
+        value = self._value
+        if value is None:
+            with self._lock:
+                if self._value is None:
+                    self._value = self._factory()
+                value = self._value
+        return value
+
+    @property
+    def loaded(self):
+        return self._value is not None
@@ -0,0 +1,79 @@
+"""The ``/api/*`` route table shared by the Netlify and ASGI adapters.
+
+Endpoints take a ``healthjourney.routing.Request``, whose ``params``
+holds the path parameters, and return the service's ``ApiResponse``. The service is
+looked up through ``get_service`` on every call, so an adapter can swap
+its service (as the parity check does) after the table is built.
+Endpoints that take a body carry its limit in bytes as ``max_body``, so
+a server can refuse a larger one before reading it.
+"""
+from healthjourney.routing import Router
+from healthjourney.schemas import COMPLETION_SCHEMA, DAY_SCHEMA, MAX_BATCH_BODY, PROFILE_SCHEMA, SESSION_SCHEMA
+
+
+def max_body(limit):
+    """Mark an endpoint as taking a request body of at most ``limit`` bytes."""
+    def decorator(endpoint):
+        endpoint.max_body = limit
+        return endpoint
+    return decorator
+
+
+def build_router(get_service):
+    """Compile the API routes, relative to ``/api``, for ``get_service()``."""
+    router = Router()
+
+    @router.route('POST', 'profile')
+    @max_body(PROFILE_SCHEMA.max_body)
+    def create_profile(request):
+        return get_service().create_profile(request.body)
+
+    @router.route('POST', 'profiles/batch')
+    @max_body(MAX_BATCH_BODY)
+    def create_profiles_batch(request):
+        return get_service().create_profiles_batch(request.body, request.headers.get('content-type', ''))
+
+    @router.route('GET', 'profile/<user_id>')
+    def get_profile(request):
+        return get_service().get_profile(request.params['user_id'])
+
+    @router.route('GET', 'workout/<user_id>')
+    def get_workout(request):
+        return get_service().get_workout(request.params['user_id'], request.headers, request.client)
+
+    @router.route('GET', 'nutrition/<user_id>')
+    def get_nutrition(request):
+        return get_service().get_nutrition(request.params['user_id'], request.headers, request.client)
+
+    @router.route('POST', 'workout/complete')
+    @max_body(COMPLETION_SCHEMA.max_body)
+    def complete_exercise(request):
+        return get_service().complete_exercise(request.body)
+
+    @router.route('POST', 'workout/complete/batch')
+    @max_body(SESSION_SCHEMA.max_body)
+    def complete_session(request):
+        return get_service().complete_session(request.body)
+
+    @router.route('POST', 'workout/day/complete')
+    @max_body(DAY_SCHEMA.max_body)
+    def complete_day(request):
+        return get_service().complete_day(request.body)
+
+    @router.route('GET', 'stats/<user_id>')
+    def get_stats(request):
+        return get_service().get_stats(request.params['user_id'], request.query)
+
+    @router.route('GET', 'exercises')
+    def get_exercises(request):
+        return get_service().get_exercises(request.headers, request.query)
+
+    @router.route('GET', 'exercises/search')
+    def search_exercises(request):
+        return get_service().search_exercises(request.headers, request.query)
+
+    @router.route('GET', 'metrics')
+    def get_metrics(request):
+        return get_service().get_metrics(request.query)
+
+    return router
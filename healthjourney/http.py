@@ -0,0 +1,106 @@
+"""Transport-neutral API responses.
+
+Handlers in ``healthjourney.service`` return an ``ApiResponse``; the Flask
+app and the Netlify function only translate it into their own response
+type, so both deployments send exactly the same status, headers and body.
+"""
+import json
+import math
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; it only speeds up request parsing
+    orjson = None
+
+# Shared, never-mutated header templates
+JSON_HEADERS = {
+    'Content-Type': 'application/json',
+    'Access-Control-Allow-Origin': '*'
+}
+
+NDJSON_HEADERS = {
+    'Content-Type': 'application/x-ndjson',
+    'Access-Control-Allow-Origin': '*'
+}
+
+PROMETHEUS_HEADERS = {
+    'Content-Type': 'text/plain; version=0.0.4; charset=utf-8',
+    'Access-Control-Allow-Origin': '*'
+}
+
+
+class ApiResponse:
+    """Status, headers and body of one API response.
+
+    ``body`` is a ``str`` for plain JSON, ``bytes`` for a compressed
+    body, or an iterator of ``str`` chunks for a streamed body.
+    """
+
+    __slots__ = ('status', 'headers', 'body')
+
+    def __init__(self, status, body, headers=JSON_HEADERS):
+        self.status = status
+        self.body = body
+        self.headers = headers
+
+
+def json_response(payload, status=200):
+    return ApiResponse(status, json.dumps(payload))
+
+
+def error_response(message, status):
+    return ApiResponse(status, json.dumps({'success': False, 'error': message}))
+
+
+def too_many_requests(seconds):
+    """A 429 asking the client to wait ``seconds`` before trying again."""
+    headers = dict(JSON_HEADERS, **{'Retry-After': str(max(1, math.ceil(seconds)))})
+    return ApiResponse(429, TOO_MANY_REQUESTS_BODY, headers)
+
+
+TOO_MANY_REQUESTS_BODY = json.dumps({'success': False, 'error': 'Too many requests'})
+
+# Error bodies that never change are serialized once
+NOT_FOUND = error_response('Endpoint not found', 404)
+USER_NOT_FOUND = error_response('User not found', 404)
+SERVER_ERROR = error_response('Server error', 500)
+PAYLOAD_TOO_LARGE = error_response('Request body too large', 413)
+
+
+def cached_response(representation, request_headers):
+    """Answer with a pre-serialized body, honouring ETags and compression.
+
+    ``request_headers`` must support case-insensitive ``get`` on lowercase
+    names (a dict with lowercased keys, or Flask's ``request.headers``).
+    """
+    encoding, body, etag = representation.negotiate(request_headers.get('accept-encoding'))
+    if representation.matches(request_headers.get('if-none-match')):
+        # A 304 has no body, so no Content-Type either
+        return ApiResponse(304, '', {'Access-Control-Allow-Origin': '*', 'ETag': etag, 'Vary': 'Accept-Encoding'})
+    headers = dict(JSON_HEADERS, ETag=etag, Vary='Accept-Encoding')
+    if encoding:
+        headers['Content-Encoding'] = encoding
+        return ApiResponse(200, body, headers)
+    return ApiResponse(200, representation.text, headers)
+
+
+def body_size(body):
+    """Bytes in a raw (``str`` or ``bytes``) request body; ``None`` for a parsed one."""
+    if body.__class__ is bytes:
+        return len(body)
+    if body.__class__ is str:
+        return len(body) if body.isascii() else len(body.encode('utf-8'))
+    return None
+
+
+def parse_json_body(body):
+    """Decode a JSON request body; an empty one is ``{}``.
+
+    Raises ``ValueError('Invalid JSON')`` if the body is not JSON.
+    """
+    if not body:
+        return {}
+    try:
+        return orjson.loads(body) if orjson is not None else json.loads(body)
+    except ValueError:
+        raise ValueError('Invalid JSON') from None
@@ -0,0 +1,475 @@
+"""Per-route request metrics, cheap enough to leave on in production.
+
+Every observed service method records its latency, request and response
+sizes in log-linear (HDR-style) histograms, plus its response statuses and
+any exception types. A request only appends one tuple to a queue, which
+needs no lock; the queue is folded into the per-route histograms every
+``FLUSH_EVERY`` requests, with numpy when it is installed, and before the
+metrics are read. ``render_prometheus`` turns the lot into the Prometheus
+text format.
+
+Optionally one request in N is run under a profiler. A sampled request
+that turns out slow keeps its profile, so slow paths can be inspected in
+production. Only one request is profiled at a time, and a profiler that
+fails never fails the request. cProfile is used, or pyinstrument with
+``HEALTHJOURNEY_PROFILER=pyinstrument`` if it is installed.
+"""
+import collections
+import cProfile
+import functools
+import io
+import itertools
+import math
+import operator
+import os
+import pstats
+import threading
+import time
+from datetime import datetime
+
+from healthjourney.http import body_size
+from healthjourney.optional import numpy
+
+# Exported histogram boundaries: seconds for latency, bytes for sizes
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+SIZE_BUCKETS = (128, 512, 2048, 8192, 32768, 131072, 524288, 2097152)
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+# Slow profiled requests that are kept, newest first
+MAX_SLOW_TRACES = 20
+
+# Requests queued before they are folded into the histograms
+FLUSH_EVERY = 1024
+# Below this many values a batch is recorded one by one, without numpy
+MIN_VECTOR_BATCH = 64
+
+
+class Histogram:
+    """Counts of non-negative integers in log-linear buckets, like HdrHistogram.
+
+    Values below ``2**sub_bits`` are counted exactly. Above that, each
+    power of two is split into ``2**sub_bits`` buckets, so every value is
+    known to within ``1/2**sub_bits`` (about 3% with the default 5 bits).
+    Not thread-safe; callers hold their own lock.
+    """
+
+    def __init__(self, sub_bits=5, max_bits=40):
+        self._sub_bits = sub_bits
+        self._sub_count = 1 << sub_bits
+        self._counts = [0] * ((max_bits - sub_bits + 1) << sub_bits)
+        self._last = len(self._counts) - 1
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    def _upper(self, index):
+        """Largest value counted in bucket ``index``."""
+        if index < self._sub_count:
+            return index
+        shift = (index >> self._sub_bits) - 1
+        top = index - (shift << self._sub_bits)
+        return ((top + 1) << shift) - 1
+
+    def record(self, value):
+        if value < self._sub_count:
+            index = value
+        else:
+            shift = value.bit_length() - self._sub_bits - 1
+            index = min((shift << self._sub_bits) + (value >> shift), self._last)
+        self._counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def record_many(self, values, scale=1):
+        """``record`` each of ``values`` times ``scale``, truncated to an int, at once."""
+        values = list(values)
+        np = numpy() if len(values) >= MIN_VECTOR_BATCH else None
+        if np is None:
+            for value in values:
+                self.record(int(value * scale))
+            return
+        values = (np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+        # frexp's exponent is the bit length, exactly for ints below 2**53
+        shift = np.maximum(np.frexp(values.astype(np.float64))[1] - self._sub_bits - 1, 0)
+        indexes = np.where(values < self._sub_count, values,
+                           np.minimum((shift << self._sub_bits) + (values >> shift), self._last))
+        binned = np.bincount(indexes)
+        counts = self._counts
+        for index in np.flatnonzero(binned).tolist():
+            counts[index] += int(binned[index])
+        self.count += len(values)
+        self.total += int(values.sum())
+        self.max = max(self.max, int(values.max()))
+
+    def percentile(self, fraction):
+        """Smallest bucket bound that at least ``fraction`` of the values fall under."""
+        if not self.count:
+            return 0
+        wanted = max(1, math.ceil(fraction * self.count))
+        seen = 0
+        for index, count in enumerate(self._counts):
+            seen += count
+            if seen >= wanted:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds):
+        """Counts of values at most each bound, for Prometheus ``le`` buckets."""
+        result = []
+        seen = 0
+        index = 0
+        counts = self._counts
+        for bound in bounds:
+            while index < len(counts) and self._upper(index) <= bound:
+                seen += counts[index]
+                index += 1
+            result.append(seen)
+        return result
+
+
+_STATUS = operator.itemgetter(0)
+_SECONDS = operator.itemgetter(1)
+
+
+class RouteStats:
+    """Everything recorded for one route.
+
+    Requests are queued in ``pending`` as ``(status, seconds, response
+    bytes, request bytes, exception)`` and folded in by ``flush``.
+    """
+
+    __slots__ = ('lock', 'pending', 'statuses', 'exceptions', 'latency_us', 'request_bytes', 'response_bytes')
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = collections.deque()
+        self.statuses = {}
+        self.exceptions = {}
+        self.latency_us = Histogram()
+        self.request_bytes = Histogram()
+        self.response_bytes = Histogram()
+
+    def flush(self, wait=True):
+        """Fold the queued requests in; with ``wait`` false, not if another thread holds the lock."""
+        if not self.lock.acquire(blocking=wait):
+            return
+        try:
+            pending = self.pending
+            # Only what is queued now; requests queued meanwhile wait their turn
+            items = [pending.popleft() for _ in range(len(pending))]
+            statuses = self.statuses
+            for status, count in collections.Counter(map(_STATUS, items)).items():
+                statuses[status] = statuses.get(status, 0) + count
+            for item in items:
+                if item[4] is not None:
+                    self.exceptions[item[4]] = self.exceptions.get(item[4], 0) + 1
+            self.latency_us.record_many(map(_SECONDS, items), 1e6)
+            self.response_bytes.record_many([item[2] for item in items if item[2] is not None])
+            # A body refused as too large may not have been read in full
+            self.request_bytes.record_many([item[3] for item in items if item[3] is not None and item[0] != 413])
+        finally:
+            self.lock.release()
+
+    def snapshot(self):
+        self.flush()
+        with self.lock:
+            return {
+                'requests': sum(self.statuses.values()),
+                'statuses': {str(status): count for status, count in sorted(self.statuses.items())},
+                'exceptions': dict(self.exceptions),
+                'latency_ms': {
+                    f'p{q * 100:g}': self.latency_us.percentile(q) / 1e3 for q in QUANTILES
+                },
+                'max_latency_ms': self.latency_us.max / 1e3,
+                'request_bytes': self.request_bytes.total,
+                'response_bytes': self.response_bytes.total,
+            }
+
+
+class Instrumentation:
+    """Per-route metrics plus optional sampled profiling of slow requests.
+
+    ``profile_every`` profiles one request in that many (0 turns sampling
+    off). A profiled request that takes at least ``slow_ms`` keeps its
+    profile in ``slow_traces``. ``clock`` returns seconds.
+    """
+
+    def __init__(self, profile_every=0, slow_ms=250, profiler='cprofile', clock=time.perf_counter):
+        self.routes = {}
+        self.clock = clock
+        self._routes_lock = threading.Lock()
+        self.profile_every = profile_every
+        self.slow_ms = slow_ms
+        self.profiler = profiler
+        self.slow_traces = collections.deque(maxlen=MAX_SLOW_TRACES)
+        self.last_profiler_error = None
+        self._calls = itertools.count(1)
+        # Held by the one request being profiled
+        self._profile_lock = threading.Lock()
+
+    @classmethod
+    def from_environment(cls):
+        """Configured by ``HEALTHJOURNEY_PROFILE_EVERY``, ``_SLOW_MS`` and ``_PROFILER``."""
+        return cls(
+            profile_every=int(os.environ.get('HEALTHJOURNEY_PROFILE_EVERY', 0)),
+            slow_ms=float(os.environ.get('HEALTHJOURNEY_SLOW_MS', 250)),
+            profiler=os.environ.get('HEALTHJOURNEY_PROFILER', 'cprofile'),
+        )
+
+    def _add_route(self, route):
+        with self._routes_lock:
+            return self.routes.setdefault(route, RouteStats())
+
+    def observe(self, route, status, seconds, body=None, exception=None, request_bytes=None):
+        stats = self.routes.get(route) or self._add_route(route)
+        pending = stats.pending
+        # Appending needs no lock. JSON bodies are ASCII (json.dumps escapes
+        # the rest), so characters are bytes; streamed bodies are not measured
+        pending.append((status, seconds, len(body) if body.__class__ is str or body.__class__ is bytes else None,
+                        request_bytes, exception))
+        if len(pending) >= FLUSH_EVERY:
+            stats.flush(wait=False)
+
+    def flush(self):
+        """Fold every route's queued requests into its stats."""
+        for stats in list(self.routes.values()):
+            stats.flush()
+
+    def call(self, route, function, *args, **kwargs):
+        """Run ``function`` and record it under ``route``; exceptions propagate."""
+        return self.call_sized(route, None, function, args, kwargs)
+
+    def call_sized(self, route, request_bytes, function, args, kwargs):
+        """``call`` for a request whose body was ``request_bytes`` long (``None`` if it had none)."""
+        if self.profile_every and next(self._calls) % self.profile_every == 0:
+            # One profiler at a time; a sample that finds it busy is skipped
+            if self._profile_lock.acquire(blocking=False):
+                try:
+                    return self._profiled(route, request_bytes, function, args, kwargs)
+                finally:
+                    self._profile_lock.release()
+        clock = self.clock
+        start = clock()
+        try:
+            response = function(*args, **kwargs)
+        except Exception as e:
+            self.observe(route, 500, clock() - start, exception=type(e).__name__, request_bytes=request_bytes)
+            raise
+        self.observe(route, response.status, clock() - start, response.body, request_bytes=request_bytes)
+        return response
+
+    def _profiled(self, route, request_bytes, function, args, kwargs):
+        try:
+            profiler = _start_profiler(self.profiler)
+        except Exception as e:
+            # Another profiling tool may be active; the request runs unprofiled
+            profiler = None
+            self.last_profiler_error = f'{type(e).__name__}: {e}'
+        start = self.clock()
+        try:
+            response = function(*args, **kwargs)
+        except Exception as e:
+            elapsed = self.clock() - start
+            self.observe(route, 500, elapsed, exception=type(e).__name__, request_bytes=request_bytes)
+            self._keep_trace(route, elapsed, profiler)
+            raise
+        elapsed = self.clock() - start
+        self.observe(route, response.status, elapsed, response.body, request_bytes=request_bytes)
+        self._keep_trace(route, elapsed, profiler)
+        return response
+
+    def _keep_trace(self, route, seconds, profiler):
+        if profiler is None:
+            return
+        try:
+            trace = _stop_profiler(profiler)
+        except Exception as e:
+            self.last_profiler_error = f'{type(e).__name__}: {e}'
+            return
+        if seconds * 1e3 >= self.slow_ms:
+            self.slow_traces.appendleft({
+                'route': route,
+                'ms': round(seconds * 1e3, 3),
+                'at': datetime.now().isoformat(),
+                'profile': trace,
+            })
+
+    def snapshot(self):
+        return {
+            'routes': {route: stats.snapshot() for route, stats in sorted(self.routes.items())},
+            'profile_every': self.profile_every,
+            'slow_ms': self.slow_ms,
+            'slow_traces': list(self.slow_traces),
+            'last_profiler_error': self.last_profiler_error,
+        }
+
+
+def _start_profiler(kind):
+    if kind == 'pyinstrument':
+        try:
+            import pyinstrument
+        except ImportError:
+            pass
+        else:
+            profiler = pyinstrument.Profiler()
+            profiler.start()
+            return profiler
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _stop_profiler(profiler):
+    if isinstance(profiler, cProfile.Profile):
+        profiler.disable()
+        out = io.StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(25)
+        return out.getvalue()
+    profiler.stop()
+    return profiler.output_text()
+
+
+def observed(route, request_body=False):
+    """Record a ``HealthService`` method under ``route`` in ``self.instrumentation``.
+
+    Goes inside ``handles_errors``, so it sees the exception type before
+    the error is turned into a 500 response. With ``request_body`` the
+    method's first argument is the request body, whose size is recorded.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = self.instrumentation
+            if instrumentation is None:
+                return method(self, *args, **kwargs)
+            size = body_size(args[0]) if request_body and args else None
+            return instrumentation.call_sized(route, size, method, (self,) + args, kwargs)
+        return wrapper
+    return decorator
+
+
+# Prometheus text format
+
+def _labels(**labels):
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value is None:
+        return 'NaN'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class PrometheusWriter:
+    """Accumulates metric families and renders the text exposition format."""
+
+    def __init__(self, prefix='healthjourney_'):
+        self.prefix = prefix
+        self._lines = []
+
+    def family(self, name, kind, help_text):
+        name = self.prefix + name
+        self._lines.append(f'# HELP {name} {help_text}')
+        self._lines.append(f'# TYPE {name} {kind}')
+        return name
+
+    def sample(self, name, value, **labels):
+        self._lines.append(f'{name}{_labels(**labels) if labels else ""} {_number(value)}')
+
+    def histogram(self, name, histogram, bounds, scale, **labels):
+        """Samples for a ``Histogram`` whose values are ``scale`` units of the exported unit."""
+        cumulative = histogram.cumulative([bound * scale for bound in bounds])
+        for bound, count in zip(bounds, cumulative):
+            self.sample(f'{name}_bucket', count, **labels, le=_number(float(bound)))
+        self.sample(f'{name}_bucket', histogram.count, **labels, le='+Inf')
+        self.sample(f'{name}_sum', histogram.total / scale, **labels)
+        self.sample(f'{name}_count', histogram.count, **labels)
+
+    def render(self):
+        return '\n'.join(self._lines) + '\n'
+
+
+def render_prometheus(instrumentation, caches, catalogs):
+    """The text exposition of the request metrics, cache stats and catalog metrics."""
+    out = PrometheusWriter()
+    routes = []
+    if instrumentation is not None:
+        instrumentation.flush()
+        routes = sorted(instrumentation.routes.items())
+    # Copy each route's data under its lock, then format without it
+    copies = []
+    requests = []
+    for route, stats in routes:
+        with stats.lock:
+            latency, size = _copy(stats.latency_us), _copy(stats.response_bytes)
+            copies.append((route, dict(stats.statuses), dict(stats.exceptions), latency, size))
+            if stats.request_bytes.count:
+                requests.append((route, _copy(stats.request_bytes)))
+
+    name = out.family('requests_total', 'counter', 'Requests handled, by route and status.')
+    for route, statuses, _, _, _ in copies:
+        for status, count in sorted(statuses.items()):
+            out.sample(name, count, route=route, status=status)
+
+    name = out.family('request_errors_total', 'counter', 'Requests answered with a 5xx status, by route.')
+    for route, statuses, _, _, _ in copies:
+        out.sample(name, sum(count for status, count in statuses.items() if status >= 500), route=route)
+
+    name = out.family('exceptions_total', 'counter', 'Unhandled exceptions, by route and type.')
+    for route, _, exceptions, _, _ in copies:
+        for kind, count in sorted(exceptions.items()):
+            out.sample(name, count, route=route, type=kind)
+
+    name = out.family('request_duration_seconds', 'histogram', 'Time spent in the service per request.')
+    for route, _, _, latency, _ in copies:
+        out.histogram(name, latency, LATENCY_BUCKETS, 1e6, route=route)
+
+    name = out.family('request_duration_quantile_seconds', 'gauge', 'Latency quantiles since start.')
+    for route, _, _, latency, _ in copies:
+        for q in QUANTILES:
+            out.sample(name, latency.percentile(q) / 1e6, route=route, quantile=_number(q))
+
+    name = out.family('response_size_bytes', 'histogram', 'Size of non-streamed response bodies.')
+    for route, _, _, _, size in copies:
+        out.histogram(name, size, SIZE_BUCKETS, 1, route=route)
+
+    name = out.family('request_size_bytes', 'histogram', 'Size of raw request bodies, for routes that take one.')
+    for route, size in requests:
+        out.histogram(name, size, SIZE_BUCKETS, 1, route=route)
+
+    for metric, kind, help_text in (
+        ('hits', 'counter', 'Cache lookups that found an entry.'),
+        ('misses', 'counter', 'Cache lookups that found nothing.'),
+        ('evictions', 'counter', 'Entries dropped to stay within bounds.'),
+        ('expirations', 'counter', 'Entries dropped for being older than the TTL.'),
+        ('entries', 'gauge', 'Entries currently cached.'),
+        ('bytes', 'gauge', 'Bytes currently cached.'),
+        ('hit_rate', 'gauge', 'Hits over lookups since start.'),
+    ):
+        name = out.family(f'cache_{metric}' + ('_total' if kind == 'counter' else ''), kind, help_text)
+        for cache, stats in sorted(caches.items()):
+            out.sample(name, stats.get(metric), cache=cache)
+
+    name = out.family('catalog_swaps_total', 'counter', 'Catalogs reloaded and swapped in.')
+    out.sample(name, catalogs['swaps'])
+    name = out.family('catalog_reload_failures_total', 'counter', 'Catalog reloads that failed.')
+    out.sample(name, catalogs['reload_failures'])
+    name = out.family('catalog_version', 'gauge', 'Current version of each catalog.')
+    out.sample(name, catalogs['exercises_version'], catalog='exercises')
+    out.sample(name, catalogs['nutrition_version'], catalog='nutrition')
+    return out.render()
+
+
+def _copy(histogram):
+    copy = Histogram.__new__(Histogram)
+    copy.__dict__.update(histogram.__dict__)
+    copy._counts = list(histogram._counts)
+    return copy
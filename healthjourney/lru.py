@@ -0,0 +1,102 @@
+"""Bounded LRU cache with optional TTL and byte budget."""
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Least-recently-used mapping capped by entry count and total size.
+
+    ``sizeof(value)`` gives each entry's size in bytes for the
+    ``max_bytes`` budget. Entries older than ``ttl`` seconds count as
+    misses and are dropped. Hits, misses, evictions and expirations are
+    counted for ``stats``.
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=None, ttl=None, sizeof=None, clock=time.monotonic):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._sizeof = sizeof or (lambda value: 0)
+        self._clock = clock
+        # key -> (value, size, expires_at)
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, size, expires_at = entry
+            if expires_at is not None and self._clock() >= expires_at:
+                del self._entries[key]
+                self._bytes -= size
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """Store ``value``; returns the value now cached under ``key``."""
+        size = self._sizeof(value)
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Would evict everything else and still not fit
+            return value
+        expires_at = None if self.ttl is None else self._clock() + self.ttl
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, expires_at)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or (
+                    self.max_bytes is not None and self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+        return value
+
+    def pop(self, key):
+        """Remove ``key``; returns its value, or None if absent or expired."""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            value, size, expires_at = entry
+            self._bytes -= size
+            if expires_at is not None and self._clock() >= expires_at:
+                self.expirations += 1
+                return None
+            return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'max_entries': self.max_entries,
+            'max_bytes': self.max_bytes,
+            'ttl_seconds': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hits / lookups if lookups else None,
+        }
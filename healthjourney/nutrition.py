@@ -0,0 +1,171 @@
+"""Macro targets and portion-scaled meal plans.
+
+A plan depends only on the tier, the nutrition guide and the daily
+calories, so every (tier, guide, calorie band) combination is worked out
+once when the nutrition catalog is loaded. A request then only looks up
+its band and computes its own exact macro targets.
+"""
+import json
+import threading
+
+from healthjourney.response_cache import Representation, make_etag
+
+# Energy per gram of each macronutrient
+KCAL_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+# Profile goals and the nutrition_guides entry that applies to each;
+# goals without a guide of their own get BALANCED_GUIDE
+GOAL_GUIDES = {'weightLoss': 'weight_loss', 'muscleGain': 'muscle_gain', 'endurance': 'endurance'}
+BALANCED_GUIDE = 'balanced'
+BALANCED_RATIOS = {'protein_ratio': 0.25, 'carbs_ratio': 0.5, 'fats_ratio': 0.25}
+
+# Daily calories are grouped into bands of BAND_WIDTH kcal, and the
+# range is clamped, so each (tier, guide) has a fixed number of plans
+BAND_WIDTH = 100
+MIN_CALORIES = 1000
+MAX_CALORIES = 5000
+
+# Share of the daily calories eaten at each meal
+MEAL_SHARES = {'breakfast': 0.25, 'lunch': 0.35, 'dinner': 0.3, 'snacks': 0.1}
+
+# Portions are whole multiples of PORTION_STEP servings, within these bounds
+PORTION_STEP = 0.25
+MIN_PORTION = 0.5
+MAX_PORTION = 3.0
+
+# Meal options kept per meal: the ones that need the least scaling
+MAX_OPTIONS = 3
+
+# Served for tiers that do not exist, like the empty ``plan`` beside it
+NO_PLAN = Representation({}, '{}', make_etag('{}'))
+
+
+def band_of(calories):
+    """Index of the calorie band ``calories`` falls in."""
+    calories = min(max(calories, MIN_CALORIES), MAX_CALORIES)
+    return int(round((calories - MIN_CALORIES) / BAND_WIDTH))
+
+
+def band_calories(band):
+    """Daily calories at the centre of ``band``."""
+    return MIN_CALORIES + band * BAND_WIDTH
+
+
+def band_count():
+    return band_of(MAX_CALORIES) + 1
+
+
+def macro_targets(calories, ratios):
+    """Grams of protein, carbs and fat that provide ``calories`` in the guide's ratios."""
+    return {
+        'protein_g': round(calories * ratios['protein_ratio'] / KCAL_PER_GRAM['protein']),
+        'carbs_g': round(calories * ratios['carbs_ratio'] / KCAL_PER_GRAM['carbs']),
+        'fat_g': round(calories * ratios['fats_ratio'] / KCAL_PER_GRAM['fat']),
+    }
+
+
+def _number(value):
+    return value if isinstance(value, (int, float)) and not isinstance(value, bool) else 0
+
+
+def portion_for(item, target):
+    """Servings of ``item`` closest to ``target`` calories, in whole portion steps."""
+    calories = _number(item.get('calories'))
+    portion = target / calories if calories > 0 else 1.0
+    return min(max(round(portion / PORTION_STEP) * PORTION_STEP, MIN_PORTION), MAX_PORTION)
+
+
+def scale_item(item, portion):
+    """A meal item's name and nutrients for ``portion`` servings."""
+    return {
+        'name': item.get('name'),
+        'portion': portion,
+        'calories': round(_number(item.get('calories')) * portion),
+        'protein': round(_number(item.get('protein')) * portion, 1),
+        'carbs': round(_number(item.get('carbs')) * portion, 1),
+        'fat': round(_number(item.get('fat')) * portion, 1),
+    }
+
+
+def build_meals(tier, calories):
+    """Each meal of a tier with its options scaled to ``calories`` a day."""
+    meals = {}
+    tier_meals = tier.get('meals')
+    for meal, items in (tier_meals.items() if isinstance(tier_meals, dict) else ()):
+        target = round(calories * MEAL_SHARES.get(meal, 0))
+        items = [item for item in items if isinstance(item, dict)] if isinstance(items, list) else []
+        portions = [portion_for(item, target) for item in items]
+        # Keep the options that need the least scaling, in catalog order
+        ranked = sorted(range(len(items)), key=lambda i: abs(portions[i] - 1.0))
+        meals[meal] = {
+            'target_calories': target,
+            'options': [scale_item(items[i], portions[i]) for i in sorted(ranked[:MAX_OPTIONS])],
+        }
+    return meals
+
+
+def build_plan(meals, ratios, calories):
+    """The plan for one guide at ``calories`` a day, around meals from ``build_meals``."""
+    return {
+        'calories': calories,
+        'macros': macro_targets(calories, ratios),
+        'meals': meals,
+    }
+
+
+class NutritionPlanner:
+    """Every meal plan of a nutrition catalog, precomputed.
+
+    ``plans`` maps ``(tier, guide)`` to one plan per calorie band. Each
+    plan is serialized the first time it is served and kept as long as
+    the catalog, so a request never serializes a plan again.
+    """
+
+    def __init__(self, data, plans=None):
+        guides = data.get('nutrition_guides')
+        self.ratios = {BALANCED_GUIDE: BALANCED_RATIOS}
+        for name, guide in (guides.items() if isinstance(guides, dict) else ()):
+            if isinstance(guide, dict) and all(_number(guide.get(key)) for key in BALANCED_RATIOS):
+                self.ratios[name] = {key: guide[key] for key in BALANCED_RATIOS}
+        if plans is None:
+            plans = {}
+            for tier_name, tier in data.get('tiers', {}).items():
+                if not isinstance(tier, dict):
+                    continue
+                # Portions depend only on the calories, so every guide shares them
+                meals = [build_meals(tier, band_calories(band)) for band in range(band_count())]
+                for guide, ratios in self.ratios.items():
+                    plans[tier_name, guide] = [
+                        build_plan(band_meals, ratios, band_calories(band)) for band, band_meals in enumerate(meals)
+                    ]
+        self._plans = plans
+        self._fragments = {}
+        self._lock = threading.Lock()
+
+    @property
+    def plans(self):
+        return self._plans
+
+    def guide_for(self, goal):
+        """Name of the guide a profile goal uses; ``BALANCED_GUIDE`` if it has none."""
+        guide = GOAL_GUIDES.get(goal) if isinstance(goal, str) else None
+        return guide if guide in self.ratios else BALANCED_GUIDE
+
+    def fragment(self, tier, goal, calories):
+        """Serialized plan for a tier, profile goal and daily calories.
+
+        Returns ``NO_PLAN`` when the tier does not exist.
+        """
+        key = (tier, self.guide_for(goal), band_of(calories))
+        try:
+            fragment = self._fragments.get(key)
+        except TypeError:
+            return NO_PLAN
+        if fragment is None:
+            bands = self._plans.get(key[:2])
+            if bands is None:
+                return NO_PLAN
+            text = json.dumps(bands[key[2]])
+            with self._lock:
+                fragment = self._fragments.setdefault(key, Representation(bands[key[2]], text, make_etag(text)))
+        return fragment
@@ -0,0 +1,19 @@
+"""Optional dependencies that are slow to import, loaded on first use."""
+
+# numpy is only loaded by the first batch computation that can use it;
+# without it those computations fall back to plain Python
+_numpy = None
+_numpy_checked = False
+
+
+def numpy():
+    """Return the numpy module, or ``None`` when it is not installed."""
+    global _numpy, _numpy_checked
+    if not _numpy_checked:
+        try:
+            import numpy as module
+            _numpy = module
+        except ImportError:
+            pass
+        _numpy_checked = True
+    return _numpy
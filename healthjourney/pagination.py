@@ -0,0 +1,103 @@
+"""Cursor pagination, field projection and streaming for list endpoints."""
+import base64
+import json
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+# Exercises serialized per chunk when streaming
+STREAM_CHUNK = 64
+
+
+class PageQuery:
+    """Parsed ``limit`` / ``cursor`` / ``fields`` query parameters."""
+
+    __slots__ = ('limit', 'cursor', 'fields')
+
+    def __init__(self, limit, cursor, fields):
+        self.limit = limit
+        self.cursor = cursor
+        self.fields = fields
+
+
+def parse_page_query(query, default_limit=DEFAULT_PAGE_SIZE, max_limit=MAX_PAGE_SIZE, field_names=None):
+    """Read paging parameters from a query mapping; raise ``ValueError`` if invalid.
+
+    ``limit`` is capped at ``max_limit`` (``None`` for no cap) and
+    ``fields`` becomes a sorted tuple of names, or ``None`` for every
+    field. Names not in ``field_names`` are dropped, so however a client
+    spells a projection, it is one cache key.
+    """
+    limit = query.get('limit')
+    if limit is None or limit == '':
+        limit = default_limit
+    else:
+        try:
+            limit = int(limit)
+        except ValueError:
+            raise ValueError('limit must be an integer')
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+        if max_limit is not None:
+            limit = min(limit, max_limit)
+
+    cursor = query.get('cursor') or None
+    if cursor is not None:
+        cursor = decode_cursor(cursor)
+
+    fields = {name.strip() for name in (query.get('fields') or '').split(',') if name.strip()} or None
+    if fields is not None:
+        if field_names is not None:
+            fields &= field_names
+        fields = tuple(sorted(fields))
+    return PageQuery(limit, cursor, fields)
+
+
+def encode_cursor(position, item_id):
+    """Opaque cursor pointing just past the item at ``position``."""
+    raw = json.dumps([position, item_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).rstrip(b'=').decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Return ``(position, item_id)`` from ``encode_cursor``; raise ``ValueError``."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        position, item_id = json.loads(raw)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, int) or position < 0:
+        raise ValueError('Invalid cursor')
+    return position, item_id
+
+
+def project(item, fields):
+    if fields is None:
+        return item
+    return {name: item[name] for name in fields if name in item}
+
+
+def page_payload(items, start, limit, fields, key):
+    """The JSON payload for one page of ``items`` starting at ``start``."""
+    stop = min(start + limit, len(items))
+    page = [project(items[i], fields) for i in range(start, stop)]
+    next_cursor = encode_cursor(stop - 1, items[stop - 1].get('id')) if stop < len(items) else None
+    return {'success': True, key: page, 'next_cursor': next_cursor}
+
+
+def stream_ndjson(items, start, stop, fields, dumps=json.dumps):
+    """Yield ``items[start:stop]`` as NDJSON, a chunk of lines at a time."""
+    for chunk_start in range(start, stop, STREAM_CHUNK):
+        chunk_stop = min(chunk_start + STREAM_CHUNK, stop)
+        yield ''.join(dumps(project(items[i], fields)) + '\n' for i in range(chunk_start, chunk_stop))
+
+
+def stream_json(items, start, stop, fields, key, dumps=json.dumps):
+    """Yield the same document ``page_payload`` builds, written incrementally."""
+    yield '{"success": true, ' + dumps(key) + ': ['
+    for chunk_start in range(start, stop, STREAM_CHUNK):
+        chunk_stop = min(chunk_start + STREAM_CHUNK, stop)
+        chunk = ', '.join(dumps(project(items[i], fields)) for i in range(chunk_start, chunk_stop))
+        yield chunk if chunk_start == start else ', ' + chunk
+    next_cursor = encode_cursor(stop - 1, items[stop - 1].get('id')) if stop < len(items) else None
+    yield '], "next_cursor": ' + dumps(next_cursor) + '}'
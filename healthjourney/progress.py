@@ -0,0 +1,140 @@
+"""Workout progress records that stay exact under concurrent completions.
+
+Writers for the same user serialize on one of a fixed set of striped
+locks, so a hot user never blocks the others and the lock count does
+not grow with the user count. Each update publishes a brand-new record
+instead of mutating the old one, so readers just fetch the current
+record without taking any lock and can never see a half-applied update.
+"""
+import bisect
+import threading
+
+from healthjourney.records import ProgressRecord, Record
+
+DEFAULT_STRIPES = 64
+
+
+def apply_completion(progress, calories, day=None):
+    """Return a new progress record with one completion applied.
+
+    ``day`` is the program day the completion belongs to. It is added to
+    ``completed_days`` once, and ``streak`` becomes the length of the run
+    of consecutive completed days ending at the latest one. Works on
+    progress dicts and on ``ProgressRecord``s alike.
+    """
+    if type(progress) is ProgressRecord:
+        updated = _apply_to_record(progress, calories, day)
+        if updated is not None:
+            return updated
+    changes = {'total_calories_burned': progress['total_calories_burned'] + calories}
+    completed_days = progress['completed_days']
+    if day is not None and day not in completed_days:
+        completed_days = list(completed_days)
+        bisect.insort(completed_days, day)
+        changes['completed_days'] = completed_days
+        changes['streak'] = trailing_streak(completed_days)
+    if isinstance(progress, Record):
+        return progress.replace(changes)
+    return dict(progress, **changes)
+
+
+def _apply_to_record(progress, calories, day):
+    # Works on the slots directly; None when the record needs the general path
+    days = progress.completed_days
+    total = progress.total_calories_burned
+    if days is None or total is None or progress.extra is not None or not (day is None or type(day) is int):
+        return None
+    updated = progress.copy()
+    updated.total_calories_burned = total + calories
+    if day is not None and day not in days:
+        completed_days = list(days)
+        bisect.insort(completed_days, day)
+        updated.completed_days = tuple(completed_days)
+        updated.streak = trailing_streak(completed_days)
+    return updated
+
+
+def apply_day_completion(progress, day):
+    """Return a new progress record with program ``day`` completed.
+
+    Marks the day like a completion with no calories and moves
+    ``current_day`` past it, unless the user is already further along.
+    """
+    progress = apply_completion(progress, 0, day)
+    if progress['current_day'] > day:
+        return progress
+    if isinstance(progress, Record):
+        return progress.replace({'current_day': day + 1})
+    return dict(progress, current_day=day + 1)
+
+
+def apply_completions(progress, completions):
+    """``apply_completion`` for each ``(calories, day)`` pair, in order."""
+    for calories, day in completions:
+        progress = apply_completion(progress, calories, day)
+    return progress
+
+
+def trailing_streak(completed_days):
+    streak = 0
+    expected = None
+    for day in reversed(completed_days):
+        if expected is not None and day != expected:
+            break
+        streak += 1
+        expected = day - 1
+    return streak
+
+
+class ProgressTracker:
+    """Per-user progress records with striped-lock writes and lock-free reads.
+
+    Records handed out by ``get`` are shared snapshots and must be treated
+    as read-only.
+    """
+
+    def __init__(self, stripes=DEFAULT_STRIPES):
+        self._records = {}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def _lock_for(self, user_id):
+        return self._locks[hash(user_id) % len(self._locks)]
+
+    def __contains__(self, user_id):
+        return user_id in self._records
+
+    def __len__(self):
+        return len(self._records)
+
+    def get(self, user_id):
+        return self._records.get(user_id)
+
+    def put(self, user_id, progress):
+        with self._lock_for(user_id):
+            self._records[user_id] = progress
+
+    def pop(self, user_id):
+        with self._lock_for(user_id):
+            return self._records.pop(user_id, None)
+
+    def update(self, user_id, change):
+        """Replace the record with ``change(record)`` and return it (``None`` if unknown)."""
+        with self._lock_for(user_id):
+            progress = self._records.get(user_id)
+            if progress is None:
+                return None
+            progress = change(progress)
+            self._records[user_id] = progress
+            return progress
+
+    def record(self, user_id, calories, day=None):
+        """Apply one completion and return the new record (``None`` if unknown)."""
+        return self.update(user_id, lambda progress: apply_completion(progress, calories, day))
+
+    def record_many(self, user_id, completions):
+        """Apply ``(calories, day)`` completions as one update (``None`` if unknown)."""
+        return self.update(user_id, lambda progress: apply_completions(progress, completions))
+
+    def complete_day(self, user_id, day):
+        """Complete program ``day`` and return the new record (``None`` if unknown)."""
+        return self.update(user_id, lambda progress: apply_day_completion(progress, day))
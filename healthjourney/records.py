@@ -0,0 +1,265 @@
+"""Compact in-memory user and progress records.
+
+A profile kept as the request dict costs a hash table, plus a string
+for every enum-like value and ISO timestamp. ``UserRecord`` and
+``ProgressRecord`` use ``__slots__`` instead, with a slot for every
+field the profile form sends. Gender, fitness level, goal, economic
+tier, equipment and notifications are stored as small-int codes, the
+preferred time as minutes after midnight, and timestamps as integer
+microseconds since 1970-01-01. Small ints are shared objects, so a coded
+field costs only its slot.
+
+Records answer ``get`` and ``[]`` with the original JSON keys and
+values, so code that reads profiles never needs to know which form it
+has. ``to_dict`` rebuilds the JSON shape when a response is written; it
+is compiled for each record class, with every slot read and decoded
+inline, as ``schemas`` compiles its loaders.
+
+Anything that does not fit a slot exactly goes into a per-record
+``extra`` dict, and ``to_dict`` hands it back unchanged. That covers
+unknown keys, nulls, values outside an enum and timestamps that would
+not round-trip. Converting a dict to a record and back therefore loses
+nothing; only the key order becomes canonical.
+"""
+from datetime import datetime, timedelta
+
+GENDERS = ('male', 'female')
+LEVELS = ('beginner', 'intermediate', 'advanced')
+GOALS = ('weightLoss', 'muscleGain', 'endurance', 'toning', 'health')
+TIERS = ('basic', 'medium', 'premium')
+EQUIPMENT = ('none', 'basic', 'gym')
+NOTIFICATIONS = ('on', 'off')
+# Every HH:MM, so a time's code is its minutes after midnight
+CLOCK_TIMES = tuple(f'{hour:02d}:{minute:02d}' for hour in range(24) for minute in range(60))
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+
+class Enum:
+    """Codes for a fixed set of strings."""
+
+    def __init__(self, values):
+        self.values = values
+        self.codes = {value: code for code, value in enumerate(values)}
+
+    def encode(self, value):
+        return self.codes.get(value) if isinstance(value, str) else None
+
+    def decode(self, code):
+        return self.values[code]
+
+
+class Timestamp:
+    """Naive ISO datetimes as integer microseconds since 1970-01-01."""
+
+    @staticmethod
+    def encode(value):
+        if not isinstance(value, str):
+            return None
+        try:
+            moment = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+        # Only canonical naive timestamps, so decoding gives back the same text
+        if moment.tzinfo is not None or moment.isoformat() != value:
+            return None
+        return (moment - EPOCH) // MICROSECOND
+
+    @staticmethod
+    def decode(micros):
+        return (EPOCH + micros * MICROSECOND).isoformat()
+
+
+class Plain:
+    """Any value except None, stored as it is."""
+
+    @staticmethod
+    def encode(value):
+        return value
+
+    @staticmethod
+    def decode(value):
+        return value
+
+
+class Days:
+    """A list of ints as a tuple, which is smaller and safely shared."""
+
+    @staticmethod
+    def encode(value):
+        if not isinstance(value, list) or not all(type(day) is int for day in value):
+            return None
+        return tuple(value)
+
+    @staticmethod
+    def decode(value):
+        return list(value)
+
+
+class Record:
+    """Slots for known JSON fields plus an ``extra`` dict for the rest.
+
+    Subclasses list ``FIELDS`` as ``(json key, slot, codec)``. A slot
+    holding None means the field is absent or lives in ``extra``. Codecs
+    return None for values they cannot store exactly. Each subclass gets
+    a compiled ``to_dict``.
+    """
+
+    __slots__ = ('extra',)
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        # Plain fields skip the decode call on reads
+        cls._by_key = {key: (slot, codec, None if codec is Plain else codec.decode)
+                       for key, slot, codec in cls.FIELDS}
+        cls.to_dict = _compile_to_dict(cls)
+
+    @classmethod
+    def from_dict(cls, data):
+        record = cls.__new__(cls)
+        for slot in cls.__slots__:
+            setattr(record, slot, None)
+        extra = None
+        for key, value in data.items():
+            field = cls._by_key.get(key)
+            encoded = field[1].encode(value) if field is not None and value is not None else None
+            if encoded is None:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+            else:
+                setattr(record, field[0], encoded)
+        record.extra = extra
+        return record
+
+    def get(self, key, default=None):
+        field = self._by_key.get(key)
+        if field is not None:
+            value = getattr(self, field[0])
+            if value is not None:
+                return value if field[2] is None else field[2](value)
+        if self.extra is not None:
+            return self.extra.get(key, default)
+        return default
+
+    def __getitem__(self, key):
+        field = self._by_key.get(key)
+        if field is not None:
+            value = getattr(self, field[0])
+            if value is not None:
+                return value if field[2] is None else field[2](value)
+        if self.extra is not None and key in self.extra:
+            return self.extra[key]
+        raise KeyError(key)
+
+    def __contains__(self, key):
+        return self.get(key, _MISSING) is not _MISSING
+
+    def copy(self):
+        record = self.__class__.__new__(self.__class__)
+        for slot in self.__slots__:
+            setattr(record, slot, getattr(self, slot))
+        record.extra = self.extra
+        return record
+
+    def replace(self, changes):
+        """A copy with the JSON fields in ``changes`` set; records are never mutated."""
+        record = self.copy()
+        for key, value in changes.items():
+            field = self._by_key.get(key)
+            encoded = field[1].encode(value) if field is not None and value is not None else None
+            if encoded is None or (self.extra is not None and key in self.extra):
+                return self.from_dict(dict(self.to_dict(), **changes))
+            setattr(record, field[0], encoded)
+        return record
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.to_dict()!r})'
+
+
+def _compile_to_dict(cls):
+    """``Record.to_dict`` for ``cls``, written out slot by slot."""
+    namespace = {}
+    lines = ['def to_dict(self):', '    data = {}']
+    for n, (key, slot, codec) in enumerate(cls.FIELDS):
+        lines += [f'    value = self.{slot}', '    if value is not None:']
+        if codec is Plain:
+            lines.append(f'        data[{key!r}] = value')
+        elif isinstance(codec, Enum):
+            namespace[f'values_{n}'] = codec.values
+            lines.append(f'        data[{key!r}] = values_{n}[value]')
+        else:
+            namespace[f'decode_{n}'] = codec.decode
+            lines.append(f'        data[{key!r}] = decode_{n}(value)')
+    lines += ['    if self.extra:', '        data.update(self.extra)', '    return data']
+    exec(compile('\n'.join(lines) + '\n', f'<{cls.__name__}.to_dict>', 'exec'), namespace)
+    return namespace['to_dict']
+
+
+_MISSING = object()
+
+_GENDER = Enum(GENDERS)
+_LEVEL = Enum(LEVELS)
+_GOAL = Enum(GOALS)
+_TIER = Enum(TIERS)
+_EQUIPMENT = Enum(EQUIPMENT)
+_NOTIFICATIONS = Enum(NOTIFICATIONS)
+_CLOCK_TIME = Enum(CLOCK_TIMES)
+
+
+class UserRecord(Record):
+    """A stored profile; see the module docstring."""
+
+    __slots__ = ('user_id', 'first_name', 'last_name', 'age', 'height', 'weight', 'gender', 'level',
+                 'goal', 'tier', 'equipment', 'preferred_time', 'workout_days', 'notifications', 'bmi', 'bmr',
+                 'created_at')
+    FIELDS = (
+        ('firstName', 'first_name', Plain),
+        ('lastName', 'last_name', Plain),
+        ('age', 'age', Plain),
+        ('height', 'height', Plain),
+        ('weight', 'weight', Plain),
+        ('gender', 'gender', _GENDER),
+        ('fitnessLevel', 'level', _LEVEL),
+        ('goal', 'goal', _GOAL),
+        ('economicLevel', 'tier', _TIER),
+        ('equipment', 'equipment', _EQUIPMENT),
+        ('preferredTime', 'preferred_time', _CLOCK_TIME),
+        ('workoutDays', 'workout_days', Plain),
+        ('notifications', 'notifications', _NOTIFICATIONS),
+        ('user_id', 'user_id', Plain),
+        ('bmi', 'bmi', Plain),
+        ('bmr', 'bmr', Plain),
+        ('created_at', 'created_at', Timestamp),
+    )
+
+
+class ProgressRecord(Record):
+    """A user's workout progress; see the module docstring."""
+
+    __slots__ = ('current_day', 'completed_days', 'start_date', 'total_calories_burned', 'streak')
+    FIELDS = (
+        ('current_day', 'current_day', Plain),
+        ('completed_days', 'completed_days', Days),
+        ('start_date', 'start_date', Timestamp),
+        ('total_calories_burned', 'total_calories_burned', Plain),
+        ('streak', 'streak', Plain),
+    )
+
+    def copy(self):
+        # Spelled out: every completion copies the record
+        record = ProgressRecord.__new__(ProgressRecord)
+        record.current_day = self.current_day
+        record.completed_days = self.completed_days
+        record.start_date = self.start_date
+        record.total_calories_burned = self.total_calories_burned
+        record.streak = self.streak
+        record.extra = self.extra
+        return record
+
+
+def to_json(value):
+    """The JSON shape of a record, or ``value`` itself if it is not one."""
+    return value.to_dict() if isinstance(value, Record) else value
@@ -0,0 +1,165 @@
+"""Pre-serialized response bodies for the read-only catalog endpoints.
+
+Catalog payloads (the exercise list, nutrition tiers, workout slices) are
+serialized once and kept as bytes together with a strong ETag and
+compressed variants, until the catalog they were built from is replaced.
+"""
+import gzip
+import hashlib
+import json
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+from healthjourney.lru import LRUCache
+from healthjourney.throttle import SingleFlight
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+
+class Representation:
+    """One serialized JSON body with its ETag and encoded variants."""
+
+    __slots__ = ('value', 'text', 'body', 'etag', 'variants')
+
+    def __init__(self, value, text, etag, variants=None):
+        self.value = value
+        self.text = text
+        self.body = text.encode('utf-8')
+        self.etag = etag
+        self.variants = variants or {}
+
+    def matches(self, if_none_match):
+        """True if an ``If-None-Match`` header value names this body."""
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == '*':
+            return True
+        # If-None-Match uses weak comparison, so ignore any W/ prefix
+        tags = {tag.strip().removeprefix('W/') for tag in if_none_match.split(',')}
+        return any(etag in tags for etag in self.etags())
+
+    def nbytes(self):
+        """Approximate memory held by this body, for cache budgets."""
+        return len(self.text) + len(self.body) + sum(len(data) for data in self.variants.values())
+
+    def etags(self):
+        yield self.etag
+        for encoding in self.variants:
+            yield encoded_etag(self.etag, encoding)
+
+    def negotiate(self, accept_encoding):
+        """Return ``(encoding, body, etag)`` for an ``Accept-Encoding`` value.
+
+        ``encoding`` is ``None`` when the identity body is sent.
+        """
+        if self.variants and accept_encoding:
+            accepted = parse_accept_encoding(accept_encoding)
+            for encoding in ('br', 'gzip'):
+                if encoding in self.variants and encoding in accepted:
+                    return encoding, self.variants[encoding], encoded_etag(self.etag, encoding)
+        return None, self.body, self.etag
+
+
+def encoded_etag(etag, encoding):
+    # Strong ETags are per representation, so each encoding gets its own
+    return f'{etag[:-1]}-{encoding}"'
+
+
+def _quality(value):
+    try:
+        return float(value)
+    except ValueError:
+        return 0.0
+
+
+def parse_accept_encoding(header):
+    accepted = set()
+    for item in header.split(','):
+        coding, _, params = item.strip().partition(';')
+        params = params.replace(' ', '')
+        # q=0, and any q that is not a number from 0 to 1, mean "not acceptable"
+        if params.startswith('q=') and not 0 < _quality(params[2:]) <= 1:
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def make_etag(text):
+    return '"' + hashlib.sha256(text.encode('utf-8')).hexdigest()[:32] + '"'
+
+
+def compress(body):
+    variants = {}
+    if len(body) < MIN_COMPRESS_SIZE:
+        return variants
+    variants['gzip'] = gzip.compress(body, compresslevel=9, mtime=0)
+    if brotli is not None:
+        variants['br'] = brotli.compress(body)
+    return {encoding: data for encoding, data in variants.items() if len(data) < len(body)}
+
+
+class ResponseCache:
+    """Cache of serialized catalog payloads keyed by an arbitrary hashable key.
+
+    Keys should include the version of the catalog a payload was built
+    from, and the cache is cleared whenever a catalog is swapped (see
+    ``healthjourney.catalog_manager``). Entries live in an ``LRUCache``
+    bounded by ``max_entries``, ``max_bytes`` of serialized bodies and an
+    optional ``ttl``, because keys come partly from user data. Concurrent
+    misses for the same key build it once and share the result.
+    """
+
+    def __init__(self, dumps=json.dumps, max_entries=1024, max_bytes=None, ttl=None):
+        self._dumps = dumps
+        self._entries = LRUCache(max_entries, max_bytes, ttl, sizeof=Representation.nbytes)
+        self._flights = SingleFlight()
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self):
+        return self._entries.stats()
+
+    def _get(self, key, build, compressed):
+        entry = self._entries.get(key)
+        if entry is None:
+            entry = self._flights.do(key, lambda: self._build(key, build, compressed))
+        return entry
+
+    def _build(self, key, build, compressed):
+        value = build()
+        text = self._dumps(value)
+        variants = compress(text.encode('utf-8')) if compressed else None
+        return self._entries.put(key, Representation(value, text, make_etag(text), variants))
+
+    def response(self, key, build, compressed=True):
+        """Full response body for ``key``, with compressed variants unless ``compressed`` is false."""
+        return self._get(key, build, compressed)
+
+    def fragment(self, key, build):
+        """Serialized value for ``key`` to be spliced into a larger body."""
+        return self._get(key, build, compressed=False)
+
+    def compose(self, head, fragments, tail):
+        """Build ``{**head, **{key: fragment.value}, **tail}`` around cached fragments.
+
+        ``fragments`` maps keys to fragments, in output order. The output is
+        identical to serializing the whole dict, but only the small per-user
+        ``head`` and ``tail`` are serialized per request.
+        """
+        dumps = self._dumps
+        head_text = dumps(head)[1:-1] if head else ''
+        tail_text = dumps(tail)[1:-1] if tail else ''
+        spliced = [dumps(key) + ': ' + fragment.text for key, fragment in fragments.items()]
+        parts = [part for part in [head_text, *spliced, tail_text] if part]
+        text = '{' + ', '.join(parts) + '}'
+        # Each fragment's ETag already covers its bytes; only hash the rest
+        tags = [fragment.etag for fragment in fragments.values()]
+        salt = hashlib.blake2b(
+            '|'.join([head_text, *map(str, fragments), *tags[1:], tail_text]).encode('utf-8'), digest_size=8
+        ).hexdigest()
+        return Representation(None, text, f'{tags[0][:-1]}-{salt}"')
@@ -0,0 +1,210 @@
+"""Compiled route table for the Netlify function.
+
+Routes are compiled once, at import, into a trie of path segments, so a
+request is matched with one dict lookup per segment instead of a chain of
+string comparisons. Path parameters are typed: ``<name>`` matches any
+non-empty segment and ``<int:name>`` only digits, passed on as an int.
+Literal segments win over parameters, as in Flask. Routes without
+parameters, or with only a last one, are also kept in dicts so the
+common requests match in one or two lookups.
+"""
+import base64
+
+
+def _int(segment):
+    if segment.isascii() and segment.isdigit():
+        return int(segment)
+    raise ValueError(segment)
+
+
+# Converters raise ValueError for segments they do not match; ``None``
+# stands for the default, any non-empty segment, which is checked inline
+CONVERTERS = {'str': None, 'int': _int}
+
+
+class _Node:
+    __slots__ = ('children', 'params', 'endpoint')
+
+    def __init__(self):
+        self.children = {}
+        # (name, converter, node) for each parameter at this position
+        self.params = []
+        self.endpoint = None
+
+
+class Router:
+    """Maps a method and path to an endpoint and its typed path parameters.
+
+    Each method has its own trie, plus a plain dict of its routes without
+    parameters so those match in a single lookup, and one of its routes
+    whose only parameter is the last segment, keyed by the path before it.
+    """
+
+    def __init__(self):
+        # method -> (static routes, last-segment routes, trie root)
+        self._tables = {}
+
+    def add(self, method, pattern, endpoint):
+        """Register ``endpoint`` for ``method`` on ``pattern`` (e.g. ``'workout/<user_id>'``)."""
+        pattern = pattern.strip('/')
+        static, tails, node = self._tables.setdefault(method, ({}, {}, _Node()))
+        for segment in pattern.split('/'):
+            if segment.startswith('<') and segment.endswith('>'):
+                kind, _, name = segment[1:-1].rpartition(':')
+                converter = CONVERTERS[kind or 'str']
+                for param_name, param_converter, child in node.params:
+                    if param_name == name and param_converter is converter:
+                        node = child
+                        break
+                else:
+                    child = _Node()
+                    node.params.append((name, converter, child))
+                    node = child
+            else:
+                node = node.children.setdefault(segment, _Node())
+        if node.endpoint is not None:
+            raise ValueError(f'{method} {pattern} is already routed')
+        node.endpoint = endpoint
+        head, _, last = pattern.rpartition('/')
+        if '<' not in pattern:
+            static[pattern] = endpoint
+        elif '<' not in head:
+            # Every other route a path could match has a parameter where this
+            # one has a literal, so the trie would pick this one too. Only the
+            # first parameter at a position is kept; if it does not convert,
+            # the trie tries the rest
+            kind, _, name = last[1:-1].rpartition(':')
+            tails.setdefault(head, (name, CONVERTERS[kind or 'str'], endpoint))
+
+    def route(self, method, pattern):
+        """Decorator form of ``add``."""
+        def decorator(endpoint):
+            self.add(method, pattern, endpoint)
+            return endpoint
+        return decorator
+
+    def match(self, method, path):
+        """Return ``(endpoint, params)`` for a request, or ``None``."""
+        table = self._tables.get(method)
+        if table is None:
+            return None
+        static, tails, root = table
+        path = path.strip('/')
+        # A literal route always wins over parameters, so this is exact
+        endpoint = static.get(path)
+        if endpoint is not None:
+            return endpoint, {}
+        head, _, segment = path.rpartition('/')
+        tail = tails.get(head)
+        if tail is not None and segment:
+            name, converter, endpoint = tail
+            if converter is None:
+                return endpoint, {name: segment}
+            try:
+                return endpoint, {name: converter(segment)}
+            except ValueError:
+                pass
+        segments = path.split('/')
+
+        # Walk down preferring literals; this finds nearly every route
+        # without backtracking
+        node = root
+        params = {}
+        for segment in segments:
+            child = node.children.get(segment)
+            if child is None:
+                for name, converter, param_child in node.params:
+                    if converter is None:
+                        if not segment:
+                            continue
+                        params[name] = segment
+                    else:
+                        try:
+                            params[name] = converter(segment)
+                        except ValueError:
+                            continue
+                    child = param_child
+                    break
+                else:
+                    break
+            node = child
+        else:
+            if node.endpoint is not None:
+                return node.endpoint, params
+
+        # Otherwise search every branch, e.g. GET workout/complete is a user id
+        return _match(root, segments, 0, [])
+
+
+def _match(node, segments, position, params):
+    if position == len(segments):
+        return None if node.endpoint is None else (node.endpoint, dict(params))
+    segment = segments[position]
+    child = node.children.get(segment)
+    if child is not None:
+        found = _match(child, segments, position + 1, params)
+        if found is not None:
+            return found
+    for name, converter, child in node.params:
+        if converter is None:
+            if not segment:
+                continue
+            value = segment
+        else:
+            try:
+                value = converter(segment)
+            except ValueError:
+                continue
+        params.append((name, value))
+        found = _match(child, segments, position + 1, params)
+        if found is not None:
+            return found
+        params.pop()
+    return None
+
+
+class Request:
+    """One Netlify event, decoded only as far as the endpoint asks.
+
+    ``params`` holds the typed path parameters of the matched route.
+    """
+
+    __slots__ = ('_event', 'params', '_headers', '_body')
+
+    def __init__(self, event, params):
+        self._event = event
+        self.params = params
+        self._headers = self._body = None
+
+    @property
+    def method(self):
+        return self._event.get('httpMethod', 'GET')
+
+    @property
+    def query(self):
+        return self._event.get('queryStringParameters') or {}
+
+    @property
+    def headers(self):
+        """Request headers with lowercased names."""
+        if self._headers is None:
+            self._headers = {key.lower(): value for key, value in (self._event.get('headers') or {}).items()}
+        return self._headers
+
+    @property
+    def client(self):
+        """The caller's IP address, as given by the adapter or else by Netlify's edge."""
+        address = ((self._event.get('requestContext') or {}).get('identity') or {}).get('sourceIp')
+        if address is None:
+            address = self.headers.get('x-nf-client-connection-ip')
+        return address
+
+    @property
+    def body(self):
+        """The raw body; base64-encoded (binary) bodies are decoded to bytes."""
+        if self._body is None:
+            body = self._event.get('body') or ''
+            if self._event.get('isBase64Encoded') and body:
+                body = base64.b64decode(body)
+            self._body = body
+        return self._body
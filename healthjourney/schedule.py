@@ -0,0 +1,186 @@
+"""Multi-week training programs, worked out one day at a time.
+
+A program repeats a weekly pattern of training and rest days that
+depends on the fitness level. Training sessions rotate through the
+exercise categories the user can do. Each session leads with one
+category and avoids muscle groups the previous session's lead category
+worked. Loads grow week by week (progressive overload) up to fixed caps.
+
+Nothing is generated ahead of time. A day's plan follows from its
+number and the user's stored progress, so day 57 costs the same as
+day 1. Since loads stop growing at the caps, a (level, gender) pair
+has only a small, fixed number of distinct workouts, and
+``DayPlan.key`` names each one so callers can cache it.
+"""
+import threading
+
+# Program length shown to users; later days keep the final week's loads
+PROGRAM_WEEKS = 8
+
+# Weekly pattern per fitness level: T for training, . for rest
+WEEK_PATTERNS = {
+    'beginner': 'T.T.T..',
+    'intermediate': 'TT.TT..',
+    'advanced': 'TTT.TT.',
+}
+DEFAULT_LEVEL = 'beginner'
+
+# Progressive overload: reps (and timed durations) grow REPS_STEP per
+# week up to MAX_REPS_FACTOR; a set is added every WEEKS_PER_SET weeks,
+# at most MAX_EXTRA_SETS
+REPS_STEP = 0.05
+MAX_REPS_FACTOR = 1.5
+WEEKS_PER_SET = 3
+MAX_EXTRA_SETS = 2
+
+# Overload stage at which both caps are reached
+MAX_STAGE = max(round((MAX_REPS_FACTOR - 1) / REPS_STEP), WEEKS_PER_SET * MAX_EXTRA_SETS)
+
+# Share of a session's exercises taken from its lead category; the rest
+# come from the other categories so every session stays balanced
+LEAD_SHARE = 0.5
+
+# (level, gender) rotations kept per catalog; both come from profiles
+MAX_ROTATIONS = 256
+
+
+def _sessions_before(pattern):
+    # Training days earlier in the week, for each weekday
+    counts = []
+    seen = 0
+    for mark in pattern:
+        counts.append(seen)
+        seen += mark == 'T'
+    return tuple(counts), seen
+
+
+_PATTERNS = {level: (pattern,) + _sessions_before(pattern) for level, pattern in WEEK_PATTERNS.items()}
+
+
+class DayPlan:
+    """Where one program day falls: its week, whether it is a rest day and its session."""
+
+    __slots__ = ('day', 'week', 'rest_day', 'session', 'stage')
+
+    def __init__(self, day, week, rest_day, session, stage):
+        self.day = day
+        self.week = week
+        self.rest_day = rest_day
+        self.session = session
+        self.stage = stage
+
+
+def plan_day(day, level, completed_days=0):
+    """The ``DayPlan`` for program ``day`` (1-based) at ``level``.
+
+    ``session`` counts the training days before this one. The overload
+    ``stage`` is the week number, held back to the weeks' worth of days
+    actually completed, so a user who skips ahead does not skip the
+    build-up.
+    """
+    pattern, before, per_week = _PATTERNS.get(level) or _PATTERNS[DEFAULT_LEVEL]
+    week, weekday = divmod(day - 1, 7)
+    stage = min(week, completed_days // 7, MAX_STAGE)
+    return DayPlan(day, week + 1, pattern[weekday] != 'T', week * per_week + before[weekday], stage)
+
+
+def overload(exercise, stage):
+    """A copy of ``exercise`` with its sets, reps and duration raised for ``stage``."""
+    if stage <= 0:
+        return exercise
+    factor = min(MAX_REPS_FACTOR, 1 + REPS_STEP * stage)
+    loaded = dict(exercise)
+    for field in ('reps', 'duration'):
+        value = exercise.get(field)
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            loaded[field] = round(value * factor)
+    sets = exercise.get('sets')
+    if isinstance(sets, int) and not isinstance(sets, bool):
+        loaded['sets'] = sets + min(MAX_EXTRA_SETS, stage // WEEKS_PER_SET)
+    return loaded
+
+
+class _Rotation:
+    """A user's exercises grouped by category, in catalog order."""
+
+    __slots__ = ('categories', 'groups', 'muscles')
+
+    def __init__(self, exercises):
+        groups = {}
+        for exercise in exercises:
+            groups.setdefault(exercise.get('category'), []).append(exercise)
+        self.categories = list(groups)
+        self.groups = groups
+        self.muscles = {
+            category: {muscle for exercise in members for muscle in _muscles(exercise)}
+            for category, members in groups.items()
+        }
+
+
+def _muscles(exercise):
+    muscles = exercise.get('muscle_groups')
+    return muscles if isinstance(muscles, list) else ()
+
+
+class ProgramScheduler:
+    """Day-by-day workouts over one exercise catalog."""
+
+    def __init__(self, index):
+        self._index = index
+        self._rotations = {}
+        self._lock = threading.Lock()
+
+    def _rotation(self, level, gender):
+        key = (level, gender)
+        rotation = self._rotations.get(key)
+        if rotation is None:
+            rotation = _Rotation(self._index.first(None, level=level, gender=gender))
+            if len(self._rotations) < MAX_ROTATIONS:
+                with self._lock:
+                    rotation = self._rotations.setdefault(key, rotation)
+        return rotation
+
+    def key(self, plan, level, gender):
+        """What the workout for ``plan`` depends on, besides level and gender."""
+        if plan.rest_day:
+            return ('rest',)
+        count = len(self._rotation(level, gender).categories)
+        return (plan.session % count if count else 0, plan.stage)
+
+    def focus(self, plan, level, gender):
+        """The category a training day leads with, or None."""
+        categories = self._rotation(level, gender).categories
+        if plan.rest_day or not categories:
+            return None
+        return categories[plan.session % len(categories)]
+
+    def workout(self, plan, level, gender, limit):
+        """Up to ``limit`` exercises for ``plan``; empty on rest days."""
+        if plan.rest_day:
+            return []
+        rotation = self._rotation(level, gender)
+        categories = rotation.categories
+        if not categories:
+            return []
+        count = len(categories)
+        lead = plan.session % count
+        tired = rotation.muscles[categories[(lead - 1) % count]] - rotation.muscles[categories[lead]]
+
+        # Up to LEAD_SHARE of the session from the lead category, then the
+        # others in rotation order, one exercise from each in turn;
+        # exercises for muscles the previous session worked, and the rest
+        # of the lead category, only fill what is left
+        group = rotation.groups[categories[lead]]
+        share = max(1, int(limit * LEAD_SHARE)) if count > 1 else limit
+        others = [rotation.groups[categories[(lead + step) % count]] for step in range(1, count)]
+        interleaved = [exercise for row in _round_robin(others) for exercise in row]
+        fresh = [exercise for exercise in interleaved if not tired.intersection(_muscles(exercise))]
+        rested = [exercise for exercise in interleaved if tired.intersection(_muscles(exercise))]
+        chosen = (group[:share] + fresh + rested + group[share:])[:limit]
+        return [overload(exercise, plan.stage) for exercise in chosen]
+
+
+def _round_robin(groups):
+    longest = max((len(group) for group in groups), default=0)
+    for position in range(longest):
+        yield [group[position] for group in groups if position < len(group)]
@@ -0,0 +1,327 @@
+"""Request body schemas, compiled into one fast ``load`` function each.
+
+A ``Schema`` lists the fields an endpoint accepts and what each may
+hold. When it is built, it writes the Python source of a function that
+checks exactly those fields, in order, with every limit inlined as a
+constant, and compiles it once. Validating a request is then a single
+call with no loops over the field list and no per-field dispatch.
+
+``load`` returns a new dict holding only the declared fields, so
+unknown keys are never stored. Numbers and integers may also arrive as
+strings, as HTML forms send them, and are converted. Zero is a value
+like any other; only a missing or null field counts as missing. The
+first bad field raises ``ValueError`` with a message for the client.
+``parse`` also takes the raw body and refuses one over ``max_body``
+bytes, or ``OVERSIZED``, before parsing it.
+
+A schema built with ``fast_path`` first tries the body as a form sends
+it, with every field present: all fields are read at once and tested in
+one condition, and the body is copied instead of rebuilt.
+
+There is no compiled serializer. What ``load`` returns is what gets
+stored, and responses are written from the stored records, whose codecs
+in ``records`` already fix the JSON shape; a second per-schema
+serializer would only duplicate them.
+"""
+import re
+
+from healthjourney.calories import MAX_SESSION_SIZE
+from healthjourney.http import body_size, parse_json_body
+from healthjourney.records import CLOCK_TIMES, EQUIPMENT, GENDERS, GOALS, LEVELS, NOTIFICATIONS
+
+# Request bodies larger than these many bytes are refused unread
+MAX_PROFILE_BODY = 16 * 1024
+MAX_COMPLETION_BODY = 4 * 1024
+MAX_SESSION_BODY = 256 * 1024
+MAX_BATCH_BODY = 32 * 2**20
+
+MAX_ID_LENGTH = 128
+MAX_NAME_LENGTH = 100
+
+# A day of exercise, reps in one set, and program days
+MAX_DURATION = 24 * 3600
+MAX_REPS = 10_000
+MAX_DAY = 10_000
+
+
+# Error messages name the allowed values of shorter choices than this
+MAX_LISTED_CHOICES = 10
+# Integer fields with fewer values than this convert strings with a table
+MAX_DECIMAL_TABLE = 100
+
+
+class BodyTooLarge(ValueError):
+    """The request body is over the endpoint's limit."""
+
+
+class _Oversized:
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'OVERSIZED'
+
+
+# What a server passes as the body when the declared Content-Length is
+# already over the endpoint's limit, so it is refused unread
+OVERSIZED = _Oversized()
+
+
+class Field:
+    """What one JSON field may hold; see the factory functions below."""
+
+    __slots__ = ('kind', 'required', 'default', 'minimum', 'maximum', 'max_length', 'pattern', 'choices', 'items')
+
+    def __init__(self, kind, required=False, default=None, minimum=None, maximum=None, max_length=None,
+                 pattern=None, choices=None, items=None):
+        self.kind = kind
+        self.required = required
+        self.default = default
+        self.minimum = minimum
+        self.maximum = maximum
+        self.max_length = max_length
+        self.pattern = pattern
+        self.choices = choices
+        self.items = items
+
+
+def number(minimum, maximum, **options):
+    return Field('number', minimum=minimum, maximum=maximum, **options)
+
+
+def integer(minimum, maximum, **options):
+    return Field('integer', minimum=minimum, maximum=maximum, **options)
+
+
+def string(max_length, pattern=None, **options):
+    return Field('string', max_length=max_length, pattern=pattern, **options)
+
+
+def choice(values, **options):
+    return Field('choice', choices=values, **options)
+
+
+def identifier(max_length, **options):
+    """An integer or a short string, like a catalog ID."""
+    return Field('identifier', max_length=max_length, **options)
+
+
+def list_of(schema, max_items, **options):
+    """A non-empty list of objects that ``schema`` loads."""
+    return Field('list', items=schema, maximum=max_items, **options)
+
+
+def _number(value, message):
+    # Form fields arrive as strings
+    if value.__class__ is str:
+        for convert in (int, float):
+            try:
+                return convert(value)
+            except ValueError:
+                pass
+    raise ValueError(message)
+
+
+def check_body(body, max_body):
+    """Raise ``BodyTooLarge`` if the raw ``body`` is over ``max_body`` bytes."""
+    if body is OVERSIZED or body and body_size(body) > max_body:
+        raise BodyTooLarge('Request body too large')
+
+
+class Schema:
+    """The fields of one request body, compiled into ``load``."""
+
+    def __init__(self, title, fields, max_body=MAX_PROFILE_BODY, fast_path=False):
+        self.title = title
+        self.fields = fields
+        self.max_body = max_body
+        self.source, namespace = _compile(title, fields, fast_path)
+        exec(compile(self.source, f'<schema {title}>', 'exec'), namespace)
+        self.load = namespace['load']
+
+    def parse(self, body):
+        """``load`` of a request body, raw (``str`` or ``bytes``) or already parsed."""
+        if body is OVERSIZED or isinstance(body, (str, bytes)):
+            check_body(body, self.max_body)
+            body = parse_json_body(body)
+        return self.load(body)
+
+
+def _compile(title, fields, fast_path):
+    namespace = {'_number': _number}
+    lines = ['def load(data):'] + (_fast_path(fields, namespace) if fast_path else []) + [
+        '    if data.__class__ is not dict:',
+        f'        raise ValueError({title + " must be an object"!r})',
+        '    get = data.get',
+        '    out = {}',
+    ]
+    for n, (key, field) in enumerate(fields.items()):
+        lines.append(f'    value = get({key!r})')
+        if field.required:
+            lines += ['    if value is None:', f'        raise ValueError({"Missing " + key!r})']
+            indent = '    '
+        elif field.default is not None:
+            namespace[f'default_{n}'] = field.default
+            lines += ['    if value is None:', f'        out[{key!r}] = default_{n}', '    else:']
+            indent = '        '
+        else:
+            lines.append('    if value is not None:')
+            indent = '        '
+        lines += [indent + line for line in _checks(title, key, field, n, namespace)]
+        lines.append(f'{indent}out[{key!r}] = value')
+    lines.append('    return out')
+    return '\n'.join(lines) + '\n', namespace
+
+
+def _fast_path(fields, namespace):
+    """Lines accepting a body that sends every field, each valid as it is.
+
+    Every field is read and tested in one condition, and the body is
+    copied instead of rebuilt field by field. Anything else, including
+    every error, falls through to the checks that follow, so messages
+    and conversions come from one place. Only worth it for bodies that
+    usually send every field, like a form's.
+    """
+    tests = []
+    converted = []
+    for n, (key, field) in enumerate(fields.items()):
+        # Fields tested more than once are kept in a local at their first read
+        read = f'data[{key!r}]'
+        name = f'v{n}'
+        if field.kind == 'number':
+            # Strings, nulls and containers raise TypeError on comparison;
+            # booleans compare as 0 and 1, so only ranges holding those test for them.
+            # Float bounds let the usual float values compare without conversion.
+            minimum, maximum = float(field.minimum), float(field.maximum)
+            if minimum <= 1 and maximum >= 0:
+                tests.append(f'({name} := {read}).__class__ is not bool and {minimum!r} <= {name} <= {maximum!r}')
+            else:
+                tests.append(f'{minimum!r} <= {read} <= {maximum!r}')
+        elif field.kind == 'integer':
+            test = f'({name} := {read}).__class__ is int and {field.minimum!r} <= {name} <= {field.maximum!r}'
+            # Form fields arrive as strings; short ranges convert them by lookup
+            if field.maximum - field.minimum < MAX_DECIMAL_TABLE:
+                namespace[f'decimals_{n}'] = {str(i): i for i in range(field.minimum, field.maximum + 1)}
+                test += f' or ({name} := decimals_{n}[{name}]) is not None'
+            else:
+                test += (f' or {name}.__class__ is str and {name}.isdecimal() '
+                         f'and {field.minimum!r} <= ({name} := int({name})) <= {field.maximum!r}')
+            tests.append(f'({test})')
+            converted.append((key, name))
+        elif field.kind == 'string':
+            test = f'({name} := {read}).__class__ is str and {name + " and " if field.required else ""}len({name}) <= {field.max_length}'
+            if field.pattern is not None:
+                namespace[f'pattern_{n}'] = re.compile(field.pattern)
+                test += f' and pattern_{n}.fullmatch({name}) is not None'
+            tests.append(test)
+        elif field.kind == 'choice':
+            namespace[f'choices_{n}'] = frozenset(field.choices)
+            tests.append(f'{read} in choices_{n}')
+        elif field.kind == 'identifier':
+            tests.append(f'(({name} := {read}).__class__ is int or {name}.__class__ is str '
+                         f'and 0 < len({name}) <= {field.max_length})')
+        else:
+            raise ValueError(f'No fast path for {field.kind} fields')
+    # len() of a non-dict body either fails or leads to a failing lookup
+    lines = ['    try:',
+             f'        if len(data) == {len(fields)} and (',
+             '                ' + '\n                and '.join(tests) + '):',
+             '            out = data.copy()']
+    lines += [f'            out[{key!r}] = {name}' for key, name in converted]
+    lines += ['            return out',
+              '    except (KeyError, TypeError, ValueError):',
+              '        pass']
+    return lines
+
+
+def _checks(title, key, field, n, namespace):
+    invalid = f'raise ValueError({"Invalid " + key!r})'
+    if field.kind in ('number', 'integer'):
+        if field.kind == 'number':
+            lines = ['if value.__class__ is not int and value.__class__ is not float:',
+                     f'    value = _number(value, {"Invalid " + key!r})']
+        else:
+            lines = ['if value.__class__ is not int:',
+                     '    if value.__class__ is str and value.isdecimal():',
+                     '        value = int(value)',
+                     '    else:',
+                     '        ' + invalid]
+        # Chained comparisons are false for NaN, so it never passes
+        lines += [f'if not {field.minimum!r} <= value <= {field.maximum!r}:',
+                  f'    raise ValueError({f"{key} must be between {field.minimum} and {field.maximum}"!r})']
+        return lines
+    if field.kind == 'string':
+        lines = ['if value.__class__ is not str:', '    ' + invalid]
+        if field.required:
+            lines += ['if not value:', f'    raise ValueError({"Missing " + key!r})']
+        lines += [f'if len(value) > {field.max_length}:',
+                  f'    raise ValueError({f"{key} is longer than {field.max_length} characters"!r})']
+        if field.pattern is not None:
+            namespace[f'pattern_{n}'] = re.compile(field.pattern)
+            lines += [f'if pattern_{n}.fullmatch(value) is None:', '    ' + invalid]
+        return lines
+    if field.kind == 'choice':
+        namespace[f'choices_{n}'] = frozenset(field.choices)
+        if len(field.choices) > MAX_LISTED_CHOICES:
+            message = f'Invalid {key}'
+        else:
+            message = f'{key} must be one of ' + ', '.join(field.choices)
+        return [f'if value.__class__ is not str or value not in choices_{n}:',
+                f'    raise ValueError({message!r})']
+    if field.kind == 'identifier':
+        return ['if value.__class__ is str:',
+                f'    if not value or len(value) > {field.max_length}:',
+                '        ' + invalid,
+                'elif value.__class__ is not int:',
+                '    ' + invalid]
+    if field.kind == 'list':
+        namespace[f'load_{n}'] = field.items.load
+        return ['if value.__class__ is not list or not value:',
+                f'    raise ValueError({"Missing " + key!r})',
+                f'if len(value) > {field.maximum}:',
+                f'    raise ValueError({f"At most {field.maximum} {key} per {title.lower()}"!r})',
+                'items = []',
+                'for index, item in enumerate(value):',
+                '    try:',
+                f'        items.append(load_{n}(item))',
+                '    except ValueError as e:',
+                f'        raise ValueError(f{field.items.title + " {index}: {e}"!r}) from None',
+                'value = items']
+    raise ValueError(f'Unknown field kind: {field.kind}')
+
+
+# The profile form sends every field, so profiles take the fast path
+PROFILE_SCHEMA = Schema('Profile', {
+    'user_id': string(MAX_ID_LENGTH),
+    'firstName': string(MAX_NAME_LENGTH, required=True),
+    'lastName': string(MAX_NAME_LENGTH, required=True),
+    'age': number(0, 120, required=True),
+    'height': number(50, 300, required=True),
+    'weight': number(2, 500, required=True),
+    'gender': choice(GENDERS, required=True),
+    'fitnessLevel': choice(LEVELS),
+    'goal': choice(GOALS),
+    # A tier of the nutrition catalog, which names its own tiers
+    'economicLevel': string(MAX_NAME_LENGTH),
+    'equipment': choice(EQUIPMENT),
+    'preferredTime': choice(CLOCK_TIMES),
+    'workoutDays': integer(1, 7),
+    'notifications': choice(NOTIFICATIONS),
+}, fast_path=True)
+
+COMPLETION_SCHEMA = Schema('Completion', {
+    'user_id': string(MAX_ID_LENGTH),
+    'exercise_id': identifier(MAX_ID_LENGTH),
+    'duration': number(0, MAX_DURATION, default=0),
+    'reps_completed': number(0, MAX_REPS, default=0),
+    'day': integer(1, MAX_DAY),
+}, max_body=MAX_COMPLETION_BODY)
+
+SESSION_SCHEMA = Schema('Session', {
+    'user_id': string(MAX_ID_LENGTH),
+    'completions': list_of(COMPLETION_SCHEMA, MAX_SESSION_SIZE, required=True),
+}, max_body=MAX_SESSION_BODY)
+
+DAY_SCHEMA = Schema('Day completion', {
+    'user_id': string(MAX_ID_LENGTH),
+    'day': integer(1, MAX_DAY, required=True),
+}, max_body=MAX_COMPLETION_BODY)
@@ -0,0 +1,327 @@
+"""Full-text and faceted search over the exercise catalog.
+
+``SearchIndex`` is an inverted index over an exercise list. Text from
+the Arabic and English names, muscle groups, equipment, category and
+goals is normalized (see ``normalize``) and split into words. Every
+prefix of every word is a key, so a query word matches all the words it
+starts with in a single lookup.
+
+A key's postings are the catalog positions of the exercises holding it.
+Keys held by at least 1/DENSE_SHARE of the catalog are kept as an int
+bitset, which is then no bigger than the position array would be, and
+lets ``&`` and ``int.bit_count`` run intersections and facet counts in
+C. Rarer keys keep a sorted position array. Facet values are always
+bitsets.
+"""
+import bisect
+import re
+from array import array
+from collections import Counter
+
+from healthjourney.optional import numpy
+
+# Exercise fields whose text is searchable
+TEXT_FIELDS = ('name', 'english_name', 'muscle_groups', 'equipment', 'category', 'goal')
+
+# Facets as (query parameter, exercise field); each parameter also filters
+FACETS = (
+    ('category', 'category'),
+    ('level', 'level'),
+    ('equipment', 'equipment'),
+    ('goal', 'goal'),
+    ('muscle', 'muscle_groups'),
+)
+
+# Words are matched on at most this many leading characters
+MAX_PREFIX = 20
+
+# Keys in at least 1/DENSE_SHARE of the catalog are stored as bitsets
+DENSE_SHARE = 32
+
+# Catalogs at least this big count facets with numpy (2.0 or later), if
+# installed, in one pass over a matrix of every facet value's bitset
+NUMPY_FACETS_AT = 8192
+
+# Query limits
+MAX_QUERY_LENGTH = 200
+MAX_QUERY_WORDS = 8
+
+# Arabic text folding: diacritics and tatweel dropped, alef, ya, ta
+# marbuta and hamza carriers folded to their plain letters, Arabic-Indic
+# digits made ASCII
+_FOLD = str.maketrans({
+    **dict.fromkeys(map(chr, range(0x064B, 0x0660))),
+    'ٰ': None,
+    'ـ': None,
+    'أ': 'ا', 'إ': 'ا', 'آ': 'ا', 'ٱ': 'ا',
+    'ى': 'ي', 'ئ': 'ي',
+    'ؤ': 'و',
+    'ة': 'ه',
+    **{chr(0x0660 + digit): str(digit) for digit in range(10)},
+})
+_WORD = re.compile(r'\w+')
+# Words before folding; diacritics are not word characters and would
+# otherwise split a word in two
+_RAW_WORD = re.compile(r'[\w\u064b-\u065f\u0670]+')
+_ARTICLE = 'ال'
+
+
+def normalize(text):
+    """``text`` case-folded, with Arabic letter variants and diacritics folded."""
+    return text.translate(_FOLD).casefold()
+
+
+def words(text):
+    """The normalized words of ``text``, each cut to ``MAX_PREFIX`` characters."""
+    return [word[:MAX_PREFIX] for word in _WORD.findall(normalize(text))]
+
+
+def _text(exercise):
+    parts = []
+    for field in TEXT_FIELDS:
+        value = exercise.get(field)
+        if isinstance(value, str):
+            parts.append(value)
+        elif isinstance(value, list):
+            parts.extend(item for item in value if isinstance(item, str))
+    return ' '.join(parts)
+
+
+def _frozen(value):
+    return tuple(value) if isinstance(value, list) else value
+
+
+def _has_article(word):
+    return word.startswith(_ARTICLE) and len(word) > len(_ARTICLE) + 1
+
+
+class SearchResult:
+    """One page of matches: catalog positions, the total and facet counts."""
+
+    __slots__ = ('positions', 'total', 'facets', 'more')
+
+    def __init__(self, positions, total, facets, more):
+        self.positions = positions
+        self.total = total
+        self.facets = facets
+        self.more = more
+
+
+class SearchIndex:
+    """Inverted index over ``exercises``; see the module docstring."""
+
+    def __init__(self, exercises):
+        count = len(exercises)
+        self._size = count
+        self._bytes = (count + 7) // 8
+        self._all = (1 << count) - 1
+        self._dense_at = max(1, -(-count // DENSE_SHARE))
+
+        # Each exercise's text is split in one go, and each distinct raw
+        # word is normalized once; words written differently can
+        # normalize the same, so a position is only added once
+        by_word = {}
+        folded = {}
+        for position, exercise in enumerate(exercises):
+            for raw in _RAW_WORD.findall(_text(exercise)):
+                word = folded.get(raw)
+                if word is None:
+                    word = folded[raw] = normalize(raw)
+                postings = by_word.get(word)
+                if postings is None:
+                    by_word[word] = [position]
+                elif postings[-1] != position:
+                    postings.append(position)
+
+        # A prefix's postings are the union of its words' postings; a
+        # prefix with one word shares that word's list. Arabic words with
+        # the definite article are also keyed without it, so a search for
+        # "ضغط" finds "الضغط"
+        by_prefix = {}
+        for word in by_word:
+            stems = (word, word[len(_ARTICLE):]) if _has_article(word) else (word,)
+            for stem in stems:
+                for end in range(1, min(len(stem), MAX_PREFIX) + 1):
+                    by_prefix.setdefault(stem[:end], []).append(word)
+        self._keys = {}
+        for prefix, members in by_prefix.items():
+            if len(members) == 1:
+                positions = by_word[members[0]]
+            else:
+                positions = sorted(set().union(*[by_word[word] for word in members]))
+            self._keys[prefix] = self._postings(positions)
+
+        # Facet values repeat across the catalog, so each distinct value
+        # of a field (or list of values) gets a code and is normalized
+        # once; the facets of small result sets are counted by code
+        self._facets = {}
+        self._codes = {}
+        self._labels = {}
+        for param, field in FACETS:
+            codes = {}
+            code_of = array('i')
+            for exercise in exercises:
+                value = _frozen(exercise.get(field))
+                code = codes.get(value)
+                if code is None:
+                    code = codes[value] = len(codes)
+                code_of.append(code)
+
+            labels = {}
+            keys_of = []
+            for value in codes:
+                keys = {}
+                for item in value if isinstance(value, tuple) else (value,):
+                    if isinstance(item, str):
+                        key = normalize(item)
+                        labels.setdefault(key, item)
+                        keys[key] = None
+                keys_of.append(tuple(keys))
+
+            by_key = {}
+            for position, code in enumerate(code_of):
+                for key in keys_of[code]:
+                    positions = by_key.get(key)
+                    if positions is None:
+                        by_key[key] = [position]
+                    else:
+                        positions.append(position)
+            self._facets[param] = {key: self._bitset(positions) for key, positions in by_key.items()}
+            self._codes[param] = code_of
+            self._labels[param] = (labels, [tuple(labels[key] for key in keys) for keys in keys_of])
+
+        self._rows = [(param, key) for param, values in self._facets.items() for key in values]
+        self._matrix = None
+        np = numpy() if count >= NUMPY_FACETS_AT else None
+        if np is not None and hasattr(np, 'bitwise_count') and self._rows:
+            self._words = -(-count // 64)
+            data = b''.join(self._facets[param][key].to_bytes(self._words * 8, 'little') for param, key in self._rows)
+            self._matrix = np.frombuffer(data, dtype='<u8').reshape(len(self._rows), self._words)
+
+    def __len__(self):
+        return self._size
+
+    def _postings(self, positions):
+        if len(positions) >= self._dense_at:
+            return self._bitset(positions)
+        return array('i', positions)
+
+    def _bitset(self, positions):
+        np = numpy()
+        if np is not None and len(positions) > 64:
+            bits = np.zeros(self._bytes * 8, dtype=bool)
+            bits[positions] = True
+            return int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little')
+        data = bytearray(self._bytes)
+        for position in positions:
+            data[position >> 3] |= 1 << (position & 7)
+        return int.from_bytes(data, 'little')
+
+    def search(self, text='', filters=None, after=-1, limit=20):
+        """Exercises matching every word of ``text`` and every filter.
+
+        ``filters`` maps facet parameters to lists of values, any of which
+        may match. Returns a ``SearchResult`` with up to ``limit``
+        positions after position ``after``, in catalog order; facet counts
+        cover every match.
+        """
+        sets = []
+        for word in dict.fromkeys(words(text)):
+            postings = self._keys.get(word)
+            if postings is None:
+                return SearchResult([], 0, self._empty_facets(), False)
+            sets.append(postings)
+        for param, values in (filters or {}).items():
+            facet = self._facets[param]
+            mask = 0
+            for value in values:
+                mask |= facet.get(normalize(value), 0)
+            sets.append(mask)
+
+        matches = self._intersect(sets)
+        if isinstance(matches, int):
+            total = matches.bit_count()
+            facets = self._dense_facets(matches)
+            page = _set_bits(matches >> (after + 1) << (after + 1), self._bytes, limit + 1)
+        else:
+            total = len(matches)
+            facets = self._sparse_facets(matches)
+            start = bisect.bisect_right(matches, after)
+            page = matches[start:start + limit + 1]
+        return SearchResult(page[:limit], total, facets, len(page) > limit)
+
+    def _intersect(self, sets):
+        dense = self._all
+        sparse = []
+        for postings in sets:
+            if isinstance(postings, int):
+                dense &= postings
+            else:
+                sparse.append(postings)
+        if not sparse:
+            return dense
+        # Intersect the rare keys first, smallest first, then test what
+        # is left against the bitsets
+        sparse.sort(key=len)
+        positions = sparse[0]
+        for postings in sparse[1:]:
+            if not positions:
+                break
+            positions = sorted(set(positions).intersection(postings))
+        if dense == self._all:
+            return list(positions)
+        data = dense.to_bytes(self._bytes, 'little')
+        return [position for position in positions if data[position >> 3] >> (position & 7) & 1]
+
+    def _dense_facets(self, matches):
+        if self._matrix is not None:
+            np = numpy()
+            mask = np.frombuffer(matches.to_bytes(self._words * 8, 'little'), dtype='<u8')
+            counts = np.bitwise_count(self._matrix & mask).sum(axis=1).tolist()
+        else:
+            counts = [(matches & self._facets[param][key]).bit_count() for param, key in self._rows]
+        facets = {param: {} for param, _ in FACETS}
+        for (param, key), count in zip(self._rows, counts):
+            facets[param][self._labels[param][0][key]] = count
+        return {param: _sorted_counts(values) for param, values in facets.items()}
+
+    def _sparse_facets(self, positions):
+        facets = {}
+        for param, code_of in self._codes.items():
+            labels_of = self._labels[param][1]
+            counts = {}
+            for code, count in Counter(map(code_of.__getitem__, positions)).items():
+                for label in labels_of[code]:
+                    counts[label] = counts.get(label, 0) + count
+            facets[param] = _sorted_counts(counts)
+        return facets
+
+    def _empty_facets(self):
+        return {param: {} for param, _ in FACETS}
+
+
+def _sorted_counts(counts):
+    # Most common first; values with no matches are left out
+    return dict(sorted(((label, count) for label, count in counts.items() if count), key=lambda item: -item[1]))
+
+
+def _set_bits(mask, size, limit):
+    """Positions of the lowest ``limit`` set bits of ``mask``, ascending."""
+    positions = []
+    if not mask:
+        return positions
+    data = mask.to_bytes(size, 'little')
+    for match in _NONZERO.finditer(data):
+        offset = match.start() * 8
+        byte = data[match.start()]
+        while byte:
+            low = byte & -byte
+            positions.append(offset + low.bit_length() - 1)
+            if len(positions) == limit:
+                return positions
+            byte ^= low
+    return positions
+
+
+_NONZERO = re.compile(rb'[^\x00]')
+
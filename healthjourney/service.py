@@ -0,0 +1,607 @@
+"""Business logic behind every ``/api/*`` endpoint.
+
+``HealthService`` is shared by the Flask app and the Netlify function,
+which are thin adapters that only turn requests into method calls and
+``ApiResponse`` objects into their own response types.
+"""
+import functools
+import threading
+from datetime import datetime
+
+from healthjourney.activity import EMPTY_WINDOW, EXERCISE, SESSION, activity_stats, parse_range
+from healthjourney.calories import body_weight, calories, exercise_rates, summarize
+from healthjourney.catalog_manager import CatalogManager
+from healthjourney.data import DATA_DIR
+from healthjourney.http import (
+    NDJSON_HEADERS, PAYLOAD_TOO_LARGE, PROMETHEUS_HEADERS, USER_NOT_FOUND, ApiResponse, cached_response,
+    error_response, json_response, too_many_requests,
+)
+from healthjourney.instrumentation import Instrumentation, observed, render_prometheus
+from healthjourney.lru import LRUCache
+from healthjourney.nutrition import macro_targets
+from healthjourney.pagination import (
+    DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE, encode_cursor, page_payload, parse_page_query, project, stream_json,
+    stream_ndjson,
+)
+from healthjourney.profiles import compute_metrics, create_profiles, new_user_id, parse_batch
+from healthjourney.records import to_json
+from healthjourney.response_cache import ResponseCache
+from healthjourney.schedule import PROGRAM_WEEKS, plan_day
+from healthjourney.schemas import (
+    COMPLETION_SCHEMA, DAY_SCHEMA, MAX_BATCH_BODY, PROFILE_SCHEMA, SESSION_SCHEMA, BodyTooLarge, check_body,
+)
+from healthjourney.search import FACETS, MAX_QUERY_LENGTH, MAX_QUERY_WORDS, normalize, words
+from healthjourney.store import create_store, new_progress
+from healthjourney.throttle import RateLimiter, SingleFlight
+
+# Daily calories as a multiple of BMR, per goal
+GOAL_MULTIPLIERS = {
+    'weightLoss': 0.8,
+    'muscleGain': 1.3,
+    'endurance': 1.4,
+    'toning': 1.1,
+    'health': 1.2
+}
+DEFAULT_MULTIPLIER = 1.2
+
+# Exercises served per workout
+WORKOUT_SIZE = 14
+
+# Search results per page unless ?limit= asks for more
+SEARCH_PAGE_SIZE = 20
+
+# Workout plan cache bounds: entries, bytes of serialized plans, seconds
+PLAN_CACHE_ENTRIES = 256
+PLAN_CACHE_BYTES = 8 * 2**20
+PLAN_CACHE_TTL = 3600
+
+# Cached pages, search results and nutrition fragments, whose keys
+# clients choose, share this budget
+RESPONSE_CACHE_BYTES = 32 * 2**20
+
+# Demo users kept at once, and seconds each is kept after its creation
+DEMO_POOL_SIZE = 4096
+DEMO_TTL = 1800
+
+DEFAULT_PROGRESS = {'current_day': 1, 'completed_days': [], 'total_calories_burned': 0, 'streak': 0}
+
+
+def demo_user(user_id):
+    """Profile created on the fly when a workout is requested for an unknown user."""
+    return {
+        'user_id': user_id,
+        'firstName': 'مستخدم',
+        'lastName': 'تجريبي',
+        'age': 25,
+        'height': 170,
+        'weight': 70,
+        'gender': 'male',
+        'fitnessLevel': 'beginner',
+        'goal': 'health',
+        'bmi': 24.2,
+        'bmr': 1700
+    }
+
+
+def demo_nutrition_user(user_id):
+    """Profile created on the fly when nutrition is requested for an unknown user."""
+    return {
+        'user_id': user_id,
+        'economicLevel': 'medium',
+        'goal': 'health',
+        'bmr': 1700
+    }
+
+
+def _parse(schema, body):
+    """``(data, None)`` for a body ``schema`` accepts, else ``(None, error response)``."""
+    try:
+        return schema.parse(body), None
+    except BodyTooLarge:
+        return None, PAYLOAD_TOO_LARGE
+    except ValueError as e:
+        return None, error_response(str(e), 400)
+
+
+def handles_errors(method):
+    """Turn any unexpected exception into the usual 500 error envelope."""
+    @functools.wraps(method)
+    def wrapper(*args, **kwargs):
+        try:
+            return method(*args, **kwargs)
+        except Exception as e:
+            return error_response(str(e), 500)
+    return wrapper
+
+
+class HealthService:
+    """All API endpoints, independent of the web framework serving them.
+
+    Each catalog is loaded on first use rather than at construction, so a
+    request that never touches a catalog never pays for loading it. With
+    ``watch_interval`` > 0 the data files are polled and changed catalogs
+    are swapped in without a restart. Endpoints are timed and counted in
+    ``instrumentation``, configured from the environment by default; set
+    the attribute to None to turn it off.
+
+    ``client`` arguments name the caller (its IP address) for rate limits.
+    """
+
+    def __init__(self, data_dir=DATA_DIR, store=None, now=datetime.now, watch_interval=0,
+                 plan_cache_entries=PLAN_CACHE_ENTRIES, plan_cache_bytes=PLAN_CACHE_BYTES,
+                 plan_cache_ttl=PLAN_CACHE_TTL, instrumentation=None, demo_pool_size=DEMO_POOL_SIZE,
+                 demo_ttl=DEMO_TTL, demo_limiter=None, response_cache_bytes=RESPONSE_CACHE_BYTES):
+        self.data_dir = data_dir
+        self.store = store if store is not None else create_store()
+        self.now = now
+        self.catalogs = CatalogManager(data_dir, poll_interval=watch_interval)
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation.from_environment()
+        self.response_cache = ResponseCache(max_bytes=response_cache_bytes)
+        # The whole exercise catalog, which can be larger than that budget;
+        # only the current version is kept
+        self.catalog_cache = ResponseCache(max_entries=1)
+        # Serialized workout plans, keyed by the profile fields that select them
+        self.plan_cache = ResponseCache(
+            max_entries=plan_cache_entries, max_bytes=plan_cache_bytes, ttl=plan_cache_ttl
+        )
+        # Unknown users who ask for a plan get a demo profile from this
+        # bounded pool rather than the store, created at a limited rate
+        # per client; their first completion moves them into the store
+        self.demo_users = LRUCache(demo_pool_size, ttl=demo_ttl)
+        self.demo_limiter = demo_limiter if demo_limiter is not None else RateLimiter.from_environment()
+        self._demo_lock = threading.Lock()
+        # Concurrent requests for the same user's workout build it once
+        self._workouts = SingleFlight()
+        # Cached bodies are keyed by catalog version, so old ones can never
+        # be served; clearing just frees their memory
+        self.catalogs.subscribe(lambda name, catalogs: self.clear_caches())
+
+    def _demo(self, user_id, client, make):
+        """``(user, progress)`` for a user not in the store, or a 429 response.
+
+        A demo profile is made by ``make(user_id)`` if the pool has none,
+        as long as ``client`` has not created too many lately.
+        """
+        demo = self.demo_users.get(user_id)
+        if demo is not None:
+            return demo
+        wait = self.demo_limiter.acquire(client)
+        if wait:
+            return too_many_requests(wait)
+        progress = new_progress(self.now()) if make is demo_user else None
+        return self.demo_users.put(user_id, (make(user_id), progress))
+
+    def _find_user(self, user_id):
+        """The profile of a stored or demo user, or None."""
+        user = self.store.get_user(user_id)
+        if user is None:
+            demo = self.demo_users.get(user_id)
+            if demo is not None:
+                return demo[0]
+        return user
+
+    def _stored_user(self, user_id):
+        """The stored profile for ``user_id``, moving a demo user into the store first."""
+        user = self.store.get_user(user_id)
+        if user is not None or user_id is None:
+            return user
+        with self._demo_lock:
+            user = self.store.get_user(user_id)
+            if user is None:
+                demo = self.demo_users.pop(user_id)
+                if demo is not None:
+                    user, progress = demo
+                    self.store.save_user(user_id, user)
+                    if progress is not None:
+                        self.store.save_progress(user_id, progress)
+                    user = self.store.get_user(user_id)
+        return user
+
+    def clear_caches(self):
+        self.response_cache.clear()
+        self.catalog_cache.clear()
+        self.plan_cache.clear()
+
+    def warm(self):
+        """Build the catalogs, their indexes and the whole-catalog response now.
+
+        For servers that answer on an event loop, which should not be the
+        one to pay for a cold build.
+        """
+        catalogs = self.catalogs.current
+        catalogs.nutrition
+        catalogs.exercises.search.get()
+        catalogs.exercises.index.field_names
+        self._catalog_response(catalogs)
+
+    def _catalog_response(self, catalogs):
+        return self.catalog_cache.response(('exercises', catalogs.versions['exercises']), lambda: {
+            'success': True,
+            'exercises': catalogs.exercises.data.get('exercises', [])
+        })
+
+    @handles_errors
+    @observed('create_profile', request_body=True)
+    def create_profile(self, body):
+        # The request body, raw or parsed; only the schema's fields are kept
+        data, error = _parse(PROFILE_SCHEMA, body)
+        if error is not None:
+            return error
+
+        now = self.now()
+        user_id = data.get('user_id') or new_user_id(now)
+
+        # Calculate BMI and BMR
+        bmi, bmr = compute_metrics(data['height'], data['weight'], data['age'], data['gender'])
+
+        # Store user data
+        data['user_id'] = user_id
+        data['bmi'] = bmi
+        data['bmr'] = bmr
+        data['created_at'] = now.isoformat()
+
+        self.store.save_user(user_id, data)
+
+        # Initialize workout progress
+        self.store.save_progress(user_id, new_progress(now))
+
+        return json_response({
+            'success': True,
+            'user_id': user_id,
+            'bmi': bmi,
+            'bmr': bmr
+        })
+
+    @handles_errors
+    @observed('create_profiles_batch', request_body=True)
+    def create_profiles_batch(self, body, content_type=''):
+        # A JSON array, or NDJSON with one profile per line
+        try:
+            check_body(body, MAX_BATCH_BODY)
+        except BodyTooLarge:
+            return PAYLOAD_TOO_LARGE
+        try:
+            records = parse_batch(body or '', content_type or '')
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        results = create_profiles(records, self.store, self.now())
+        created = sum(1 for result in results if result['success'])
+
+        return json_response({
+            'success': True,
+            'created': created,
+            'failed': len(results) - created,
+            'results': results
+        })
+
+    @handles_errors
+    @observed('get_profile')
+    def get_profile(self, user_id):
+        user = self._find_user(user_id)
+        if user is None:
+            return USER_NOT_FOUND
+        return json_response({'success': True, 'data': to_json(user)})
+
+    @handles_errors
+    @observed('get_workout')
+    def get_workout(self, user_id, request_headers, client=None):
+        user = self.store.get_user(user_id)
+        progress = None
+        if user is None:
+            demo = self._demo(user_id, client, demo_user)
+            if demo.__class__ is ApiResponse:
+                return demo
+            user, progress = demo
+        workout = self._workouts.do(user_id, lambda: self._workout(user_id, user, progress))
+        return cached_response(workout, request_headers)
+
+    def _workout(self, user_id, user, progress):
+        progress = progress or self.store.get_progress(user_id) or DEFAULT_PROGRESS
+
+        # The current program day's workout follows from the day number,
+        # level and gender alone, and the scheduler's key names it, so
+        # users on the same kind of day share one pre-serialized plan
+        level = user.get('fitnessLevel', 'beginner')
+        gender = user.get('gender', 'male')
+        plan = plan_day(progress['current_day'], level, len(progress['completed_days']))
+        catalogs = self.catalogs.current
+        scheduler = catalogs.exercises.scheduler
+        cache = self.plan_cache
+        workout = cache.fragment(
+            (catalogs.versions['exercises'], level, gender, WORKOUT_SIZE) + scheduler.key(plan, level, gender),
+            lambda: scheduler.workout(plan, level, gender, WORKOUT_SIZE)
+        )
+
+        return cache.compose({'success': True}, {'exercises': workout}, {
+            'current_day': progress['current_day'],
+            'total_exercises': len(workout.value),
+            'progress': to_json(progress),
+            'week': plan.week,
+            'program_weeks': PROGRAM_WEEKS,
+            'rest_day': plan.rest_day,
+            'focus': scheduler.focus(plan, level, gender)
+        })
+
+    @handles_errors
+    @observed('get_nutrition')
+    def get_nutrition(self, user_id, request_headers, client=None):
+        user = self.store.get_user(user_id)
+        if user is None:
+            demo = self._demo(user_id, client, demo_nutrition_user)
+            if demo.__class__ is ApiResponse:
+                return demo
+            user = demo[0]
+
+        economic_level = user.get('economicLevel', 'medium')
+        goal = user.get('goal', 'health')
+        bmr = user.get('bmr', 2000)
+
+        # Calculate daily calories
+        daily_calories = int(bmr * GOAL_MULTIPLIERS.get(goal, DEFAULT_MULTIPLIER))
+
+        # Get nutrition plan; meal plans are precomputed per calorie band,
+        # so only the user's exact macro targets are worked out here
+        catalogs = self.catalogs.current
+        nutrition = catalogs.nutrition
+        planner = nutrition.planner
+        cache = self.response_cache
+        nutrition_plan = cache.fragment(
+            ('nutrition', catalogs.versions['nutrition'], economic_level),
+            lambda: nutrition.data.get('tiers', {}).get(economic_level, {})
+        )
+        guide = planner.guide_for(goal)
+
+        return cached_response(cache.compose({'success': True}, {
+            'plan': nutrition_plan,
+            'meal_plan': planner.fragment(economic_level, goal, daily_calories)
+        }, {
+            'daily_calories': daily_calories,
+            'economic_level': economic_level,
+            'guide': guide,
+            'macros': macro_targets(daily_calories, planner.ratios[guide])
+        }), request_headers)
+
+    @handles_errors
+    @observed('complete_exercise', request_body=True)
+    def complete_exercise(self, body):
+        data, error = _parse(COMPLETION_SCHEMA, body)
+        if error is not None:
+            return error
+        user_id = data.get('user_id')
+        user = self._stored_user(user_id)
+        if user is None:
+            return USER_NOT_FOUND
+        exercise_id, seconds, reps, day = (data.get('exercise_id'), data['duration'], data['reps_completed'],
+                                           data.get('day'))
+
+        # MET-based estimate from the exercise and the user's weight
+        exercise = self.catalogs.current.exercises.index.get(exercise_id)
+        calories_burned = calories(*exercise_rates(exercise), body_weight(user), seconds, reps)
+
+        # Update progress
+        progress = self.store.record_completion(user_id, calories_burned, day)
+        self.store.log_activity(user_id, self.now(), [(EXERCISE, calories_burned, day)])
+
+        return json_response({
+            'success': True,
+            'calories_burned': calories_burned,
+            'total_calories': progress['total_calories_burned'] if progress is not None else 0
+        })
+
+    @handles_errors
+    @observed('complete_session', request_body=True)
+    def complete_session(self, body):
+        """Record every exercise of a workout session in one request.
+
+        Takes ``{"user_id": ..., "completions": [...]}`` where each
+        completion has the fields ``complete_exercise`` accepts. The
+        session is added to the user's progress as a single update.
+        """
+        data, error = _parse(SESSION_SCHEMA, body)
+        if error is not None:
+            return error
+        user_id = data.get('user_id')
+        user = self._stored_user(user_id)
+        if user is None:
+            return USER_NOT_FOUND
+
+        completions = [(user_id, entry.get('exercise_id'), entry['duration'], entry['reps_completed'], entry.get('day'))
+                       for entry in data['completions']]
+
+        index = self.catalogs.current.exercises.index
+        burned, totals = summarize(completions, {user_id: body_weight(user)}, index.get)
+        progress = self.store.record_completions(
+            user_id, [(kcal, completion[4]) for kcal, completion in zip(burned, completions)]
+        )
+        self.store.log_activity(
+            user_id, self.now(), [(EXERCISE, kcal, completion[4]) for kcal, completion in zip(burned, completions)]
+        )
+
+        return json_response({
+            'success': True,
+            'calories_burned': burned,
+            'session_calories': round(sum(totals[user_id].values()), 1),
+            'total_calories': progress['total_calories_burned'] if progress is not None else 0
+        })
+
+    @handles_errors
+    @observed('complete_day', request_body=True)
+    def complete_day(self, body):
+        """Finish the current program day and move on to the next.
+
+        Takes ``{"user_id": ..., "day": n}``. Rest days are completed the
+        same way. Days past ``current_day`` are locked.
+        """
+        data, error = _parse(DAY_SCHEMA, body)
+        if error is not None:
+            return error
+        user_id = data.get('user_id')
+        user = self._stored_user(user_id)
+        if user is None:
+            return USER_NOT_FOUND
+        day = data['day']
+
+        progress = self.store.get_progress(user_id)
+        if progress is None:
+            self.store.save_progress(user_id, new_progress(self.now()))
+            progress = self.store.get_progress(user_id)
+        if day > progress['current_day']:
+            return error_response(f"Day {day} is locked until day {progress['current_day']} is complete", 400)
+        progress = self.store.complete_day(user_id, day)
+        self.store.log_activity(user_id, self.now(), [(SESSION, 0, day)])
+
+        plan = plan_day(progress['current_day'], user.get('fitnessLevel', 'beginner'),
+                        len(progress['completed_days']))
+        return json_response({
+            'success': True,
+            'completed_day': day,
+            'current_day': progress['current_day'],
+            'completed_days': progress['completed_days'],
+            'streak': progress['streak'],
+            'week': plan.week,
+            'rest_day': plan.rest_day
+        })
+
+    @handles_errors
+    @observed('get_stats')
+    def get_stats(self, user_id, query=None):
+        """Calories, completions and streaks over the last ``range`` days.
+
+        ``range`` is a number of days like ``90d``. The totals come from
+        the day, week and month rollups kept up to date by every
+        completion, so raw events are never read.
+        """
+        if not self.store.has_user(user_id) and self.demo_users.get(user_id) is None:
+            return USER_NOT_FOUND
+        try:
+            days = parse_range((query or {}).get('range'))
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        last_day = self.now().toordinal()
+        first_day = last_day - days + 1
+        window = self.store.get_activity(user_id, first_day, last_day) or EMPTY_WINDOW
+        return json_response(dict({'success': True, 'user_id': user_id}, **activity_stats(window, first_day, last_day)))
+
+    @handles_errors
+    @observed('get_exercises')
+    def get_exercises(self, request_headers, query=None):
+        """The exercise catalog: whole, one page at a time, or streamed.
+
+        Without query parameters the whole catalog is returned as before.
+        ``limit`` and ``cursor`` page through it, ``fields`` keeps only the
+        named fields, and ``format=ndjson`` (one exercise per line) or
+        ``stream=1`` (the paged JSON document) write the response
+        incrementally instead of building it in memory.
+        """
+        query = query or {}
+        catalogs = self.catalogs.current
+        version = catalogs.versions['exercises']
+        ndjson = query.get('format') == 'ndjson'
+        stream = ndjson or query.get('stream') in ('1', 'true')
+
+        if not stream and not any(name in query for name in ('limit', 'cursor', 'fields')):
+            return cached_response(self._catalog_response(catalogs), request_headers)
+
+        index = catalogs.exercises.index
+        try:
+            # Streams are not held in memory, so they need no page size cap
+            page = parse_page_query(query, default_limit=None if stream else DEFAULT_PAGE_SIZE,
+                                    max_limit=None if stream else MAX_PAGE_SIZE, field_names=index.field_names)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        exercises = index.exercises
+        start = 0
+        if page.cursor is not None:
+            start = index.position_after(*page.cursor)
+            if start is None:
+                return error_response('Invalid cursor', 400)
+
+        if stream:
+            stop = len(exercises) if page.limit is None else min(start + page.limit, len(exercises))
+            if ndjson:
+                return ApiResponse(200, stream_ndjson(exercises, start, stop, page.fields), NDJSON_HEADERS)
+            return ApiResponse(200, stream_json(exercises, start, stop, page.fields, 'exercises'))
+
+        key = ('exercises', version, start, page.limit, page.fields)
+        return cached_response(self.response_cache.response(
+            key, lambda: page_payload(exercises, start, page.limit, page.fields, 'exercises')
+        ), request_headers)
+
+    @handles_errors
+    @observed('search_exercises')
+    def search_exercises(self, request_headers, query=None):
+        """Exercises matching the words in ``q`` and any facet filters.
+
+        Every word of ``q`` must start a word of the exercise's Arabic or
+        English name, muscle groups, equipment, category or goals, after
+        Arabic letter variants and diacritics are folded. ``category``,
+        ``level``, ``equipment``, ``goal`` and ``muscle`` filter on
+        comma-separated values. Results keep catalog order and page like
+        ``/api/exercises``; ``facets`` counts every match per facet value.
+        """
+        query = query or {}
+        text = query.get('q') or ''
+        if len(text) > MAX_QUERY_LENGTH:
+            return error_response(f'q must be at most {MAX_QUERY_LENGTH} characters', 400)
+        terms = tuple(dict.fromkeys(words(text)))
+        if len(terms) > MAX_QUERY_WORDS:
+            return error_response(f'q must have at most {MAX_QUERY_WORDS} words', 400)
+        filters = {}
+        for param, _ in FACETS:
+            values = [value.strip() for value in (query.get(param) or '').split(',') if value.strip()]
+            if values:
+                filters[param] = tuple(sorted(set(map(normalize, values))))
+        catalogs = self.catalogs.current
+        index = catalogs.exercises.index
+        try:
+            page = parse_page_query(query, default_limit=SEARCH_PAGE_SIZE, field_names=index.field_names)
+        except ValueError as e:
+            return error_response(str(e), 400)
+
+        start = 0
+        if page.cursor is not None:
+            start = index.position_after(*page.cursor)
+            if start is None:
+                return error_response('Invalid cursor', 400)
+
+        def build():
+            result = catalogs.exercises.search.get().search(' '.join(terms), filters, start - 1, page.limit)
+            exercises = index.exercises
+            next_cursor = None
+            if result.more:
+                last = result.positions[-1]
+                next_cursor = encode_cursor(last, exercises[last].get('id'))
+            return {
+                'success': True,
+                'total': result.total,
+                'exercises': [project(exercises[position], page.fields) for position in result.positions],
+                'facets': result.facets,
+                'next_cursor': next_cursor
+            }
+
+        # Keyed by the normalized query, so spellings that fold the same
+        # share an entry. Pages are small and most queries are not
+        # repeated, so compressing each one would cost more than the search
+        key = ('search', catalogs.versions['exercises'], terms, tuple(filters.items()), start, page.limit,
+               page.fields)
+        return cached_response(self.response_cache.response(key, build, compressed=False), request_headers)
+
+    @handles_errors
+    def get_metrics(self, query=None):
+        """Prometheus text by default, or JSON with ``?format=json``."""
+        caches = {'plans': self.plan_cache.stats(), 'responses': self.response_cache.stats(),
+                  'catalog': self.catalog_cache.stats(), 'demo_users': self.demo_users.stats()}
+        if (query or {}).get('format') != 'json':
+            return ApiResponse(200, render_prometheus(
+                self.instrumentation, caches, self.catalogs.metrics()
+            ), PROMETHEUS_HEADERS)
+        return json_response({
+            'success': True,
+            'catalogs': self.catalogs.metrics(),
+            'caches': caches,
+            'demo_limiter': self.demo_limiter.stats(),
+            'requests': self.instrumentation.snapshot() if self.instrumentation is not None else None
+        })
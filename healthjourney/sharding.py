@@ -0,0 +1,510 @@
+"""Users partitioned across storage nodes by consistent hashing.
+
+Each worker process used to keep its own users, so a user created by
+one worker was unknown to the next. Here the state lives in shard nodes
+instead: small servers (``serve``) that each hold a ``Store`` for their
+share of the users. Every worker reaches them through ``ShardedStore``,
+which hashes a user ID onto a ``HashRing`` of node addresses, so all
+workers agree on where a user lives without asking anyone. Use it with::
+
+    HEALTHJOURNEY_STORE=shards://10.0.0.1:7400,10.0.0.2:7400
+    HEALTHJOURNEY_SHARD_KEY=<shared secret>
+
+and start each node with ``python -m healthjourney.sharding serve``.
+``LocalCluster`` runs nodes as child processes for tests and benchmarks.
+
+``RemoteStore`` is the client for one node: it keeps a pool of at most
+``pool_size`` open connections and sends each call over one of them.
+Calls are pickled, so nodes accept only clients that know the shared
+key (``multiprocessing.connection`` authentication).
+
+Nodes know the ring too and refuse users they do not own with ``Moved``,
+naming the current ring; the client adopts it and retries. That is how
+workers learn about a node added by ``ShardedStore.add_node``. The new
+node takes over its users lazily: the first call for one of them pulls
+it from its old node, which hands it over and refuses it from then on.
+A sweep then pulls the rest. A user is always served by exactly one
+node, so none disappears or loses an update while the ring changes, and
+only about 1/N of them move.
+"""
+import bisect
+import hashlib
+import os
+import sys
+import threading
+from collections import deque
+from multiprocessing import AuthenticationError, get_context
+from multiprocessing.connection import Client, Listener
+
+from healthjourney.store import Store, create_store
+
+# Points per node on the ring; more spread users more evenly
+RING_REPLICAS = 128
+
+# Open connections each client keeps to each node
+POOL_SIZE = 8
+
+# Store calls a node answers, besides its own administration
+STORE_METHODS = frozenset({
+    'get_user', 'has_user', 'save_user', 'get_progress', 'save_progress', 'record_completion',
+    'record_completions', 'complete_day', 'log_activity', 'get_activity', 'export_user', 'delete_user',
+})
+
+# Times a call follows Moved before giving up
+MAX_REDIRECTS = 4
+
+_STRIPES = 64
+
+
+def _point(key):
+    return int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+class HashRing:
+    """Consistent hashing of keys onto ``nodes``, ``replicas`` points each.
+
+    Adding a node moves only the keys that land on its points, about
+    1/N of them, and none between the other nodes.
+    """
+
+    __slots__ = ('nodes', 'replicas', '_points', '_owners')
+
+    def __init__(self, nodes, replicas=RING_REPLICAS):
+        self.nodes = tuple(nodes)
+        self.replicas = replicas
+        points = sorted((_point(f'{node}#{i}'), node) for node in self.nodes for i in range(replicas))
+        self._points = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key):
+        index = bisect.bisect(self._points, _point(str(key)))
+        return self._owners[index % len(self._owners)]
+
+
+class Moved(Exception):
+    """The node does not own the user; ``nodes`` is the ring it knows."""
+
+    def __init__(self, nodes):
+        super().__init__(nodes)
+        self.nodes = tuple(nodes)
+
+
+def parse_address(address):
+    host, _, port = address.rpartition(':')
+    return host, int(port)
+
+
+def shard_key():
+    """The shared secret from ``HEALTHJOURNEY_SHARD_KEY``."""
+    key = os.environ.get('HEALTHJOURNEY_SHARD_KEY')
+    if not key:
+        raise ValueError('HEALTHJOURNEY_SHARD_KEY must be set to use shard nodes')
+    return key.encode('utf-8')
+
+
+class ConnectionPool:
+    """Up to ``size`` connections to one node, each used by one call at a time."""
+
+    def __init__(self, address, authkey, size=POOL_SIZE):
+        self.address = parse_address(address)
+        self.authkey = authkey
+        self.size = size
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = deque()
+        self.opened = 0
+
+    def call(self, method, args):
+        with self._slots:
+            try:
+                conn = self._idle.pop()
+            except IndexError:
+                conn = Client(self.address, authkey=self.authkey)
+                self.opened += 1
+            try:
+                conn.send((method, args))
+                ok, value = conn.recv()
+            except BaseException:
+                # The reply may still be on its way; the connection cannot be reused
+                conn.close()
+                raise
+            self._idle.append(conn)
+        if not ok:
+            raise value
+        return value
+
+    def close(self):
+        while self._idle:
+            self._idle.pop().close()
+
+
+class RemoteStore:
+    """Client for one shard node: ``call(method, *args)`` runs a method of its store."""
+
+    blocking = True
+
+    def __init__(self, address, authkey, pool_size=POOL_SIZE):
+        self.address = address
+        self.pool = ConnectionPool(address, authkey, pool_size)
+
+    def call(self, method, *args):
+        return self.pool.call(method, args)
+
+    def close(self):
+        self.pool.close()
+
+
+class ShardedStore(Store):
+    """A ``Store`` whose users live on shard nodes, placed by a ``HashRing``.
+
+    ``nodes`` are the node addresses; ``connect(address)`` makes the
+    client for one (``RemoteStore`` by default).
+    """
+
+    def __init__(self, nodes, authkey=None, pool_size=POOL_SIZE, connect=None):
+        self._connect = connect or (lambda address: RemoteStore(address, authkey, pool_size))
+        self.shards = {}
+        self._lock = threading.Lock()
+        self._adopt(nodes)
+
+    def _adopt(self, nodes):
+        with self._lock:
+            for node in nodes:
+                if node not in self.shards:
+                    self.shards[node] = self._connect(node)
+            self.ring = HashRing(nodes)
+
+    def _call(self, method, user_id, *args):
+        for _ in range(MAX_REDIRECTS):
+            shard = self.shards[self.ring.node_for(user_id)]
+            try:
+                return shard.call(method, user_id, *args)
+            except Moved as moved:
+                self._adopt(moved.nodes)
+        raise RuntimeError(f'No shard node would take user {user_id!r}')
+
+    def get_user(self, user_id):
+        return self._call('get_user', user_id)
+
+    def has_user(self, user_id):
+        return self._call('has_user', user_id)
+
+    def save_user(self, user_id, user):
+        self._call('save_user', user_id, user)
+
+    def save_profiles(self, profiles):
+        # One call per node rather than per profile
+        pending = list(profiles)
+        for _ in range(MAX_REDIRECTS):
+            if not pending:
+                return
+            groups = {}
+            for profile in pending:
+                groups.setdefault(self.ring.node_for(profile[0]), []).append(profile)
+            pending = []
+            for node, group in groups.items():
+                try:
+                    self.shards[node].call('save_profiles', group)
+                except Moved as moved:
+                    self._adopt(moved.nodes)
+                    pending.extend(group)
+        if pending:
+            raise RuntimeError('No shard node would take the profiles')
+
+    def get_progress(self, user_id):
+        return self._call('get_progress', user_id)
+
+    def save_progress(self, user_id, progress):
+        self._call('save_progress', user_id, progress)
+
+    def record_completion(self, user_id, calories, day=None):
+        return self._call('record_completion', user_id, calories, day)
+
+    def record_completions(self, user_id, completions):
+        return self._call('record_completions', user_id, completions)
+
+    def complete_day(self, user_id, day):
+        return self._call('complete_day', user_id, day)
+
+    def log_activity(self, user_id, moment, events):
+        self._call('log_activity', user_id, moment, events)
+
+    def get_activity(self, user_id, first_day, last_day):
+        return self._call('get_activity', user_id, first_day, last_day)
+
+    def export_user(self, user_id):
+        return self._call('export_user', user_id)
+
+    def import_user(self, user_id, data):
+        self._call('import_user', user_id, data)
+
+    def delete_user(self, user_id):
+        self._call('delete_user', user_id)
+
+    def user_ids(self):
+        return [user_id for node in self.ring.nodes for user_id in self.shards[node].call('user_ids')]
+
+    def add_node(self, address):
+        """Add the running, empty node at ``address`` and move its users to it.
+
+        Runs while workers keep serving, but one node at a time. Returns
+        the number of users the sweep moved; others may already have been
+        pulled on demand.
+        """
+        old = self.ring.nodes
+        if address in old:
+            raise ValueError(f'{address} is already in the ring')
+        new = old + (address,)
+        joining = self.shards.setdefault(address, self._connect(address))
+        joining.call('join', new, old)
+        for node in old:
+            self.shards[node].call('set_ring', new)
+        self._adopt(new)
+        ring = HashRing(new)
+        moved = 0
+        for node in old:
+            for user_id in self.shards[node].call('user_ids'):
+                if ring.node_for(user_id) == address:
+                    moved += joining.call('pull', user_id)
+        joining.call('joined')
+        for node in old:
+            self.shards[node].call('forget_moved')
+        return moved
+
+    def close(self):
+        for shard in self.shards.values():
+            shard.close()
+
+
+class ShardNode:
+    """One node's share of the users, in ``store``, for the ring it knows.
+
+    Without a ring a node serves every user, as a single node would.
+    """
+
+    def __init__(self, address, store, nodes=None, authkey=None):
+        self.address = address
+        self.store = store
+        self.authkey = authkey
+        self.ring = HashRing(nodes) if nodes else None
+        # While joining: the ring before this node, whose owners still
+        # hold users not yet pulled, and the users already settled here
+        self.previous = None
+        self.settled = set()
+        # Users handed over to another node, and the ring that says where,
+        # refused until this node's own ring says so
+        self.moved = {}
+        self._peers = {}
+        self._locks = [threading.Lock() for _ in range(_STRIPES)]
+
+    def _lock_for(self, user_id):
+        return self._locks[hash(user_id) % _STRIPES]
+
+    def _peer(self, address):
+        peer = self._peers.get(address)
+        if peer is None:
+            peer = self._peers[address] = RemoteStore(address, self.authkey, pool_size=1)
+        return peer
+
+    def _check(self, user_id):
+        """Refuse users owned elsewhere; pull a user that is still on its old node."""
+        if user_id in self.moved:
+            raise Moved(self.moved[user_id])
+        if self.ring is not None and self.ring.node_for(user_id) != self.address:
+            raise Moved(self.ring.nodes)
+        if self.previous is not None and user_id not in self.settled:
+            self._pull(user_id)
+
+    def _pull(self, user_id):
+        source = self.previous.node_for(user_id)
+        data = self._peer(source).call('hand_over', user_id, self.ring.nodes)
+        if data is not None:
+            self.store.import_user(user_id, data)
+        self.settled.add(user_id)
+        return data is not None
+
+    def _all_locks(self):
+        for lock in self._locks:
+            lock.acquire()
+
+    def _release_all(self):
+        for lock in self._locks:
+            lock.release()
+
+    def handle(self, method, args):
+        if method in STORE_METHODS or method == 'import_user':
+            with self._lock_for(args[0]):
+                self._check(args[0])
+                return getattr(self.store, method)(*args)
+        if method == 'save_profiles':
+            profiles = args[0]
+            # Every stripe involved, in order, as _all_locks takes them
+            locks = [self._locks[stripe] for stripe in sorted({hash(user_id) % _STRIPES for user_id, _, _ in profiles})]
+            for lock in locks:
+                lock.acquire()
+            try:
+                for user_id, _, _ in profiles:
+                    self._check(user_id)
+                return self.store.save_profiles(profiles)
+            finally:
+                for lock in locks:
+                    lock.release()
+        if method == 'user_ids':
+            return self.store.user_ids()
+        if method == 'hand_over':
+            # Another node now owns the user: give up whatever is here
+            user_id, nodes = args
+            with self._lock_for(user_id):
+                self.moved[user_id] = nodes
+                data = self.store.export_user(user_id)
+                if data is not None:
+                    self.store.delete_user(user_id)
+                return data
+        if method == 'pull':
+            with self._lock_for(args[0]):
+                if self.previous is None or args[0] in self.settled:
+                    return 0
+                return int(self._pull(args[0]))
+        if method == 'join':
+            nodes, previous = args
+            self._all_locks()
+            try:
+                self.ring, self.previous = HashRing(nodes), HashRing(previous)
+                self.settled = set()
+            finally:
+                self._release_all()
+            return None
+        if method == 'joined':
+            self.previous = None
+            self.settled = set()
+            return None
+        if method == 'set_ring':
+            # Waits for calls in progress, which were checked against the old ring
+            self._all_locks()
+            try:
+                self.ring = HashRing(args[0])
+            finally:
+                self._release_all()
+            return None
+        if method == 'forget_moved':
+            self.moved = {}
+            return None
+        if method == 'nodes':
+            return None if self.ring is None else self.ring.nodes
+        raise ValueError(f'Unknown shard call: {method}')
+
+    def _session(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    reply = (True, self.handle(method, args))
+                except Exception as e:
+                    reply = (False, e)
+                conn.send(reply)
+
+    def serve_forever(self, listener):
+        while True:
+            try:
+                conn = listener.accept()
+            except (AuthenticationError, EOFError, ConnectionError):
+                # A client without the key, or one that hung up
+                continue
+            threading.Thread(target=self._session, args=(conn,), daemon=True).start()
+
+
+def serve(address, store, nodes=None, authkey=None):
+    """Serve ``store`` as the shard node at ``address`` until the process exits."""
+    authkey = authkey or shard_key()
+    with Listener(parse_address(address), authkey=authkey) as listener:
+        ShardNode(address, store, nodes, authkey).serve_forever(listener)
+
+
+def _run_node(store_url, nodes, authkey, listener_address, ready):
+    with Listener(listener_address, authkey=authkey) as listener:
+        host, port = listener.address
+        address = f'{host}:{port}'
+        node = ShardNode(address, create_store(store_url), nodes, authkey)
+        ready.send(address)
+        ready.close()
+        node.serve_forever(listener)
+
+
+class LocalCluster:
+    """Shard nodes in child processes on this machine, for tests and benchmarks.
+
+    ``store_url`` is each node's store; ``{node}`` in it is replaced by
+    the node's number, to give SQLite nodes files of their own.
+    """
+
+    def __init__(self, count, store_url='memory', host='127.0.0.1', authkey=None):
+        self.store_url = store_url
+        self.host = host
+        self.authkey = authkey or os.urandom(16)
+        # Not forked: the parent may have threads, such as a SQLite writer
+        self._context = get_context('spawn')
+        self.processes = {}
+        # Each node binds a port of its own choosing; the ring needs all of
+        # them, so the nodes start ringless and are told it once all are up
+        self.nodes = tuple(self._spawn() for _ in range(count))
+        store = self.store(pool_size=1)
+        for node in self.nodes:
+            store.shards[node].call('set_ring', self.nodes)
+        store.close()
+
+    @property
+    def url(self):
+        return 'shards://' + ','.join(self.nodes)
+
+    def _spawn(self):
+        ready, child_end = self._context.Pipe(duplex=False)
+        url = self.store_url.replace('{node}', str(len(self.processes)))
+        process = self._context.Process(target=_run_node, args=(url, None, self.authkey, (self.host, 0), child_end),
+                                        daemon=True)
+        process.start()
+        child_end.close()
+        address = ready.recv()
+        self.processes[address] = process
+        return address
+
+    def store(self, pool_size=POOL_SIZE):
+        return ShardedStore(self.nodes, self.authkey, pool_size)
+
+    def add(self):
+        """Start one more node and rebalance onto it; returns its address and the users swept over."""
+        address = self._spawn()
+        store = self.store(pool_size=1)
+        try:
+            moved = store.add_node(address)
+        finally:
+            store.close()
+        self.nodes += (address,)
+        return address, moved
+
+    def close(self):
+        for process in self.processes.values():
+            process.terminate()
+        for process in self.processes.values():
+            process.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) < 2 or argv[0] != 'serve':
+        raise SystemExit('usage: python -m healthjourney.sharding serve HOST:PORT [STORE_URL [RING]]\n'
+                         'RING is the comma-separated HOST:PORT of every node, this one included')
+    address = argv[1]
+    store = create_store(argv[2] if len(argv) > 2 else 'memory')
+    serve(address, store, argv[3].split(',') if len(argv) > 3 else None)
+
+
+if __name__ == '__main__':
+    main()
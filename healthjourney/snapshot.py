@@ -0,0 +1,72 @@
+"""Precompiled catalog snapshots for fast cold starts.
+
+A snapshot is a parsed catalog (plus anything derived from it, such as the
+exercise index) written with ``marshal``. Loading one is several times
+faster than parsing the JSON text and rebuilding the index. ``marshal``
+output is only valid for the Python version that wrote it, so each file
+starts with a header naming that version. A snapshot from another
+version, or one older than its JSON source, is ignored and the JSON is
+parsed instead.
+
+Build snapshots at deploy time with::
+
+    python -m healthjourney.snapshot [data_dir]
+"""
+import marshal
+import os
+import sys
+
+MAGIC = b'HJSNAP1'
+HEADER = MAGIC + bytes(sys.version_info[:2])
+
+
+def snapshot_path(json_path):
+    return os.path.splitext(json_path)[0] + '.snapshot'
+
+
+def read_snapshot(json_path):
+    """Return the snapshot stored for ``json_path``, or ``None`` if unusable."""
+    path = snapshot_path(json_path)
+    try:
+        snapshot_mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+    try:
+        source_mtime = os.stat(json_path).st_mtime_ns
+    except OSError:
+        # Deployed without the JSON source; the snapshot is all there is
+        source_mtime = None
+    if source_mtime is not None and source_mtime > snapshot_mtime:
+        return None
+    try:
+        with open(path, 'rb') as f:
+            data = f.read()
+        if not data.startswith(HEADER):
+            return None
+        return marshal.loads(memoryview(data)[len(HEADER):])
+    except (OSError, ValueError, EOFError, TypeError):
+        return None
+
+
+def write_snapshot(json_path, payload):
+    path = snapshot_path(json_path)
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(HEADER)
+        marshal.dump(payload, f)
+    # Readers see either the old snapshot or the complete new one
+    os.replace(temp_path, path)
+    return path
+
+
+def main(argv=None):
+    from healthjourney.data import DATA_DIR, build_snapshots
+
+    argv = sys.argv[1:] if argv is None else argv
+    data_dir = argv[0] if argv else DATA_DIR
+    for path in build_snapshots(data_dir):
+        print(f'wrote {os.path.relpath(path)} ({os.path.getsize(path):,} bytes)')
+
+
+if __name__ == '__main__':
+    main()
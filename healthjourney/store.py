@@ -0,0 +1,523 @@
+"""User and progress storage.
+
+Handlers talk to a ``Store`` instead of module-level dicts so the backing
+storage can be swapped without touching them. ``MemoryStore`` keeps the
+old per-process behaviour; ``SQLiteStore`` persists to an embedded
+database that survives restarts and can be shared by several workers.
+
+Pick one with the ``HEALTHJOURNEY_STORE`` environment variable:
+``memory`` (default), ``sqlite:///path/to/file.db``, or
+``shards://host:port,...`` for users spread over shard nodes shared by
+every worker (see ``healthjourney.sharding``).
+"""
+import itertools
+import json
+import os
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from healthjourney.activity import (
+    DAY, EPOCH, NO_STREAK, ActivityTracker, ActivityWindow, bucket_ranges, buckets, epoch_seconds, extend_streak,
+    tally,
+)
+from healthjourney.progress import ProgressTracker, apply_completions, apply_day_completion
+from healthjourney.records import ProgressRecord, UserRecord
+
+
+def new_progress(now=None):
+    """Fresh workout progress for a new user starting at ``now``."""
+    return {
+        'current_day': 1,
+        'completed_days': [],
+        'start_date': (now or datetime.now()).isoformat(),
+        'total_calories_burned': 0,
+        'streak': 0
+    }
+
+
+class Store:
+    """Interface shared by every storage backend."""
+
+    # Whether calls can wait on I/O; the async server runs handlers for
+    # blocking stores in worker threads so they never stall the event loop
+    blocking = True
+
+    def get_user(self, user_id):
+        """Return the stored user dict, or ``None``."""
+        raise NotImplementedError
+
+    def has_user(self, user_id):
+        return self.get_user(user_id) is not None
+
+    def save_user(self, user_id, user):
+        raise NotImplementedError
+
+    def save_profiles(self, profiles):
+        """Save many ``(user_id, user, progress)`` triples at once."""
+        for user_id, user, progress in profiles:
+            self.save_user(user_id, user)
+            self.save_progress(user_id, progress)
+
+    def get_progress(self, user_id):
+        """Return the user's workout progress dict, or ``None``."""
+        raise NotImplementedError
+
+    def save_progress(self, user_id, progress):
+        raise NotImplementedError
+
+    def record_completion(self, user_id, calories, day=None):
+        """Add a completed exercise to the user's progress.
+
+        Adds ``calories`` to the total and, when ``day`` is given, marks
+        that program day completed and updates the streak. Returns the
+        updated progress, or ``None`` when the user has no progress record.
+        Concurrent calls for the same user must never lose an update.
+        """
+        raise NotImplementedError
+
+    def record_completions(self, user_id, completions):
+        """Record a session of ``(calories, day)`` completions at once.
+
+        Same as calling ``record_completion`` for each, but backends may
+        apply them as a single update. Returns the final progress, or
+        ``None`` when the user has no progress record.
+        """
+        progress = None
+        for calories, day in completions:
+            progress = self.record_completion(user_id, calories, day)
+            if progress is None:
+                return None
+        return progress
+
+    def complete_day(self, user_id, day):
+        """Mark program ``day`` completed and advance ``current_day`` past it.
+
+        Returns the updated progress, or ``None`` when the user has no
+        progress record. Must be atomic like ``record_completion``.
+        """
+        raise NotImplementedError
+
+    def log_activity(self, user_id, moment, events):
+        """Append ``(kind, calories, program day)`` events that happened at ``moment``.
+
+        Also adds them into the user's day, week and month rollups and
+        extends the streak of active days, atomically.
+        """
+        raise NotImplementedError
+
+    def get_activity(self, user_id, first_day, last_day):
+        """The ``ActivityWindow`` covering day ordinals ``first_day`` to ``last_day``.
+
+        Returns ``None`` when nothing was ever logged for the user.
+        """
+        raise NotImplementedError
+
+    # Moving users between stores (see healthjourney.sharding)
+
+    def user_ids(self):
+        """The IDs of every stored user."""
+        raise NotImplementedError
+
+    def export_user(self, user_id):
+        """Everything stored for ``user_id`` as plain data, or ``None``.
+
+        A dict with the profile (``user``), ``progress`` (or ``None``) and
+        ``activity``: ``(seconds since 1970, kind, calories, program day)``
+        events in the order they were logged.
+        """
+        raise NotImplementedError
+
+    def import_user(self, user_id, data):
+        """Store what ``export_user`` returned, replacing anything kept for ``user_id``."""
+        self.delete_user(user_id)
+        self.save_user(user_id, data['user'])
+        if data['progress'] is not None:
+            self.save_progress(user_id, data['progress'])
+        # Replaying the events rebuilds the rollups and the streak
+        for at, events in itertools.groupby(data['activity'], key=lambda event: event[0]):
+            self.log_activity(user_id, EPOCH + timedelta(seconds=at),
+                              [(kind, calories, day) for _, kind, calories, day in events])
+
+    def delete_user(self, user_id):
+        """Forget ``user_id``: profile, progress and activity."""
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemoryStore(Store):
+    """Per-process storage; everything is lost on restart.
+
+    Users and progress are kept as compact ``UserRecord`` and
+    ``ProgressRecord`` objects, which read like the dicts they came from.
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self.users = {}
+        self.workouts = ProgressTracker()
+        self.activity = ActivityTracker()
+
+    def get_user(self, user_id):
+        return self.users.get(user_id)
+
+    def has_user(self, user_id):
+        return user_id in self.users
+
+    def save_user(self, user_id, user):
+        self.users[user_id] = UserRecord.from_dict(user)
+
+    def get_progress(self, user_id):
+        return self.workouts.get(user_id)
+
+    def save_progress(self, user_id, progress):
+        self.workouts.put(user_id, ProgressRecord.from_dict(progress))
+
+    def record_completion(self, user_id, calories, day=None):
+        return self.workouts.record(user_id, calories, day)
+
+    def record_completions(self, user_id, completions):
+        return self.workouts.record_many(user_id, completions)
+
+    def complete_day(self, user_id, day):
+        return self.workouts.complete_day(user_id, day)
+
+    def log_activity(self, user_id, moment, events):
+        self.activity.log(user_id, moment, events)
+
+    def get_activity(self, user_id, first_day, last_day):
+        log = self.activity.get(user_id)
+        return None if log is None else log.window()
+
+    def user_ids(self):
+        return list(self.users)
+
+    def export_user(self, user_id):
+        user = self.users.get(user_id)
+        if user is None:
+            return None
+        progress = self.workouts.get(user_id)
+        log = self.activity.get(user_id)
+        return {
+            'user': user.to_dict(),
+            'progress': None if progress is None else progress.to_dict(),
+            'activity': [] if log is None else log.rows(),
+        }
+
+    def delete_user(self, user_id):
+        self.users.pop(user_id, None)
+        self.workouts.pop(user_id)
+        self.activity.pop(user_id)
+
+
+# Statements are module constants so sqlite3's statement cache reuses the
+# prepared form on every call
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS users (user_id TEXT PRIMARY KEY, data TEXT NOT NULL)',
+    # Columns without a declared type keep ints as ints and floats as floats
+    'CREATE TABLE IF NOT EXISTS progress ('
+    'user_id TEXT PRIMARY KEY, current_day, completed_days TEXT, start_date TEXT, '
+    'total_calories_burned, streak)',
+    # Raw events, append-only; stats queries read only the rollups below
+    'CREATE TABLE IF NOT EXISTS activity ('
+    'user_id TEXT NOT NULL, at INTEGER NOT NULL, kind INTEGER NOT NULL, calories REAL NOT NULL, day INTEGER)',
+    # Only for moving a user's events elsewhere
+    'CREATE INDEX IF NOT EXISTS activity_user ON activity (user_id)',
+    'CREATE TABLE IF NOT EXISTS activity_rollups ('
+    'user_id TEXT NOT NULL, grain INTEGER NOT NULL, bucket INTEGER NOT NULL, '
+    'calories REAL NOT NULL, exercises INTEGER NOT NULL, sessions INTEGER NOT NULL, '
+    'PRIMARY KEY (user_id, grain, bucket)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS activity_streaks ('
+    'user_id TEXT PRIMARY KEY, last_day INTEGER, current INTEGER NOT NULL, longest INTEGER NOT NULL)',
+)
+SELECT_USER = 'SELECT data FROM users WHERE user_id = ?'
+UPSERT_USER = 'INSERT OR REPLACE INTO users (user_id, data) VALUES (?, ?)'
+SELECT_PROGRESS = (
+    'SELECT current_day, completed_days, start_date, total_calories_burned, streak '
+    'FROM progress WHERE user_id = ?'
+)
+UPSERT_PROGRESS = (
+    'INSERT OR REPLACE INTO progress '
+    '(user_id, current_day, completed_days, start_date, total_calories_burned, streak) '
+    'VALUES (?, ?, ?, ?, ?, ?)'
+)
+UPDATE_PROGRESS = (
+    'UPDATE progress SET completed_days = ?, total_calories_burned = ?, streak = ? WHERE user_id = ?'
+)
+UPDATE_DAY = 'UPDATE progress SET current_day = ?, completed_days = ?, streak = ? WHERE user_id = ?'
+INSERT_EVENT = 'INSERT INTO activity (user_id, at, kind, calories, day) VALUES (?, ?, ?, ?, ?)'
+UPSERT_ROLLUP = (
+    'INSERT INTO activity_rollups (user_id, grain, bucket, calories, exercises, sessions) '
+    'VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (user_id, grain, bucket) DO UPDATE SET '
+    'calories = calories + excluded.calories, exercises = exercises + excluded.exercises, '
+    'sessions = sessions + excluded.sessions'
+)
+SELECT_ROLLUPS = (
+    'SELECT grain, bucket, calories, exercises, sessions FROM activity_rollups WHERE user_id = ? AND ('
+    '(grain = 0 AND bucket BETWEEN ? AND ?) OR (grain = 1 AND bucket BETWEEN ? AND ?) OR '
+    '(grain = 2 AND bucket BETWEEN ? AND ?))'
+)
+SELECT_ACTIVE_DAY = f'SELECT 1 FROM activity_rollups WHERE user_id = ? AND grain = {DAY} AND bucket = ?'
+SELECT_STREAK = 'SELECT last_day, current, longest FROM activity_streaks WHERE user_id = ?'
+UPSERT_STREAK = 'INSERT OR REPLACE INTO activity_streaks (user_id, last_day, current, longest) VALUES (?, ?, ?, ?)'
+SELECT_USER_IDS = 'SELECT user_id FROM users'
+SELECT_EVENTS = 'SELECT at, kind, calories, day FROM activity WHERE user_id = ? ORDER BY rowid'
+DELETE_USER = tuple(f'DELETE FROM {table} WHERE user_id = ?'
+                    for table in ('users', 'progress', 'activity', 'activity_rollups', 'activity_streaks'))
+
+
+class SQLiteStore(Store):
+    """SQLite database in WAL mode with group-committed writes.
+
+    Reads use one connection per thread and never wait for writers. Every
+    write goes to a single writer thread, which runs whatever has queued
+    up (up to ``max_batch`` writes) in one transaction and then wakes all
+    of their callers, so concurrent requests share a commit instead of
+    paying for one each. Each write runs in its own savepoint, so one that
+    raises is rolled back alone and only its caller sees the error. A
+    write returns only after its commit.
+    """
+
+    def __init__(self, path, max_batch=256):
+        self.path = path
+        self.max_batch = max_batch
+        self._local = threading.local()
+        self._queue = queue.SimpleQueue()
+
+        writer = self._connect()
+        for statement in SCHEMA:
+            writer.execute(statement)
+        writer.commit()
+        self._writer = threading.Thread(target=self._write_loop, args=(writer,), name='sqlite-writer', daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, isolation_level=None, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        # WAL + NORMAL is durable across application crashes; only a power
+        # loss can drop the last few commits
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        return conn
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    # Writes
+
+    def _write_loop(self, conn):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            stop = False
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+            if stop:
+                break
+        conn.close()
+
+    def _commit(self, conn, batch):
+        results = []
+        try:
+            conn.execute('BEGIN')
+            for operation, future in batch:
+                # A failed write is undone on its own; the rest still commit
+                conn.execute('SAVEPOINT operation')
+                try:
+                    results.append((future, operation(conn), None))
+                except Exception as e:
+                    conn.execute('ROLLBACK TO operation')
+                    results.append((future, None, e))
+                conn.execute('RELEASE operation')
+            conn.execute('COMMIT')
+        except Exception as e:
+            try:
+                if conn.in_transaction:
+                    conn.execute('ROLLBACK')
+            except sqlite3.Error:
+                pass
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+    def _write(self, operation):
+        future = Future()
+        self._queue.put((operation, future))
+        return future.result()
+
+    def save_user(self, user_id, user):
+        data = json.dumps(user)
+        self._write(lambda conn: conn.execute(UPSERT_USER, (user_id, data)))
+
+    @staticmethod
+    def _progress_row(user_id, progress):
+        return (
+            user_id,
+            progress['current_day'],
+            json.dumps(progress['completed_days']),
+            progress.get('start_date'),
+            progress['total_calories_burned'],
+            progress['streak'],
+        )
+
+    def save_progress(self, user_id, progress):
+        row = self._progress_row(user_id, progress)
+        self._write(lambda conn: conn.execute(UPSERT_PROGRESS, row))
+
+    def save_profiles(self, profiles):
+        user_rows = [(user_id, json.dumps(user)) for user_id, user, _ in profiles]
+        progress_rows = [self._progress_row(user_id, progress) for user_id, _, progress in profiles]
+
+        def operation(conn):
+            conn.executemany(UPSERT_USER, user_rows)
+            conn.executemany(UPSERT_PROGRESS, progress_rows)
+        self._write(operation)
+
+    def record_completion(self, user_id, calories, day=None):
+        return self.record_completions(user_id, [(calories, day)])
+
+    def record_completions(self, user_id, completions):
+        def operation(conn):
+            # The writer thread runs operations one at a time, so nothing
+            # can change the row between the read and the update
+            progress = self._read_progress(conn, user_id)
+            if progress is None:
+                return None
+            progress = apply_completions(progress, completions)
+            conn.execute(UPDATE_PROGRESS, (
+                json.dumps(progress['completed_days']),
+                progress['total_calories_burned'],
+                progress['streak'],
+                user_id,
+            ))
+            return progress
+        return self._write(operation)
+
+    def complete_day(self, user_id, day):
+        def operation(conn):
+            progress = self._read_progress(conn, user_id)
+            if progress is None:
+                return None
+            progress = apply_day_completion(progress, day)
+            conn.execute(UPDATE_DAY, (
+                progress['current_day'],
+                json.dumps(progress['completed_days']),
+                progress['streak'],
+                user_id,
+            ))
+            return progress
+        return self._write(operation)
+
+    def log_activity(self, user_id, moment, events):
+        at = epoch_seconds(moment)
+        day = moment.toordinal()
+        totals = tally(events)
+        events = [(user_id, at, kind, calories, program_day) for kind, calories, program_day in events]
+        rollups = [(user_id, grain, bucket) + totals for grain, bucket in enumerate(buckets(day))]
+
+        def operation(conn):
+            def active(other):
+                return conn.execute(SELECT_ACTIVE_DAY, (user_id, other)).fetchone() is not None
+            streak = conn.execute(SELECT_STREAK, (user_id,)).fetchone() or NO_STREAK
+            conn.execute(UPSERT_STREAK, (user_id,) + extend_streak(streak, day, active))
+            conn.executemany(INSERT_EVENT, events)
+            conn.executemany(UPSERT_ROLLUP, rollups)
+        self._write(operation)
+
+    # Reads
+
+    def get_user(self, user_id):
+        row = self._reader().execute(SELECT_USER, (user_id,)).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def has_user(self, user_id):
+        return self._reader().execute(SELECT_USER, (user_id,)).fetchone() is not None
+
+    def get_progress(self, user_id):
+        return self._read_progress(self._reader(), user_id)
+
+    def get_activity(self, user_id, first_day, last_day):
+        conn = self._reader()
+        streak = conn.execute(SELECT_STREAK, (user_id,)).fetchone()
+        if streak is None:
+            return None
+        bounds = [bucket for pair in bucket_ranges(first_day, last_day) for bucket in pair]
+        rollups = ({}, {}, {})
+        for grain, bucket, calories, exercises, sessions in conn.execute(SELECT_ROLLUPS, [user_id] + bounds):
+            rollups[grain][bucket] = (calories, exercises, sessions)
+        return ActivityWindow(rollups, streak)
+
+    def user_ids(self):
+        return [user_id for user_id, in self._reader().execute(SELECT_USER_IDS)]
+
+    def export_user(self, user_id):
+        conn = self._reader()
+        row = conn.execute(SELECT_USER, (user_id,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'user': json.loads(row[0]),
+            'progress': self._read_progress(conn, user_id),
+            'activity': conn.execute(SELECT_EVENTS, (user_id,)).fetchall(),
+        }
+
+    def delete_user(self, user_id):
+        def operation(conn):
+            for statement in DELETE_USER:
+                conn.execute(statement, (user_id,))
+        self._write(operation)
+
+    @staticmethod
+    def _read_progress(conn, user_id):
+        row = conn.execute(SELECT_PROGRESS, (user_id,)).fetchone()
+        if row is None:
+            return None
+        current_day, completed_days, start_date, total_calories_burned, streak = row
+        return {
+            'current_day': current_day,
+            'completed_days': json.loads(completed_days),
+            'start_date': start_date,
+            'total_calories_burned': total_calories_burned,
+            'streak': streak
+        }
+
+    def close(self):
+        if self._writer.is_alive():
+            self._queue.put(None)
+            self._writer.join()
+
+
+def create_store(url=None):
+    """Build the store named by ``url`` or ``$HEALTHJOURNEY_STORE``."""
+    url = url or os.environ.get('HEALTHJOURNEY_STORE', 'memory')
+    if url == 'memory':
+        return MemoryStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    if url.startswith('shards://'):
+        from healthjourney.sharding import ShardedStore, shard_key
+        return ShardedStore(url[len('shards://'):].split(','), shard_key())
+    raise ValueError(f'Unknown store: {url}')
@@ -0,0 +1,140 @@
+"""Per-client rate limiting and coalescing of identical concurrent work.
+
+``RateLimiter`` keeps a token bucket per client (an IP address) without
+keeping anything per client: buckets live in a fixed-size sketch, like
+a count-min sketch of token counts. Each client hashes to one slot in
+each of ``depth`` rows. A request is allowed if every one of its slots
+holds a token, and takes a token from each. Clients that share a slot
+share its tokens, so a collision can only make a client's limit
+stricter, never looser. Two clients collide in every row with
+probability about ``(clients / width) ** depth``, so with the defaults
+even 100k active clients seldom notice each other. Memory stays the
+same however many addresses a flood comes from.
+
+``SingleFlight`` runs one call per key at a time; callers arriving while
+it runs wait for it and share its result.
+"""
+import hashlib
+import os
+import threading
+import time
+from array import array
+
+# Sketch shape: slots per row, and rows each client is hashed into
+SKETCH_WIDTH = 32768
+SKETCH_DEPTH = 2
+
+# Demo users a client may create: a burst, then this many per second
+DEMO_RATE = 0.5
+DEMO_BURST = 20
+
+
+class RateLimiter:
+    """Token buckets per client, refilled at ``rate`` per second up to ``burst``.
+
+    A ``rate`` of 0 or less turns the limiter off.
+    """
+
+    def __init__(self, rate=DEMO_RATE, burst=DEMO_BURST, width=SKETCH_WIDTH, depth=SKETCH_DEPTH,
+                 clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst
+        self.width = width
+        self.depth = depth
+        self._clock = clock
+        # Slot tokens and when each slot was last refilled; a slot
+        # nobody has touched is full
+        self._tokens = array('d', [burst]) * (width * depth)
+        self._stamps = array('d', [clock()]) * (width * depth)
+        # Salted per process, so nobody can pick addresses that collide
+        self._salt = os.urandom(16)
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+
+    @classmethod
+    def from_environment(cls):
+        """Configured by ``HEALTHJOURNEY_DEMO_RATE`` and ``HEALTHJOURNEY_DEMO_BURST``."""
+        return cls(
+            rate=float(os.environ.get('HEALTHJOURNEY_DEMO_RATE', DEMO_RATE)),
+            burst=float(os.environ.get('HEALTHJOURNEY_DEMO_BURST', DEMO_BURST)),
+        )
+
+    def _slots(self, client):
+        digest = hashlib.blake2b(str(client).encode('utf-8'), digest_size=4 * self.depth, key=self._salt).digest()
+        width = self.width
+        return [row * width + int.from_bytes(digest[4 * row:4 * row + 4], 'little') % width
+                for row in range(self.depth)]
+
+    def acquire(self, client):
+        """Take a token for ``client``; returns 0 if allowed, else seconds until it would be."""
+        if self.rate <= 0:
+            return 0
+        slots = self._slots(client)
+        tokens, stamps, rate, burst = self._tokens, self._stamps, self.rate, self.burst
+        with self._lock:
+            now = self._clock()
+            least = burst
+            for slot in slots:
+                level = min(burst, tokens[slot] + (now - stamps[slot]) * rate)
+                tokens[slot] = level
+                stamps[slot] = now
+                least = min(least, level)
+            if least < 1:
+                self.limited += 1
+                return (1 - least) / rate
+            for slot in slots:
+                tokens[slot] -= 1
+            self.allowed += 1
+            return 0
+
+    def stats(self):
+        return {
+            'rate': self.rate,
+            'burst': self.burst,
+            'slots': self.width * self.depth,
+            'allowed': self.allowed,
+            'limited': self.limited,
+        }
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = self.error = None
+
+
+class SingleFlight:
+    """Coalesces concurrent calls with the same key into one."""
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.shared = 0
+
+    def do(self, key, function):
+        """``function()``, unless a call for ``key`` is running; then its result."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                self.shared += 1
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
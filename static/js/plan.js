@@ -636,7 +636,7 @@ async function completeExercise(exerciseId) {
     if (!userData) return;
     
     try {
-        const response = await API.completeExercise(userData.user_id, exerciseId, Math.floor(duration / 60));
+        const response = await API.completeExercise(userData.user_id, exerciseId, duration);
         
         if (response.success) {
             exerciseProgress[exerciseId] = 'completed';
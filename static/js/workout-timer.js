@@ -13,6 +13,7 @@ class WorkoutTimer {
         this.targetReps = 10;
         this.restTime = 60; // ثوان
         this.currentRestTime = 0;
+        this.sessionCompletions = []; // تمارين الجلسة التي لم ترسل بعد
         
         this.init();
     }
@@ -117,6 +118,9 @@ class WorkoutTimer {
         document.getElementById('stop-exercise-btn')?.addEventListener('click', () => this.stopExercise());
         document.getElementById('skip-rest-btn')?.addEventListener('click', () => this.skipRest());
 
+        // إرسال ما تبقى من الجلسة عند مغادرة الصفحة
+        window.addEventListener('pagehide', () => this.saveWorkoutSession(true));
+
         // ربط بطاقات التمارين
         document.addEventListener('click', (e) => {
             if (e.target.closest('.exercise-card')) {
@@ -155,6 +159,7 @@ class WorkoutTimer {
         }
 
         this.isRunning = true;
+        this.startTime = Date.now();
         this.startTimer();
         this.updateControls();
         
@@ -271,7 +276,7 @@ class WorkoutTimer {
         
         const totalCalories = this.currentRep * (this.currentExercise.calories_per_rep || 0.5);
         
-        // إرسال البيانات للخادم
+        // إضافة التمرين للجلسة، وترسل الجلسة كاملة في طلب واحد
         this.saveWorkoutProgress(totalCalories);
         
         this.showNotification(
@@ -408,32 +413,65 @@ class WorkoutTimer {
         setTimeout(() => timerContainer.classList.remove('completion-animation'), 2000);
     }
 
-    async saveWorkoutProgress(caloriesBurned) {
+    saveWorkoutProgress(caloriesBurned) {
+        this.sessionCompletions.push({
+            exercise_id: this.currentExercise.id,
+            duration: Math.floor((Date.now() - this.startTime) / 1000),
+            calories_burned: caloriesBurned,
+            sets_completed: this.currentSet - 1,
+            reps_completed: this.currentRep
+        });
+
+        // تنتهي الجلسة عند إكمال كل تمارين اليوم
+        const exercises = window.AppState?.workoutData?.exercises || [];
+        const completed = new Set(this.sessionCompletions.map(completion => String(completion.exercise_id)));
+        if (exercises.length && exercises.every(exercise => completed.has(String(exercise.id)))) {
+            this.saveWorkoutSession();
+        }
+    }
+
+    async saveWorkoutSession(leavingPage = false) {
+        const userId = window.AppState?.currentUser?.user_id;
+        if (!userId || !this.sessionCompletions.length) {
+            return;
+        }
+
+        // تؤخذ الدفعة من القائمة أثناء الإرسال وتعاد إليها إن فشل
+        const batch = this.sessionCompletions;
+        this.sessionCompletions = [];
+        const body = JSON.stringify({
+            user_id: userId,
+            completions: batch
+        });
+
+        if (leavingPage && navigator.sendBeacon) {
+            // الطلب العادي قد يلغى عند إغلاق الصفحة
+            if (!navigator.sendBeacon('/api/workout/complete/batch', new Blob([body], { type: 'application/json' }))) {
+                this.sessionCompletions = batch.concat(this.sessionCompletions);
+            }
+            return;
+        }
+
         try {
-            if (window.AppState?.currentUser?.user_id) {
-                const response = await fetch('/api/workout/complete', {
-                    method: 'POST',
-                    headers: {
-                        'Content-Type': 'application/json'
-                    },
-                    body: JSON.stringify({
-                        user_id: window.AppState.currentUser.user_id,
-                        exercise_id: this.currentExercise.id,
-                        duration: Math.floor((Date.now() - this.startTime) / 1000),
-                        calories_burned: caloriesBurned,
-                        sets_completed: this.currentSet - 1,
-                        reps_completed: this.currentRep
-                    })
-                });
-                
-                const result = await response.json();
-                if (result.success) {
-                    console.log('تم حفظ تقدم التمرين بنجاح');
-                }
+            const response = await fetch('/api/workout/complete/batch', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json'
+                },
+                body: body
+            });
+            
+            const result = await response.json();
+            if (result.success) {
+                console.log('تم حفظ تقدم الجلسة بنجاح');
+                return;
             }
+            console.error('خطأ في حفظ تقدم الجلسة:', result.error);
         } catch (error) {
-            console.error('خطأ في حفظ تقدم التمرين:', error);
+            console.error('خطأ في حفظ تقدم الجلسة:', error);
         }
+        // لم تحفظ الجلسة، فتبقى تمارينها لمحاولة لاحقة
+        this.sessionCompletions = batch.concat(this.sessionCompletions);
     }
 
     playSound(type) {